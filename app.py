@@ -1,61 +1,117 @@
-from flask import Flask, request, jsonify, render_template, session, redirect, url_for
+from flask import Flask, request, jsonify, render_template, session, redirect, url_for, g, Response, stream_with_context
 from pinecone_utils import search_similar_programs
 from supabase_utils import (
     supabase_client, get_user_profile, create_user_profile, update_user_profile,
     register_for_program, get_user_registrations, unregister_from_program,
-    get_collaborative_recommendations, get_program_registration_count
+    get_collaborative_recommendations, get_program_registration_counts
 )
-from llm_recommendations import llm_engine
-from datetime import datetime
-import calendar
+from embedding_cache import embedding_cache
+from auth_utils import verify_access_token, invalidate_token
+from data_loader import begin_request_scope, end_request_scope, request_scope, run_in_worker
+from recommendation_store import recommendation_store, input_version, USE_RECOMMENDATION_SNAPSHOTS, RECOMMENDATION_REFRESH_WAIT_SECONDS
+from logging_utils import configure_logging
+from metrics import begin_request_timing, end_request_timing, current_request_timings, route_latency, render_prometheus, METRICS_ENABLED
+from clients import LazyClient, program_index, nomic_embed
+from startup import start_warmup
+from local_ranker import month_to_number
+from llm_scheduler import llm_scheduler
 import jwt
 import os
+import time
+import logging
+import json
+import asyncio
+import inspect
 from functools import wraps
 
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# "local" ranks candidates locally (local_ranker) and uses the LLM only as a time-boxed rerank and
+# explanation layer; "hybrid" is the LLM-first pipeline
+RANKING_MODE = os.getenv("RANKING_MODE", "local")
+
+def _load_llm_engine():
+    # LangChain and the prompt chains are only imported here
+    from llm_recommendations import llm_engine
+    return llm_engine
+
+llm_engine = LazyClient("LLM engine", _load_llm_engine)
+# STARTUP_MODE: load heavy subsystems now, shortly after boot in the background, or on first use
+start_warmup({
+    "LLM engine": llm_engine.get,
+    "program index": program_index.get,
+    "Supabase": supabase_client.get,
+    "Nomic": nomic_embed.get
+})
+
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'Madan')
 
+@app.before_request
+def open_data_loader_scope():
+    # Profile/registration reads are memoized and batched for the life of the request
+    g.data_loader_token = begin_request_scope()
+
+@app.teardown_request
+def close_data_loader_scope(exc):
+    token = g.pop('data_loader_token', None)
+    if token is not None:
+        end_request_scope(token)
+
+@app.before_request
+def start_request_timing():
+    if METRICS_ENABLED:
+        g.request_timing_token = begin_request_timing()
+
+@app.after_request
+def record_request_timing(response):
+    timings = current_request_timings()
+    if timings is not None:
+        # For streamed responses this covers the work done before the body starts
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        route_latency.observe((route, request.method, str(response.status_code)), time.perf_counter() - timings.started)
+        response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_timing_scope(exc):
+    token = g.pop('request_timing_token', None)
+    if token is not None:
+        end_request_timing(token)
+
 def token_required(f):
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_decorated(*args, **kwargs):
+            token = session.get('access_token')
+            if not token:
+                return redirect(url_for('login'))
+            
+            # Cache hits return immediately; a remote fallback check runs off the event loop
+            user_id = await run_in_worker(verify_access_token, token, supabase_client)
+            if not user_id:
+                return redirect(url_for('login'))
+            session['user_id'] = user_id
+            
+            return await f(*args, **kwargs)
+        return async_decorated
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = session.get('access_token')
         if not token:
             return redirect(url_for('login'))
         
-        try:
-            # Verify token with Supabase
-            user = supabase_client.auth.get_user(token)
-            if not user:
-                return redirect(url_for('login'))
-            session['user_id'] = user.user.id
-        except:
+        # Verify token locally (cached until exp), falling back to Supabase
+        user_id = verify_access_token(token, supabase_client)
+        if not user_id:
             return redirect(url_for('login'))
+        session['user_id'] = user_id
         
         return f(*args, **kwargs)
     return decorated
 
-def month_to_number(month_name):
-    """Convert month name to number"""
-    try:
-        return list(calendar.month_name).index(month_name.capitalize())
-    except ValueError:
-        try:
-            return list(calendar.month_abbr).index(month_name.capitalize())
-        except ValueError:
-            return None
-
-def is_program_available_in_month(start_date, end_date, target_month_num):
-    """Check if program runs during the target month"""
-    try:
-        start = datetime.strptime(start_date, "%Y-%m-%d")
-        end = datetime.strptime(end_date, "%Y-%m-%d")
-        
-        # Check if target month falls within the program duration
-        return start.month <= target_month_num <= end.month or \
-               (start.year < end.year and (start.month <= target_month_num or target_month_num <= end.month))
-    except:
-        return True
-
 def generate_content_based_recommendations(profile, user_registrations):
     """Generate ONLY program similarity recommendations (removed profile-based)"""
     if not profile:
@@ -65,7 +121,7 @@ def generate_content_based_recommendations(profile, user_registrations):
     registered_program_ids = {reg['program_id'] for reg in user_registrations}
     registered_program_list = [reg['program_id'] for reg in user_registrations]
     
-    print(f"🔗 Generating ONLY similarity recommendations for user with {len(registered_program_ids)} registered programs")
+    logger.info("🔗 Generating ONLY similarity recommendations for user with %s registered programs", len(registered_program_ids))
     
     all_recommendations = []
     
@@ -103,27 +159,27 @@ def generate_content_based_recommendations(profile, user_registrations):
                         "similar_to_program_title": similar_to_title
                     })
             
-            print(f"✅ Program similarity recommendations: {len(all_recommendations)}")
+            logger.info("✅ Program similarity recommendations: %s", len(all_recommendations))
             
         except Exception as e:
-            print(f"❌ Error generating program similarity recommendations: {e}")
+            logger.error("❌ Error generating program similarity recommendations: %s", e)
     else:
-        print("📭 No registered programs found - cannot generate similarity recommendations")
+        logger.info("📭 No registered programs found - cannot generate similarity recommendations")
     
     # Sort by similarity score
     all_recommendations.sort(key=lambda x: -x['score'])
     
-    print(f"🎯 Total similarity-based recommendations: {len(all_recommendations)}")
+    logger.info("🎯 Total similarity-based recommendations: %s", len(all_recommendations))
     
     # Return top 3 similarity recommendations
     return all_recommendations[:3]
 
 def merge_recommendations(content_based, collaborative, user_registrations):
     """Merge content-based and collaborative recommendations"""
-    print(f"\n=== MERGING RECOMMENDATIONS ===")
-    print(f"📋 Content-based recommendations: {len(content_based)}")
-    print(f"👥 Collaborative recommendations: {len(collaborative)}")
-    print(f"📚 User registrations: {len(user_registrations)}")
+    logger.info("=== MERGING RECOMMENDATIONS ===")
+    logger.debug("📋 Content-based recommendations: %s", len(content_based))
+    logger.debug("👥 Collaborative recommendations: %s", len(collaborative))
+    logger.debug("📚 User registrations: %s", len(user_registrations))
     
     registered_program_ids = {reg['program_id'] for reg in user_registrations}
     
@@ -142,28 +198,29 @@ def merge_recommendations(content_based, collaborative, user_registrations):
             rec['collaborative_info'] = None
             rec['similarity_info'] = None
 
-    print(f"✅ Processed {len(content_based)} content-based recommendations")
+    logger.debug("✅ Processed %s content-based recommendations", len(content_based))
     
     # Group content-based by type for logging
     profile_based = [r for r in content_based if r['recommendation_type'] == 'profile_based']
     similarity_based = [r for r in content_based if r['recommendation_type'] == 'program_similarity']
     
-    print(f"   📊 Profile-based: {len(profile_based)}")
-    print(f"   🔗 Program similarity: {len(similarity_based)}")
+    logger.debug("   📊 Profile-based: %s", len(profile_based))
+    logger.debug("   🔗 Program similarity: %s", len(similarity_based))
     
     # Process collaborative recommendations - FETCH ACTUAL PROGRAM DETAILS
     collaborative_with_details = []
+    registration_counts = get_program_registration_counts([collab_rec['program_id'] for collab_rec in collaborative])
     for collab_rec in collaborative:
         program_id = collab_rec['program_id']
         
         # Skip if user is already registered for this program
         if program_id in registered_program_ids:
-            print(f"⚠️  Skipping {collab_rec['program_title']} - user already registered")
+            logger.debug("⚠️  Skipping %s - user already registered", collab_rec['program_title'])
             continue
         
         # Skip if already in content-based recommendations
         if any(cb['program_id'] == program_id for cb in content_based):
-            print(f"⚠️  Skipping {collab_rec['program_title']} - already in content-based")
+            logger.debug("⚠️  Skipping %s - already in content-based", collab_rec['program_title'])
             continue
             
         try:
@@ -184,11 +241,11 @@ def merge_recommendations(content_based, collaborative, user_registrations):
                     "recommendation_type": "collaborative",
                     "is_registered": False,
                     "collaborative_info": {
-                        "users_registered": get_program_registration_count(program_id),
+                        "users_registered": registration_counts.get(program_id, 0),
                         "message": "Users similar to you have registered for this program"
                     }
                 })
-                print(f"✅ Added collaborative recommendation with details: {program_details.get('title', collab_rec['program_title'])}")
+                logger.debug("✅ Added collaborative recommendation with details: %s", program_details.get('title', collab_rec['program_title']))
             else:
                 # Fallback to basic info if details not found
                 collaborative_with_details.append({
@@ -203,17 +260,17 @@ def merge_recommendations(content_based, collaborative, user_registrations):
                     "recommendation_type": "collaborative",
                     "is_registered": False,
                     "collaborative_info": {
-                        "users_registered": get_program_registration_count(program_id),
+                        "users_registered": registration_counts.get(program_id, 0),
                         "message": "Users similar to you have registered for this program"
                     }
                 })
-                print(f"⚠️  Added collaborative recommendation with fallback details: {collab_rec['program_title']}")
+                logger.debug("⚠️  Added collaborative recommendation with fallback details: %s", collab_rec['program_title'])
                 
         except Exception as e:
-            print(f"❌ Error processing collaborative recommendation: {e}")
+            logger.error("❌ Error processing collaborative recommendation: %s", e)
             continue
     
-    print(f"✅ Processed {len(collaborative_with_details)} collaborative recommendations")
+    logger.info("✅ Processed %s collaborative recommendations", len(collaborative_with_details))
     
     # Combine recommendations with priority:
     # 1. Program similarity (highest priority)
@@ -221,14 +278,14 @@ def merge_recommendations(content_based, collaborative, user_registrations):
     # 3. Collaborative
     all_recommendations = similarity_based + profile_based + collaborative_with_details
     
-    print(f"🎯 FINAL MERGED RECOMMENDATIONS ({len(all_recommendations)} total):")
+    logger.info("🎯 FINAL MERGED RECOMMENDATIONS (%s total):", len(all_recommendations))
     for i, rec in enumerate(all_recommendations):
         reason = ""
         if rec['recommendation_type'] == 'program_similarity':
             reason = " (similar to registered programs)"
         elif rec['recommendation_type'] == 'collaborative':
             reason = " (collaborative filtering)"
-        print(f"   {i+1}. {rec['title']} ({rec['recommendation_type']}) - Score: {rec['score']}{reason}")
+        logger.debug("   %s. %s (%s) - Score: %s%s", i+1, rec['title'], rec['recommendation_type'], rec['score'], reason)
     
     # Return only top 5 recommendations
     return all_recommendations[:5]
@@ -258,13 +315,13 @@ def profile():
     return render_template("profile.html")
 
 @app.route("/api/auth/login", methods=["POST"])
-def api_login():
+async def api_login():
     data = request.json
     email = data.get('email')
     password = data.get('password')
     
     try:
-        response = supabase_client.auth.sign_in_with_password({
+        response = await run_in_worker(supabase_client.auth.sign_in_with_password, {
             "email": email,
             "password": password
         })
@@ -273,7 +330,7 @@ def api_login():
         session['user_id'] = response.user.id
         
         # Check if user has completed onboarding
-        profile = get_user_profile(response.user.id)
+        profile = await run_in_worker(get_user_profile, response.user.id)
         
         if not profile or not profile.get('role'):
             return jsonify({"success": True, "redirect": "/onboarding"})
@@ -281,18 +338,18 @@ def api_login():
         return jsonify({"success": True, "redirect": "/"})
     
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         return jsonify({"success": False, "error": str(e)}), 400
 
 @app.route("/api/auth/register", methods=["POST"])
-def api_register():
+async def api_register():
     data = request.json
     email = data.get('email')
     password = data.get('password')
     full_name = data.get('full_name')
     
     try:
-        response = supabase_client.auth.sign_up({
+        response = await run_in_worker(supabase_client.auth.sign_up, {
             "email": email,
             "password": password
         })
@@ -303,7 +360,7 @@ def api_register():
             session['user_id'] = response.user.id
             
             # Create user profile with authenticated context
-            create_user_profile(response.user.id, email, full_name)
+            await run_in_worker(create_user_profile, response.user.id, email, full_name)
             
             return jsonify({"success": True, "redirect": "/onboarding"})
         else:
@@ -311,11 +368,12 @@ def api_register():
             return jsonify({"success": True, "message": "Please check your email for confirmation", "redirect": "/login"})
     
     except Exception as e:
-        print(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         return jsonify({"success": False, "error": str(e)}), 400
 
 @app.route("/api/auth/logout", methods=["POST"])
 def api_logout():
+    invalidate_token(session.get('access_token'))
     session.clear()
     return jsonify({"success": True})
 
@@ -346,7 +404,7 @@ def complete_onboarding():
         return jsonify({"success": True})
     
     except Exception as e:
-        print(f"Onboarding error: {e}")
+        logger.error("Onboarding error: %s", e)
         return jsonify({"success": False, "error": str(e)}), 400
 
 @app.route("/api/profile", methods=["GET"])
@@ -381,127 +439,269 @@ def update_profile():
         return jsonify({"success": True})
     
     except Exception as e:
-        print(f"Profile update error: {e}")
+        logger.error("Profile update error: %s", e)
         return jsonify({"success": False, "error": str(e)}), 400
 
-@app.route("/api/recommendations", methods=["GET"])
-@token_required
-def get_recommendations():
-    user_id = session['user_id']
-    print(f"\n🚀 GETTING COMPREHENSIVE RECOMMENDATIONS FOR USER: {user_id}")
-      
-      
-    profile = get_user_profile(user_id)
-    
-    if not profile:
-        print("❌ Profile not found!")
-        return jsonify({"error": "Profile not found"}), 404
+def top_up_with_similarity(profile, user_registrations, hybrid_recommendations):
+    """If the hybrid pipeline returned fewer than 3, add program similarity recommendations (NO profile-based)"""
+    if len(hybrid_recommendations) < 3 and user_registrations:
+        logger.debug("🔗 Adding more similarity-based recommendations...")
+        similarity_recs = generate_content_based_recommendations(profile, user_registrations)
+        
+        existing_ids = {rec['program_id'] for rec in hybrid_recommendations}
+        for sim_rec in similarity_recs:
+            if sim_rec['program_id'] not in existing_ids and len(hybrid_recommendations) < 5:
+                formatted_rec = {
+                    "program_id": sim_rec['program_id'],
+                    "title": sim_rec['title'],
+                    "category": sim_rec['category'],
+                    "skills_required": sim_rec.get('skills_required', ''),
+                    "cost": sim_rec.get('cost', 0),
+                    "start_date": sim_rec.get('start_date', ''),
+                    "end_date": sim_rec.get('end_date', ''),
+                    "score": sim_rec.get('score', 0.8),
+                    "recommendation_type": "program_similarity",
+                    "is_registered": False,
+                    "similarity_score": sim_rec.get('score', 0.8),
+                    "similarity_info": {
+                        "message": sim_rec.get('recommendation_explanation', 'Similar to your registered programs'),
+                        "similar_to_program_id": sim_rec.get('similar_to_program'),
+                        "similar_to_program_title": sim_rec.get('similar_to_program_title', 'your registered program'),
+                        "explanation": sim_rec.get('recommendation_explanation', 'Similar to your registered programs')
+                    }
+                }
+                hybrid_recommendations.append(formatted_rec)
+                logger.debug("   ✅ Added similarity: %s", sim_rec['title'])
     
-    print(f"✅ User profile loaded: {profile.get('full_name', 'Unknown')}")
-    print(f"   Role: {profile.get('role', 'N/A')}")
-    print(f"   Interests: {profile.get('interests', 'N/A')}")
-    print(f"   Skills: {profile.get('preferred_skills', 'N/A')}")
+    logger.info("🎯 Final recommendations: %s", len(hybrid_recommendations))
     
-    # Get user registrations FIRST
-    print("\n📚 Getting user registrations...")
-    user_registrations = get_user_registrations(user_id)
-    print(f"✅ User registrations: {len(user_registrations)}")
-    for reg in user_registrations:
-        print(f"   - {reg['program_title']} (ID: {reg['program_id']})")
+    # Verify no profile-based recommendations
+    profile_based_count = len([r for r in hybrid_recommendations if r.get('recommendation_type') == 'profile_based'])
+    if profile_based_count > 0:
+        logger.warning("⚠️ WARNING: Found %s profile-based recommendations - this should not happen!", profile_based_count)
     
+    return hybrid_recommendations
+
+def build_recommendations(user_id, profile, user_registrations):
+    """Full recommendation pipeline for one user: collaborative + hybrid + similarity top-up"""
     # Get collaborative recommendations
-    print("\n👥 Getting collaborative recommendations...")
+    logger.debug("👥 Getting collaborative recommendations...")
     collaborative = get_collaborative_recommendations(user_id, limit=3)
-    print(f"✅ Collaborative recommendations: {len(collaborative)}")
+    logger.info("✅ Collaborative recommendations: %s", len(collaborative))
     for collab in collaborative:
-        print(f"   - {collab['program_title']} (Score: {collab['collaborative_score']})")
+        logger.debug("   - %s (Score: %s)", collab['program_title'], collab['collaborative_score'])
     
     # Get hybrid recommendations (LLM + Similarity + Collaborative ONLY)
-    print("\n🔄 Getting hybrid recommendations...")
-    try:
+    logger.debug("🔄 Getting hybrid recommendations...")
+    if RANKING_MODE == "local":
+        hybrid_recommendations = llm_engine.get_ranked_recommendations(profile, user_registrations, collaborative)
+    else:
         hybrid_recommendations = llm_engine.get_hybrid_recommendations(
             profile, 
             user_registrations, 
             collaborative
         )
-        
-        print(f"✅ Hybrid recommendations: {len(hybrid_recommendations)}")
-        
-        # If we still don't have enough, only add program similarity (NO profile-based)
-        if len(hybrid_recommendations) < 3 and user_registrations:
-            print("\n🔗 Adding more similarity-based recommendations...")
-            similarity_recs = generate_content_based_recommendations(profile, user_registrations)
-            
-            existing_ids = {rec['program_id'] for rec in hybrid_recommendations}
-            for sim_rec in similarity_recs:
-                if sim_rec['program_id'] not in existing_ids and len(hybrid_recommendations) < 5:
-                    formatted_rec = {
-                        "program_id": sim_rec['program_id'],
-                        "title": sim_rec['title'],
-                        "category": sim_rec['category'],
-                        "skills_required": sim_rec.get('skills_required', ''),
-                        "cost": sim_rec.get('cost', 0),
-                        "start_date": sim_rec.get('start_date', ''),
-                        "end_date": sim_rec.get('end_date', ''),
-                        "score": sim_rec.get('score', 0.8),
-                        "recommendation_type": "program_similarity",
-                        "is_registered": False,
-                        "similarity_score": sim_rec.get('score', 0.8),
-                        "similarity_info": {
-                            "message": sim_rec.get('recommendation_explanation', 'Similar to your registered programs'),
-                            "similar_to_program_id": sim_rec.get('similar_to_program'),
-                            "similar_to_program_title": sim_rec.get('similar_to_program_title', 'your registered program'),
-                            "explanation": sim_rec.get('recommendation_explanation', 'Similar to your registered programs')
-                        }
-                    }
-                    hybrid_recommendations.append(formatted_rec)
-                    print(f"   ✅ Added similarity: {sim_rec['title']}")
-        
-        print(f"🎯 Final recommendations: {len(hybrid_recommendations)}")
-        
-        # Verify no profile-based recommendations
-        profile_based_count = len([r for r in hybrid_recommendations if r.get('recommendation_type') == 'profile_based'])
-        if profile_based_count > 0:
-            print(f"⚠️ WARNING: Found {profile_based_count} profile-based recommendations - this should not happen!")
-        
-        return jsonify({"recommendations": hybrid_recommendations})
+    
+    logger.info("✅ Hybrid recommendations: %s", len(hybrid_recommendations))
+    return top_up_with_similarity(profile, user_registrations, hybrid_recommendations)
+
+async def abuild_recommendations(user_id, profile, user_registrations):
+    """
+    Async build_recommendations: collaborative filtering runs concurrently with the other
+    candidate sources (local mode) or the LLM and similarity stages (hybrid mode)
+    """
+    collaborative = run_in_worker(get_collaborative_recommendations, user_id, 3)
+    if RANKING_MODE == "local":
+        # Candidate sources are gathered concurrently and the LLM layer is awaited on the event
+        # loop, bounded by the latency budget; no worker thread is held for the whole pipeline
+        hybrid_recommendations = await llm_engine.aget_ranked_recommendations(
+            profile,
+            user_registrations,
+            collaborative
+        )
+        logger.info("✅ Ranked recommendations: %s", len(hybrid_recommendations))
+        return await run_in_worker(top_up_with_similarity, profile, user_registrations, hybrid_recommendations)
+    
+    hybrid_recommendations = await llm_engine.aget_hybrid_recommendations(
+        profile, 
+        user_registrations, 
+        collaborative
+    )
+    
+    logger.info("✅ Hybrid recommendations: %s", len(hybrid_recommendations))
+    return await run_in_worker(top_up_with_similarity, profile, user_registrations, hybrid_recommendations)
+
+def fallback_recommendations(profile, user_registrations):
+    """Degraded recommendations used when the full pipeline fails"""
+    # Even in fallback, only use similarity-based if user has registrations
+    if user_registrations:
+        logger.info("🔄 Fallback: Using similarity-based recommendations only")
+        return generate_content_based_recommendations(profile, user_registrations)
+    
+    logger.info("🔄 Fallback: No registered programs, using basic search")
+    # Basic search based on interests only
+    basic_query = f"{profile.get('interests', '')} {profile.get('role', '')} {profile.get('preferred_skills', '')}"
+    try:
+        basic_results = search_similar_programs(basic_query, top_k=5)
+        basic_recommendations = []
+        for match in basic_results:
+            if match.score > 0.6:
+                metadata = match.metadata
+                basic_recommendations.append({
+                    "program_id": metadata.get("program_id"),
+                    "title": metadata.get("title"),
+                    "category": metadata.get("category"),
+                    "skills_required": metadata.get("skills_required"),
+                    "cost": metadata.get("cost"),
+                    "start_date": metadata.get("start_date"),
+                    "end_date": metadata.get("end_date"),
+                    "score": round(match.score, 3),
+                    "recommendation_type": "search",
+                    "is_registered": False,
+                    "similarity_score": match.score
+                })
+        return basic_recommendations
+    except Exception as search_error:
+        logger.error("❌ Basic search also failed: %s", search_error)
+        return []
+
+def refresh_recommendation_snapshot(user_id):
+    """Recompute a user's snapshot from fresh reads (runs on the snapshot store's workers)"""
+    with request_scope():
+        profile = get_user_profile(user_id)
+        if not profile:
+            return None, None
+        user_registrations = get_user_registrations(user_id)
+        version = input_version(profile, user_registrations)
+        return version, build_recommendations(user_id, profile, user_registrations)
+
+recommendation_store.set_refresh_function(refresh_recommendation_snapshot)
+
+@app.route("/api/recommendations", methods=["GET"])
+@token_required
+async def get_recommendations():
+    user_id = session['user_id']
+    logger.info("🚀 GETTING COMPREHENSIVE RECOMMENDATIONS FOR USER: %s", user_id)
+    generation = recommendation_store.generation(user_id)
+    
+    # Profile and registrations are independent reads - fetch them together
+    profile, user_registrations = await asyncio.gather(
+        run_in_worker(get_user_profile, user_id),
+        run_in_worker(get_user_registrations, user_id)
+    )
+    
+    if not profile:
+        logger.error("❌ Profile not found!")
+        return jsonify({"error": "Profile not found"}), 404
+    
+    logger.info("✅ User profile loaded: %s", profile.get('full_name', 'Unknown'))
+    logger.debug("   Role: %s", profile.get('role', 'N/A'))
+    logger.debug("   Interests: %s", profile.get('interests', 'N/A'))
+    logger.debug("   Skills: %s", profile.get('preferred_skills', 'N/A'))
+    
+    logger.info("✅ User registrations: %s", len(user_registrations))
+    for reg in user_registrations:
+        logger.debug("   - %s (ID: %s)", reg['program_title'], reg['program_id'])
+    
+    version = input_version(profile, user_registrations)
+    if USE_RECOMMENDATION_SNAPSHOTS:
+        # Served immediately even if stale; the store refreshes stale snapshots in the background
+        # (a snapshot of other profile/registration inputs is a miss and recomputed below)
+        snapshot = recommendation_store.get(user_id, version)
+        pending = recommendation_store.pending_refresh(user_id, generation) if snapshot is None else None
+        if pending is not None:
+            # The write that changed these inputs already queued their refresh; share it
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), RECOMMENDATION_REFRESH_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Snapshot refresh for %s still running, computing here", user_id)
+            snapshot = recommendation_store.get(user_id, version)
+        if snapshot is not None:
+            logger.info("⚡ Serving recommendation snapshot (%s items)", len(snapshot))
+            return jsonify({"recommendations": snapshot})
+    
+    try:
+        recommendations = await abuild_recommendations(user_id, profile, user_registrations)
+        if USE_RECOMMENDATION_SNAPSHOTS:
+            recommendation_store.put(user_id, version, recommendations, generation)
+        return jsonify({"recommendations": recommendations})
         
     except Exception as e:
-        print(f"❌ Error with hybrid recommendations: {e}")
+        logger.error("❌ Error with hybrid recommendations: %s", e)
+        fallback = await run_in_worker(fallback_recommendations, profile, user_registrations)
+        return jsonify({"recommendations": fallback})
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.route("/api/recommendations/stream", methods=["GET"])
+@token_required
+def stream_recommendations():
+    """
+    /api/recommendations as Server-Sent Events, for progressive rendering:
+    "recommendation" events as each stage produces results, "patch" events carrying AI
+    reasoning, then one "done" event with the final list (the same as the JSON endpoint)
+    """
+    user_id = session['user_id']
+    logger.info("🚀 STREAMING RECOMMENDATIONS FOR USER: %s", user_id)
+    generation = recommendation_store.generation(user_id)
+    
+    profile = get_user_profile(user_id)
+    if not profile:
+        logger.error("❌ Profile not found!")
+        return jsonify({"error": "Profile not found"}), 404
+    user_registrations = get_user_registrations(user_id)
+    
+    version = input_version(profile, user_registrations)
+    snapshot = recommendation_store.get(user_id, version) if USE_RECOMMENDATION_SNAPSHOTS else None
+    pending = recommendation_store.pending_refresh(user_id, generation) if USE_RECOMMENDATION_SNAPSHOTS and snapshot is None else None
+    if pending is not None:
+        try:
+            pending.result(timeout=RECOMMENDATION_REFRESH_WAIT_SECONDS)
+        except TimeoutError:
+            logger.warning("⚠️ Snapshot refresh for %s still running, computing here", user_id)
+        snapshot = recommendation_store.get(user_id, version)
+    
+    def generate():
+        if snapshot is not None:
+            logger.info("⚡ Streaming recommendation snapshot (%s items)", len(snapshot))
+            yield sse_event("done", {"recommendations": snapshot})
+            return
         
-        # Even in fallback, only use similarity-based if user has registrations
-        if user_registrations:
-            print("🔄 Fallback: Using similarity-based recommendations only")
-            similarity_recs = generate_content_based_recommendations(profile, user_registrations)
-            return jsonify({"recommendations": similarity_recs})
-        else:
-            print("🔄 Fallback: No registered programs, using basic search")
-            # Basic search based on interests only
-            basic_query = f"{profile.get('interests', '')} {profile.get('role', '')} {profile.get('preferred_skills', '')}"
-            try:
-                from pinecone_utils import search_similar_programs
-                basic_results = search_similar_programs(basic_query, top_k=5)
-                basic_recommendations = []
-                for match in basic_results:
-                    if match.score > 0.6:
-                        metadata = match.metadata
-                        basic_recommendations.append({
-                            "program_id": metadata.get("program_id"),
-                            "title": metadata.get("title"),
-                            "category": metadata.get("category"),
-                            "skills_required": metadata.get("skills_required"),
-                            "cost": metadata.get("cost"),
-                            "start_date": metadata.get("start_date"),
-                            "end_date": metadata.get("end_date"),
-                            "score": round(match.score, 3),
-                            "recommendation_type": "search",
-                            "is_registered": False,
-                            "similarity_score": match.score
-                        })
-                return jsonify({"recommendations": basic_recommendations})
-            except Exception as search_error:
-                print(f"❌ Basic search also failed: {search_error}")
-                return jsonify({"recommendations": []})
+        try:
+            stream = llm_engine.stream_ranked_recommendations if RANKING_MODE == "local" else llm_engine.stream_hybrid_recommendations
+            events = stream(
+                profile,
+                user_registrations,
+                lambda: get_collaborative_recommendations(user_id, limit=3)
+            )
+            for event, data in events:
+                if event != "done":
+                    yield sse_event(event, data)
+                    continue
+                recommendations = top_up_with_similarity(profile, user_registrations, data)
+                if USE_RECOMMENDATION_SNAPSHOTS:
+                    recommendation_store.put(user_id, version, recommendations, generation)
+                yield sse_event("done", {"recommendations": recommendations})
+        
+        except Exception as e:
+            logger.error("❌ Error streaming hybrid recommendations: %s", e)
+            yield sse_event("done", {"recommendations": fallback_recommendations(profile, user_registrations)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/recommendations/invalidate", methods=["POST"])
+@token_required
+def invalidate_recommendations():
+    """Drop the current user's snapshot so the next request recomputes it"""
+    recommendation_store.drop(session['user_id'])
+    return jsonify({"success": True})
 
 @app.route("/api/register-program", methods=["POST"])
 @token_required
@@ -545,9 +745,24 @@ def get_my_registrations():
     registrations = get_user_registrations(user_id)
     return jsonify({"registrations": registrations})
 
+@app.route("/api/embedding-cache/stats", methods=["GET"])
+@token_required
+def get_embedding_cache_stats():
+    return jsonify(embedding_cache.stats())
+
+@app.route("/api/llm-scheduler/stats", methods=["GET"])
+@token_required
+def get_llm_scheduler_stats():
+    return jsonify(llm_scheduler.stats())
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Per-stage and per-route latency histograms in the Prometheus text format"""
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/recommend", methods=["POST"])
 @token_required
-def recommend_programs():
+async def recommend_programs():
     data = request.json
     user_id = session['user_id']
     
@@ -562,7 +777,7 @@ def recommend_programs():
         return jsonify({"error": "Missing required fields"}), 400
     
     # Get user registrations first
-    registrations = get_user_registrations(user_id)
+    registrations = await run_in_worker(get_user_registrations, user_id)
     registered_program_ids = {reg['program_id'] for reg in registrations}
     
     # Convert month name to number
@@ -575,12 +790,12 @@ def recommend_programs():
     if max_cost and max_cost > 0:
         filters["cost"] = {"$lte": float(max_cost)}
     
-    # Create query
+    # Create query (embedded through the shared embedding cache by search_similar_programs)
     full_query = f"{interest}. Role: {role}. Skills to learn: {skills}. Level: {skill_level}. Available in: {available_month}."
     
     try:
         # Get only top 10 from Pinecone
-        results = search_similar_programs(full_query, filters=filters, top_k=10)
+        results = await run_in_worker(search_similar_programs, full_query, filters=filters, top_k=10)
         recommendations = []
         
         for match in results:
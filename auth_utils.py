@@ -0,0 +1,138 @@
+import os
+import logging
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import jwt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+# HS256 projects: the JWT secret from the Supabase API settings
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+# Asymmetric signing keys: verified against the project's JWKS, fetched and cached by PyJWKClient
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None)
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+SUPPORTED_ALGORITHMS = ("HS256", "RS256", "ES256")
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+# Used for remotely verified tokens whose exp claim cannot be read
+TOKEN_CACHE_FALLBACK_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_FALLBACK_TTL_SECONDS", "60"))
+
+_token_cache = OrderedDict()  # sha256(token) -> (user_id, expires_at)
+_token_cache_lock = threading.Lock()
+_jwks_client = None
+
+
+def _token_key(token: str):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str):
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del _token_cache[key]
+            return None
+        _token_cache.move_to_end(key)
+        return entry[0]
+
+
+def _cache_put(key: str, user_id: str, expires_at: float):
+    with _token_cache_lock:
+        _token_cache[key] = (user_id, expires_at)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+
+def _get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None and SUPABASE_JWKS_URL:
+        _jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True)
+    return _jwks_client
+
+
+def verify_token_locally(token: str):
+    """
+    Claims of a valid, unexpired token, or None if it cannot be verified locally.
+    Raises jwt.ExpiredSignatureError for a correctly signed but expired token.
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+        if algorithm not in SUPPORTED_ALGORITHMS:
+            return None
+        if algorithm == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                return None
+            key = SUPABASE_JWT_SECRET
+        else:
+            jwks_client = _get_jwks_client()
+            if jwks_client is None:
+                return None
+            key = jwks_client.get_signing_key_from_jwt(token).key
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=SUPABASE_JWT_AUDIENCE,
+            options={"require": ["exp", "sub"]}
+        )
+    except jwt.ExpiredSignatureError:
+        raise
+    except Exception as e:
+        logger.debug("⚠️ Local token verification unavailable: %s", e)
+        return None
+
+
+def verify_access_token(token: str, supabase_client):
+    """
+    Return the user id for a valid access token, or None.
+    Order: verified-token cache, local JWT verification, then supabase auth.get_user as fallback.
+    Verified tokens are cached (keyed by token hash) until their exp claim.
+    """
+    if not token:
+        return None
+
+    key = _token_key(token)
+    user_id = _cache_get(key)
+    if user_id:
+        return user_id
+
+    try:
+        claims = verify_token_locally(token)
+    except jwt.ExpiredSignatureError:
+        # Signature checked out, so there is no point asking Supabase
+        return None
+    if claims:
+        _cache_put(key, claims["sub"], float(claims["exp"]))
+        return claims["sub"]
+
+    try:
+        user = supabase_client.auth.get_user(token)
+        if not user or not user.user:
+            return None
+        try:
+            expires_at = float(jwt.decode(token, options={"verify_signature": False})["exp"])
+        except Exception:
+            expires_at = time.time() + TOKEN_CACHE_FALLBACK_TTL_SECONDS
+        _cache_put(key, user.user.id, expires_at)
+        return user.user.id
+    except Exception as e:
+        logger.error("❌ Remote token verification failed: %s", e)
+        return None
+
+
+def invalidate_token(token: str):
+    """Drop a token from the verified-token cache (e.g. on logout)"""
+    if not token:
+        return
+    with _token_cache_lock:
+        _token_cache.pop(_token_key(token), None)
@@ -0,0 +1,637 @@
+"""
+Offline benchmark for the recommendation pipeline.
+
+Runs get_collaborative_recommendations, get_hybrid_recommendations and the Flask routes
+against deterministic in-process stand-ins for Groq (ChatGroq), Nomic (nomic.embed), the
+Pinecone index and the Supabase client, so no network or credentials are needed. Each
+fake has configurable latency and failure injection and counts its calls. Synthetic
+catalogs and users are generated at multiples of today's size (the catalog CSV and
+--base-users).
+
+    python benchmark.py                                  # 10x, 100x, 1000x with default latencies
+    python benchmark.py --scales 10 --time-scale 0       # no simulated latency, just CPU cost
+    python benchmark.py --latency groq=1200 --failure-rate groq=0.05 --concurrency 8
+
+Every scale runs in a fresh subprocess, since the app keeps module-level state (clients,
+caches, indexes). Needs the app's own dependencies (langchain etc.) installed.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import types
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+CATALOG_CSV = os.getenv("CATALOG_CSV", "updated_programs (1).csv")
+EMBEDDING_DIM = 256
+SCENARIOS = ("collaborative", "hybrid", "route_recommendations", "route_search")
+BACKENDS = ("groq", "nomic", "pinecone", "supabase")
+# Milliseconds per call, roughly what production sees
+DEFAULT_LATENCY_MS = {"groq": 900.0, "nomic": 80.0, "pinecone": 40.0, "supabase": 30.0}
+# Extra Groq latency per 1000 prompt tokens
+DEFAULT_GROQ_MS_PER_1K_TOKENS = 150.0
+BENCH_JWT_SECRET = "benchmark-secret-not-for-production-use"
+
+ROLES = ["Quality Engineer", "Developer", "Consultant", "Data Analyst", "Architect", "Project Manager"]
+SKILL_LEVELS = ["Beginner", "Intermediate", "Advanced"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+
+class BackendFailure(Exception):
+    """Injected failure from a fake backend"""
+
+
+class FakeBackend:
+    """Latency, failure injection and call counting shared by one fake service"""
+    def __init__(self, name: str, latency_ms: float, failure_rate: float, time_scale: float, seed: int):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.time_scale = time_scale
+        self._random = random.Random(f"{seed}-{name}")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.tokens = 0
+
+    def call(self, extra_ms: float = 0.0, tokens: int = 0):
+        """Count one call, sleep for its simulated latency (+/-20% jitter), maybe fail"""
+        with self._lock:
+            self.calls += 1
+            self.tokens += tokens
+            jitter = self._random.uniform(0.8, 1.2)
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        delay = (self.latency_ms + extra_ms) * jitter * self.time_scale / 1000
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise BackendFailure(f"injected {self.name} failure")
+
+    def counters(self):
+        with self._lock:
+            return {"calls": self.calls, "failures": self.failures, "tokens": self.tokens}
+
+
+def _embed_text(text: str):
+    """Deterministic hashed bag-of-words embedding, so related texts are close"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % EMBEDDING_DIM] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# --- synthetic data -------------------------------------------------------------------
+
+def load_base_catalog(path: str = CATALOG_CSV):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def generate_catalog(base_rows: list, scale: int, seed: int):
+    """scale x the base catalog: each base program gets variants with their own id, cost, dates and vector"""
+    rng = np.random.default_rng(seed)
+    base_vectors = np.array([
+        _embed_text(f"{row['title']} {row['description']} {row['skills_required']} {row['category']}")
+        for row in base_rows
+    ])
+    count = len(base_rows) * scale
+    noise = rng.normal(0, 0.15 / np.sqrt(EMBEDDING_DIM), size=(count, EMBEDDING_DIM)).astype(np.float32)
+    vectors = base_vectors[np.arange(count) % len(base_rows)] + noise
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    programs = []
+    for i in range(count):
+        row = base_rows[i % len(base_rows)]
+        variant = i // len(base_rows)
+        month = 1 + (i * 7) % 12
+        programs.append({
+            "program_id": f"P{i + 1:06d}",
+            "title": row["title"] if variant == 0 else f"{row['title']} ({variant + 1})",
+            "description": row["description"],
+            "skills_required": row["skills_required"],
+            "category": row["category"],
+            "start_date": f"2025-{month:02d}-01",
+            "end_date": f"2025-{month:02d}-20",
+            "cost": float(int(row["cost"]) + (variant * 37) % 900)
+        })
+    return programs, vectors
+
+
+def generate_users(programs: list, count: int, seed: int):
+    """Profiles and registrations; users of one role favour the same categories, so collaborative filtering has signal"""
+    rng = random.Random(seed)
+    categories = sorted({program["category"] for program in programs})
+    by_category = {}
+    for program in programs:
+        by_category.setdefault(program["category"], []).append(program)
+
+    profiles, registrations = [], []
+    for i in range(count):
+        user_id = f"user-{i + 1:07d}"
+        role = ROLES[i % len(ROLES)]
+        favourite = [categories[(ROLES.index(role) + k) % len(categories)] for k in range(2)]
+        sample = rng.sample(by_category[favourite[0]], min(3, len(by_category[favourite[0]])))
+        profiles.append({
+            "id": user_id,
+            "email": f"{user_id}@example.com",
+            "full_name": f"Benchmark User {i + 1}",
+            "role": role,
+            "skill_level": SKILL_LEVELS[i % len(SKILL_LEVELS)],
+            "interests": " and ".join(favourite) + " " + sample[0]["skills_required"],
+            "preferred_skills": ", ".join(program["skills_required"] for program in sample),
+            "max_budget": rng.choice([2000, 3500, 5000, 150000]),
+            "preferred_month": rng.choice(MONTHS)
+        })
+        # A quarter of users are new (no registrations) and go through the profile-match path
+        if i % 4 == 0:
+            continue
+        pool = by_category[favourite[0]] + by_category[favourite[1]]
+        for program in rng.sample(pool, min(rng.randint(1, 4), len(pool))):
+            registrations.append({
+                "id": len(registrations) + 1,
+                "user_id": user_id,
+                "program_id": program["program_id"],
+                "program_title": program["title"],
+                "registered_at": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00+00:00"
+            })
+    return profiles, registrations
+
+
+# --- fake clients ---------------------------------------------------------------------
+
+class FakeQuery:
+    """The subset of the PostgREST query builder supabase_utils uses"""
+    def __init__(self, client, table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = None
+        self._payload = None
+        self._filters = []
+        self._order = None
+
+    def select(self, columns: str = "*"):
+        if columns.strip() != "*":
+            self._columns = [column.strip() for column in columns.split(",")]
+        return self
+
+    def eq(self, column, value):
+        self._filters.append((column, {value}))
+        return self
+
+    def in_(self, column, values):
+        self._filters.append((column, set(values)))
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def insert(self, payload):
+        self._op, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload):
+        self._op, self._payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self._op, self._payload = "update", payload
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def _matches(self, row):
+        return all(row.get(column) in values for column, values in self._filters)
+
+    def execute(self):
+        self._client.backend.call()
+        return types.SimpleNamespace(data=self._client.run(self))
+
+
+class FakeSupabase:
+    """In-memory user_profiles / program_registrations tables; auth is local JWT only"""
+    def __init__(self, backend: FakeBackend, profiles: list, registrations: list):
+        self.backend = backend
+        self._tables = {"user_profiles": [dict(p) for p in profiles], "program_registrations": [dict(r) for r in registrations]}
+        # Equality lookups on these columns are served from an index, as Postgres would
+        self._indexed = {("user_profiles", "id"), ("program_registrations", "user_id")}
+        self._lock = threading.Lock()
+        self._rebuild_indexes()
+        self.auth = types.SimpleNamespace(
+            get_user=self._get_user,
+            sign_in_with_password=self._sign_in,
+            sign_up=self._sign_in
+        )
+
+    def _rebuild_indexes(self):
+        self._index = {}
+        for table, column in self._indexed:
+            lookup = self._index[(table, column)] = {}
+            for row in self._tables[table]:
+                lookup.setdefault(row.get(column), []).append(row)
+
+    def table(self, name: str):
+        return FakeQuery(self, name)
+
+    def run(self, query: FakeQuery):
+        with self._lock:
+            rows = self._tables[query._table]
+            if query._op == "select":
+                indexed = next((f for f in query._filters if (query._table, f[0]) in self._indexed), None)
+                if indexed:
+                    lookup = self._index[(query._table, indexed[0])]
+                    rows = [row for value in indexed[1] for row in lookup.get(value, [])]
+                result = [row for row in rows if query._matches(row)]
+                if query._order:
+                    column, desc = query._order
+                    result.sort(key=lambda row: str(row.get(column) or ""), reverse=desc)
+                if query._columns:
+                    result = [{column: row.get(column) for column in query._columns} for row in result]
+                return [dict(row) for row in result]
+
+            if query._op in ("insert", "upsert"):
+                new_rows = query._payload if isinstance(query._payload, list) else [query._payload]
+                for new_row in new_rows:
+                    existing = next((row for row in rows if "id" in new_row and row.get("id") == new_row["id"]), None)
+                    if existing and query._op == "upsert":
+                        existing.update(new_row)
+                    else:
+                        rows.append(dict(new_row))
+                self._rebuild_indexes()
+                return new_rows
+
+            matched = [row for row in rows if query._matches(row)]
+            if query._op == "update":
+                for row in matched:
+                    row.update(query._payload)
+            else:
+                self._tables[query._table] = [row for row in rows if not query._matches(row)]
+            self._rebuild_indexes()
+            return matched
+
+    def _get_user(self, token):
+        self.backend.call()
+        import jwt
+        claims = jwt.decode(token, BENCH_JWT_SECRET, algorithms=["HS256"], audience="authenticated")
+        return types.SimpleNamespace(user=types.SimpleNamespace(id=claims["sub"]))
+
+    def _sign_in(self, credentials):
+        self.backend.call()
+        raise BackendFailure("auth is not simulated")
+
+
+class _CatalogSource:
+    """Catalog in the shape LocalProgramIndex loads from (list pages, fetch by id)"""
+    def __init__(self, programs: list, vectors):
+        from local_index import LocalVector
+        self._records = {
+            f"program-{program['program_id']}": LocalVector(f"program-{program['program_id']}", vectors[i].tolist(), program)
+            for i, program in enumerate(programs)
+        }
+
+    def list(self):
+        yield list(self._records)
+
+    def fetch(self, ids: list, **kwargs):
+        from local_index import LocalFetchResponse
+        return LocalFetchResponse({vector_id: self._records[vector_id] for vector_id in ids if vector_id in self._records})
+
+
+class FakePineconeIndex:
+    """Brute-force index with Pinecone's query/fetch/list surface (exact search, same filter subset)"""
+    def __init__(self, backend: FakeBackend, programs: list, vectors):
+        from local_index import LocalProgramIndex
+        self.backend = backend
+        self._source = _CatalogSource(programs, vectors)
+        self._store = LocalProgramIndex(self._source)
+        self._store.refresh()
+
+    def query(self, vector=None, top_k: int = 10, include_metadata: bool = True, filter: dict = None, **kwargs):
+        self.backend.call()
+        return self._store.query(vector=vector, top_k=top_k, include_metadata=include_metadata, filter=filter)
+
+    def fetch(self, ids: list, **kwargs):
+        self.backend.call()
+        return self._store.fetch(ids)
+
+    def list(self, **kwargs):
+        self.backend.call()
+        return self._source.list()
+
+
+def _install_fake_modules(backends: dict, groq_ms_per_1k_tokens: float, programs: list, vectors, profiles: list, registrations: list):
+    """Register fake langchain_groq, nomic, pinecone and supabase modules before the app imports them"""
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    groq = backends["groq"]
+    nomic_backend = backends["nomic"]
+
+    class FakeChatGroq(BaseChatModel):
+        """Deterministic stand-in for ChatGroq: picks programs from the prompt's search results"""
+        groq_api_key: str = None
+        model_name: str = "fake"
+        temperature: float = 0.0
+
+        @property
+        def _llm_type(self):
+            return "fake-groq"
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            prompt = "\n".join(str(message.content) for message in messages)
+            tokens = len(prompt) // 4
+            groq.call(extra_ms=groq_ms_per_1k_tokens * tokens / 1000, tokens=tokens)
+
+            if "AVAILABLE PROGRAMS" in prompt:
+                # One "program_id | title | ..." line per candidate; registered programs are already left out
+                candidates = [pid for pid in dict.fromkeys(re.findall(r"^(\S+) \| ", prompt, re.MULTILINE)) if pid != "program_id"]
+                content = json.dumps([
+                    {
+                        "program_id": pid,
+                        "recommendation_score": round(0.95 - 0.05 * i, 2),
+                        "recommendation_reason": f"Benchmark pick {i + 1}",
+                        "skills_gained": "Benchmark skills",
+                        "career_impact": "Benchmark impact",
+                        "urgency": "medium"
+                    }
+                    for i, pid in enumerate(candidates[:3])
+                ])
+            else:
+                content = json.dumps({
+                    "recommendation_reason": "Benchmark enhancement",
+                    "skills_gained": "Benchmark skills",
+                    "career_impact": "Benchmark impact",
+                    "urgency": "medium",
+                    "enhanced_explanation": "Benchmark explanation"
+                })
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def embed_text(texts, model=None, **kwargs):
+        nomic_backend.call()
+        return {"embeddings": [_embed_text(text.split(": ", 1)[-1]).tolist() for text in texts]}
+
+    index = FakePineconeIndex(backends["pinecone"], programs, vectors)
+    supabase = FakeSupabase(backends["supabase"], profiles, registrations)
+
+    modules = {
+        "langchain_groq": types.SimpleNamespace(ChatGroq=FakeChatGroq),
+        "nomic": types.SimpleNamespace(embed=types.SimpleNamespace(text=embed_text)),
+        "pinecone": types.SimpleNamespace(Pinecone=lambda *args, **kwargs: types.SimpleNamespace(Index=lambda name, **kw: index)),
+        "supabase": types.SimpleNamespace(create_client=lambda url, key, *args, **kwargs: supabase, Client=FakeSupabase)
+    }
+    for name, attrs in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(vars(attrs))
+        sys.modules[name] = module
+
+
+# --- scenarios ------------------------------------------------------------------------
+
+def _percentiles(samples: list):
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return {"p50": round(float(p50), 1), "p95": round(float(p95), 1), "p99": round(float(p99), 1)}
+
+
+def run_scale(args):
+    """Build one scale's data, import the app against the fakes and run every scenario"""
+    started = time.perf_counter()
+    base_rows = load_base_catalog(args.catalog)
+    programs, vectors = generate_catalog(base_rows, args.scale, args.seed)
+    profiles, registrations = generate_users(programs, args.base_users * args.scale, args.seed)
+
+    backends = {
+        name: FakeBackend(name, args.latency.get(name, DEFAULT_LATENCY_MS[name]), args.failure_rate.get(name, 0.0), args.time_scale, args.seed)
+        for name in BACKENDS
+    }
+
+    tmp_dir = tempfile.mkdtemp(prefix="benchmark-")
+    os.environ.update({
+        "SUPABASE_URL": "http://benchmark.invalid",
+        "SUPABASE_ANON_KEY": "benchmark",
+        "SUPABASE_JWT_SECRET": BENCH_JWT_SECRET,
+        "SUPABASE_JWKS_URL": "http://benchmark.invalid/jwks",
+        "PINECONE_API_KEY": "benchmark",
+        "GROQ_API_KEY": "benchmark",
+        "SIMILARITY_GRAPH_PATH": os.path.join(tmp_dir, "similarity_graph.json"),
+        "EMBEDDING_CACHE_PATH": "",
+        "LLM_CACHE_PATH": "",
+        "USE_RECOMMENDATION_SNAPSHOTS": "true" if args.snapshots else "false",
+        # No background warm-up thread competing with the measured requests; --warmup covers it
+        "STARTUP_MODE": "lazy",
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")
+    })
+    _install_fake_modules(backends, args.groq_ms_per_1k_tokens, programs, vectors, profiles, registrations)
+    setup_seconds = time.perf_counter() - started
+
+    import jwt
+    from app import app
+    from data_loader import request_scope
+    from supabase_utils import get_user_profile, get_user_registrations, get_collaborative_recommendations
+    from llm_recommendations import llm_engine
+    import_seconds = time.perf_counter() - started - setup_seconds
+
+    def collaborative(user_id):
+        with request_scope():
+            get_collaborative_recommendations(user_id, limit=3)
+
+    def hybrid(user_id):
+        with request_scope():
+            profile = get_user_profile(user_id)
+            user_registrations = get_user_registrations(user_id)
+            collaborative_recs = get_collaborative_recommendations(user_id, limit=3)
+            llm_engine.get_hybrid_recommendations(profile, user_registrations, collaborative_recs)
+
+    clients = threading.local()
+
+    def client_for(user_id):
+        if not hasattr(clients, "client"):
+            clients.client = app.test_client()
+        token = jwt.encode({"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600}, BENCH_JWT_SECRET, algorithm="HS256")
+        with clients.client.session_transaction() as session:
+            session["access_token"] = token
+        return clients.client
+
+    def route_recommendations(user_id):
+        response = client_for(user_id).get("/api/recommendations")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+    profile_of = {profile["id"]: profile for profile in profiles}
+
+    def route_search(user_id):
+        profile = profile_of[user_id]
+        response = client_for(user_id).post("/recommend", json={
+            "interest": profile["interests"],
+            "role": profile["role"],
+            "skill_level": profile["skill_level"],
+            "skills": profile["preferred_skills"],
+            "available_month": profile["preferred_month"],
+            "max_cost": profile["max_budget"]
+        })
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+
+    scenario_fns = {
+        "collaborative": collaborative,
+        "hybrid": hybrid,
+        "route_recommendations": route_recommendations,
+        "route_search": route_search
+    }
+
+    rng = random.Random(args.seed)
+    user_ids = [profile["id"] for profile in profiles]
+    results = {}
+    for name in args.scenarios:
+        fn = scenario_fns[name]
+        for user_id in rng.sample(user_ids, min(args.warmup, len(user_ids))):
+            try:
+                fn(user_id)
+            except Exception:
+                pass
+
+        sample = [rng.choice(user_ids) for _ in range(args.requests)]
+        before = {backend: backends[backend].counters() for backend in BACKENDS}
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def timed_call(user_id):
+            nonlocal errors
+            call_started = time.perf_counter()
+            try:
+                fn(user_id)
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - call_started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(timed_call, sample))
+        wall = time.perf_counter() - wall_started
+
+        after = {backend: backends[backend].counters() for backend in BACKENDS}
+        results[name] = {
+            "requests": len(sample),
+            "errors": errors,
+            "throughput_rps": round(len(sample) / wall, 2) if wall else None,
+            **_percentiles(latencies),
+            "backend_calls": {
+                backend: {key: after[backend][key] - before[backend][key] for key in after[backend]}
+                for backend in BACKENDS
+            }
+        }
+
+    return {
+        "scale": args.scale,
+        "programs": len(programs),
+        "users": len(profiles),
+        "registrations": len(registrations),
+        "setup_seconds": round(setup_seconds, 2),
+        "import_seconds": round(import_seconds, 2),
+        "scenarios": results
+    }
+
+
+def print_report(report: dict):
+    print(f"\n=== {report['scale']}x: {report['programs']} programs, {report['users']} users, "
+          f"{report['registrations']} registrations (data {report['setup_seconds']}s, import {report['import_seconds']}s) ===")
+    header = f"{'scenario':<24}{'n':>6}{'err':>6}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}   calls per backend (failed)"
+    print(header)
+    print("-" * len(header))
+    for name, result in report["scenarios"].items():
+        calls = "  ".join(
+            f"{backend} {counts['calls']}" + (f" ({counts['failures']})" if counts["failures"] else "")
+            for backend, counts in result["backend_calls"].items()
+        )
+        print(f"{name:<24}{result['requests']:>6}{result['errors']:>6}{result['throughput_rps']:>9}"
+              f"{result['p50']:>10}{result['p95']:>10}{result['p99']:>10}   {calls}")
+        tokens = result["backend_calls"]["groq"]["tokens"]
+        if tokens:
+            print(f"{'':<24}groq prompt tokens: {tokens} ({tokens // max(result['backend_calls']['groq']['calls'], 1)} per call)")
+
+
+def _parse_backend_values(pairs: list):
+    values = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if name not in BACKENDS:
+            raise argparse.ArgumentTypeError(f"unknown backend '{name}', expected one of {', '.join(BACKENDS)}")
+        values[name] = float(value)
+    return values
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation pipeline against simulated backends")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000], help="multiples of today's catalog and user count")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=50, help="measured calls per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured calls per scenario before measuring")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--base-users", type=int, default=20, help="today's number of users")
+    parser.add_argument("--catalog", default=CATALOG_CSV, help="today's catalog, used as the template for synthetic programs")
+    parser.add_argument("--latency", nargs="*", default=[], metavar="BACKEND=MS", help=f"per-call latency, defaults {DEFAULT_LATENCY_MS}")
+    parser.add_argument("--groq-ms-per-1k-tokens", type=float, default=DEFAULT_GROQ_MS_PER_1K_TOKENS)
+    parser.add_argument("--failure-rate", nargs="*", default=[], metavar="BACKEND=P", help="probability each call fails")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier for all simulated latency (0 = none)")
+    parser.add_argument("--snapshots", action="store_true", help="leave recommendation snapshots on (repeat users are served from them)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the full report to this file")
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.latency = _parse_backend_values(args.latency)
+    args.failure_rate = _parse_backend_values(args.failure_rate)
+
+    if args.worker_output:
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(run_scale(args), f)
+        return
+
+    reports = []
+    for scale in args.scales:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            output = f.name
+        # The worker ignores --scales and runs only --scale
+        command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--scale", str(scale), "--worker-output", output]
+        print(f"⏳ Running {scale}x ...", flush=True)
+        completed = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            print(f"❌ {scale}x run failed (exit code {completed.returncode})")
+            continue
+        with open(output, encoding="utf-8") as f:
+            report = json.load(f)
+        os.unlink(output)
+        reports.append(report)
+        print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
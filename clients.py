@@ -0,0 +1,120 @@
+"""
+Shared backend clients.
+
+Every module uses the same Pinecone client, "programs" index, Supabase client and Nomic
+embed module from here instead of building its own at import time. Each client is created
+on first use (once per process, under a lock), so importing the app opens no connections
+and needs no credentials, and each backend gets exactly one HTTP connection pool.
+
+Pool sizes and keep-alive are tunable:
+  PINECONE_POOL_THREADS         worker threads / pooled connections of the Pinecone client
+  SUPABASE_MAX_CONNECTIONS      connections in the Supabase httpx pool
+  SUPABASE_KEEPALIVE_CONNECTIONS idle connections kept open
+  SUPABASE_KEEPALIVE_SECONDS    how long an idle connection is kept
+"""
+import os
+import logging
+import time
+import threading
+from metrics import instrument_index, instrument_supabase
+from startup import record_load
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "programs"
+
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "8"))
+SUPABASE_MAX_CONNECTIONS = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_KEEPALIVE_CONNECTIONS", "10"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "30"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "30"))
+
+
+class LazyClient:
+    """Proxy that builds its client (or any heavy object) on first attribute access and forwards everything to it"""
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    self._client = self._factory()
+                    record_load(self._name, time.perf_counter() - started)
+                    logger.info("🔌 Initialized %s in %.2fs", self._name, time.perf_counter() - started)
+                client = self._client
+        return client
+
+    @property
+    def initialized(self):
+        return self._client is not None
+
+    def reset(self):
+        """Drop the client so the next use builds a new one (e.g. after rotating credentials)"""
+        with self._lock:
+            self._client = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+def _create_pinecone():
+    from pinecone import Pinecone
+    return Pinecone(api_key=os.getenv("PINECONE_API_KEY"), pool_threads=PINECONE_POOL_THREADS)
+
+
+def _create_remote_index():
+    return pinecone_client.Index(INDEX_NAME, pool_threads=PINECONE_POOL_THREADS)
+
+
+def _create_program_index():
+    # With USE_LOCAL_INDEX enabled this is the in-process mirror, otherwise the Pinecone index itself
+    from local_index import get_program_index
+    return instrument_index(get_program_index(remote_index.get()))
+
+
+def _supabase_options():
+    """Client options with a tuned httpx pool, or None when this supabase version can't take one"""
+    try:
+        import httpx
+        from supabase.lib.client_options import SyncClientOptions
+        limits = httpx.Limits(
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS
+        )
+        return SyncClientOptions(httpx_client=httpx.Client(limits=limits, timeout=SUPABASE_TIMEOUT_SECONDS))
+    except (ImportError, TypeError) as e:
+        logger.warning("⚠️ Supabase pool settings not supported by the installed client, using its defaults: %s", e)
+        return None
+
+
+def _create_supabase():
+    from supabase import create_client
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_ANON_KEY")
+    options = _supabase_options()
+    client = create_client(url, key, options=options) if options is not None else create_client(url, key)
+    # Every table(...).execute() is timed per table for /metrics and Server-Timing
+    return instrument_supabase(client)
+
+
+def _create_nomic_embed():
+    from nomic import embed
+    return embed
+
+
+pinecone_client = LazyClient("Pinecone", _create_pinecone)
+# The raw Pinecone index, for bulk jobs (ingestion, graph builds) that must not go through the mirror
+remote_index = LazyClient("Pinecone index", _create_remote_index)
+# The index request handlers query: local mirror or remote, instrumented
+program_index = LazyClient("program index", _create_program_index)
+supabase_client = LazyClient("Supabase", _create_supabase)
+nomic_embed = LazyClient("Nomic", _create_nomic_embed)
@@ -0,0 +1,206 @@
+import os
+import logging
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Full reload from the registrations table at most this often, to pick up writes from other processes
+COLLABORATIVE_REFRESH_SECONDS = float(os.getenv("COLLABORATIVE_REFRESH_SECONDS", "300"))
+
+
+class CollaborativeEngine:
+    """
+    Registration-based collaborative filtering. Loaded once from load_registrations()
+    (rows of user_id, program_id, program_title); the program x program co-registration
+    matrix is built from the sparse user x program matrix on each full load, and
+    add_registration/remove_registration update it in place, in time proportional to the
+    user's own registrations, so writes never trigger a rebuild.
+    """
+    def __init__(self, load_registrations):
+        self._load_registrations = load_registrations
+        self._lock = threading.Lock()
+        self._user_programs = {}   # user_id -> set(program_id)
+        self._program_titles = {}  # program_id -> title
+        self._loaded_at = 0.0
+        self._has_data = False  # set by the first successful load; refresh() keeps it
+        self._dirty = True  # set by a full load; the matrix is rebuilt on next use
+        self._program_ids = []
+        self._program_index = {}
+        # _co[i, j] = users registered for both programs i and j (so _co[i, i] = registrations
+        # of i). Allocated with spare rows and columns; only [:n, :n] for n programs is in use.
+        self._co = np.zeros((0, 0), dtype=np.int32)
+
+    def _ensure_loaded(self):
+        """
+        (Re)load when due. A failed read is never cached: with nothing loaded yet the error
+        propagates, on a periodic reload the previous data keeps being served; either way
+        _loaded_at is not stamped, so the next call retries.
+        """
+        if self._loaded_at and time.time() - self._loaded_at < COLLABORATIVE_REFRESH_SECONDS:
+            return
+        try:
+            rows = self._load_registrations() or []
+        except Exception as e:
+            if not self._has_data:
+                raise
+            logger.error("❌ Collaborative engine reload failed, keeping previous registrations: %s", e)
+            return
+        user_programs, program_titles = {}, {}
+        for row in rows:
+            user_programs.setdefault(row['user_id'], set()).add(row['program_id'])
+            program_titles[row['program_id']] = row.get('program_title')
+        self._user_programs = user_programs
+        self._program_titles = program_titles
+        self._loaded_at = time.time()
+        self._has_data = True
+        self._dirty = True
+        logger.info("📥 Collaborative engine loaded %s registrations for %s users", len(rows), len(user_programs))
+
+    def _ensure_matrix(self):
+        self._ensure_loaded()
+        if not self._dirty:
+            return
+        from scipy import sparse
+        program_ids = sorted({pid for programs in self._user_programs.values() for pid in programs})
+        program_index = {pid: j for j, pid in enumerate(program_ids)}
+
+        rows, cols = [], []
+        for i, programs in enumerate(self._user_programs.values()):
+            for pid in programs:
+                rows.append(i)
+                cols.append(program_index[pid])
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(self._user_programs), len(program_ids))
+        )
+        self._co = (matrix.T @ matrix).toarray()
+        self._program_ids = program_ids
+        self._program_index = program_index
+        self._dirty = False
+
+    @property
+    def _co_used(self):
+        n = len(self._program_ids)
+        return self._co[:n, :n]
+
+    def _column(self, program_id: str):
+        """Index of program_id in the matrix, adding it (and growing the matrix) when new"""
+        j = self._program_index.get(program_id)
+        if j is not None:
+            return j
+        j = len(self._program_ids)
+        if j == self._co.shape[0]:
+            grown = np.zeros((max(2 * j, 16),) * 2, dtype=np.int32)
+            grown[:j, :j] = self._co[:j, :j]
+            self._co = grown
+        self._program_ids.append(program_id)
+        self._program_index[program_id] = j
+        return j
+
+    def _count_co_registrations(self, program_id: str, others: set, delta: int):
+        """Shift the co-registration counts of program_id with others and with itself by delta"""
+        j = self._column(program_id)
+        cols = [self._program_index[pid] for pid in others if pid != program_id]
+        self._co[j, cols] += delta
+        self._co[cols, j] += delta
+        self._co[j, j] += delta
+
+    def refresh(self):
+        """Force a full reload on next use"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def add_registration(self, user_id: str, program_id: str, program_title: str = None):
+        with self._lock:
+            if not self._has_data:
+                return  # Nothing loaded yet; the first read will include this row
+            programs = self._user_programs.setdefault(user_id, set())
+            if program_title:
+                self._program_titles[program_id] = program_title
+            if program_id in programs:
+                return
+            if not self._dirty:
+                self._count_co_registrations(program_id, programs, 1)
+            programs.add(program_id)
+
+    def remove_registration(self, user_id: str, program_id: str):
+        with self._lock:
+            if not self._has_data:
+                return
+            programs = self._user_programs.get(user_id, set())
+            if program_id not in programs:
+                return
+            programs.discard(program_id)
+            if not self._dirty:
+                self._count_co_registrations(program_id, programs, -1)
+
+    def get_user_programs(self, user_id: str):
+        with self._lock:
+            self._ensure_loaded()
+            return set(self._user_programs.get(user_id, set()))
+
+    def get_registration_counts(self, program_ids: list):
+        """{program_id: number of registered users} from the co-registration diagonal"""
+        with self._lock:
+            self._ensure_matrix()
+            counts = np.diagonal(self._co_used)
+            return {
+                pid: int(counts[self._program_index[pid]]) if pid in self._program_index else 0
+                for pid in program_ids
+            }
+
+    def get_program_title(self, program_id: str):
+        return self._program_titles.get(program_id)
+
+    def _top_k(self, scores, exclude: set, limit: int, min_score: float):
+        if limit <= 0:
+            return []
+        for pid in exclude:
+            j = self._program_index.get(pid)
+            if j is not None:
+                scores[j] = -np.inf
+        candidates = np.flatnonzero(scores >= min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self._program_ids[j], float(scores[j])) for j in candidates]
+
+    def recommend_from_user_weights(self, user_id: str, user_weights: dict, limit: int = 3, min_score: float = 5):
+        """
+        User-user filtering: each program scores the sum of the weights of the given users
+        registered for it. Programs user_id already holds are excluded.
+        Returns [(program_id, score)] best first.
+        """
+        with self._lock:
+            self._ensure_matrix()
+            if not self._program_ids:
+                return []
+            scores = np.zeros(len(self._program_ids))
+            for other_id, weight in user_weights.items():
+                cols = [self._program_index[pid] for pid in self._user_programs.get(other_id, ())]
+                scores[cols] += weight
+            return self._top_k(scores, self._user_programs.get(user_id, set()), limit, min_score)
+
+    def recommend_item_based(self, user_id: str, limit: int = 3, min_score: float = 0.0):
+        """
+        Item-item filtering: programs score the mean cosine similarity (over co-registrations)
+        to the programs user_id is registered for. Returns [(program_id, score)] best first.
+        """
+        with self._lock:
+            self._ensure_matrix()
+            registered = self._user_programs.get(user_id, set())
+            cols = [self._program_index[pid] for pid in registered if pid in self._program_index]
+            if not cols:
+                return []
+            # Only the user's rows of the cosine similarity are needed: co[i, j] / (|i| |j|)
+            co = self._co_used
+            norms = np.sqrt(np.diagonal(co).astype(np.float64))
+            norms[norms == 0] = 1.0
+            scores = (co[cols] / norms[cols, None] / norms).mean(axis=0)
+            return self._top_k(scores, registered, limit, max(min_score, 1e-9))
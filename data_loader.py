@@ -0,0 +1,150 @@
+"""
+Request-scoped, DataLoader-style memoization of Supabase reads.
+
+Within `with request_scope():` every entity is read at most once: supabase_utils routes
+profile and registration reads through the active scope, which batches misses into one
+`in` query and memoizes the result until the scope ends. A failed query is not memoized:
+the error reaches the caller and the next read tries again. Outside a scope reads go
+straight to the database as before.
+
+Async views hand blocking calls to run_in_worker, which runs them on one process-wide
+thread pool (BLOCKING_IO_WORKERS threads) inside a copy of the request's context. Flask runs
+each async view on a fresh event loop, so asyncio.to_thread would build a new default
+executor, and new threads, for every request.
+"""
+import os
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "32"))
+
+_current_scope = contextvars.ContextVar("data_loader_scope", default=None)
+
+
+class Loader:
+    """
+    Memoizing loader for one entity type; batch_fn(keys) returns {key: value} for the keys it
+    found, and default_factory() supplies the value for keys it didn't (None without one).
+    Each key is resolved through a future: concurrent callers wait for the batch already
+    fetching it rather than holding a lock across the query, and if batch_fn raises, its
+    keys are forgotten so a later load retries them.
+    """
+    def __init__(self, batch_fn, default_factory=None):
+        self._batch_fn = batch_fn
+        self._default_factory = default_factory
+        self._values = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.batches = 0
+
+    def _default(self):
+        return self._default_factory() if self._default_factory is not None else None
+
+    def load_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        missing = []
+        with self._lock:
+            futures = {}
+            for key in keys:
+                if key not in self._values:
+                    self._values[key] = Future()
+                    missing.append(key)
+                futures[key] = self._values[key]
+            if missing:
+                self.batches += 1
+
+        if missing:
+            try:
+                found = self._batch_fn(missing) or {}
+            except Exception as e:
+                with self._lock:
+                    for key in missing:
+                        self._values.pop(key, None)
+                for key in missing:
+                    futures[key].set_exception(e)
+                raise
+            for key in missing:
+                futures[key].set_result(found[key] if key in found else self._default())
+        return [futures[key].result() for key in keys]
+
+    def load(self, key):
+        return self.load_many([key])[0]
+
+    def prime(self, key, value):
+        future = Future()
+        future.set_result(value)
+        with self._lock:
+            self._values[key] = future
+
+    def clear(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class RequestScope:
+    """The set of loaders shared by everything that runs inside one request"""
+    def __init__(self, loader_factories: dict):
+        self._loader_factories = loader_factories
+        self._loaders = {}
+        self._lock = threading.Lock()
+
+    def loader(self, name: str):
+        with self._lock:
+            if name not in self._loaders:
+                self._loaders[name] = self._loader_factories[name]()
+            return self._loaders[name]
+
+
+_loader_factories = {}
+
+def register_loader(name: str, batch_fn, default_factory=None):
+    """Declare an entity loader; each request scope gets its own fresh instance"""
+    _loader_factories[name] = lambda: Loader(batch_fn, default_factory)
+
+
+def get_loader(name: str):
+    """The active request's loader for name, or None outside a request scope"""
+    scope = _current_scope.get()
+    return scope.loader(name) if scope is not None else None
+
+
+def begin_request_scope():
+    """Start a scope; returns a token for end_request_scope (for before/teardown request hooks)"""
+    return _current_scope.set(RequestScope(_loader_factories))
+
+
+def end_request_scope(token):
+    _current_scope.reset(token)
+
+
+@contextmanager
+def request_scope():
+    token = begin_request_scope()
+    try:
+        yield
+    finally:
+        end_request_scope(token)
+
+
+def bind_to_scope(fn):
+    """
+    Wrap fn to run in a copy of the caller's context, so work handed to a worker thread
+    shares the request's loaders. Call once per submitted task: a context copy cannot be
+    entered by two threads at the same time.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+def run_in_worker(fn, *args, **kwargs):
+    """Awaitable fn(*args, **kwargs) on the shared blocking-I/O pool, in the caller's request scope"""
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_blocking_executor, bind_to_scope(functools.partial(fn, *args, **kwargs)))
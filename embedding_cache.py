@@ -0,0 +1,52 @@
+import os
+import json
+from persistent_cache import PersistentLRUCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "0"))  # 0 = never expire
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")  # empty = memory only
+
+
+def normalize_text(text: str):
+    """Collapse whitespace so trivially different spellings of a query share one entry"""
+    return " ".join((text or "").split())
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed on (model, input_type, normalized text), stored in a
+    PersistentLRUCache (memory LRU with optional TTL, optional SQLite tier at disk_path).
+    """
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL_SECONDS, disk_path: str = EMBEDDING_CACHE_PATH):
+        self._cache = PersistentLRUCache(
+            "Embedding", "embedding_cache", max_size, ttl_seconds, disk_path,
+            serialize=lambda embedding: json.dumps(list(embedding))
+        )
+
+    @staticmethod
+    def _key(model: str, input_type: str, text: str):
+        return json.dumps([model, input_type, normalize_text(text)])
+
+    def get(self, model: str, input_type: str, text: str):
+        """Cached embedding or None; counts a hit or a miss"""
+        return self._cache.get(self._key(model, input_type, text))
+
+    def put(self, model: str, input_type: str, text: str, embedding):
+        self._cache.put(self._key(model, input_type, text), embedding)
+
+    def get_or_compute(self, model: str, input_type: str, text: str, compute):
+        """Return the cached embedding, or call compute() and cache a non-None result"""
+        return self._cache.get_or_compute(self._key(model, input_type, text), compute)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+# Shared by pinecone_utils.embed_text and llm_recommendations.embed_text_nomic
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,342 @@
+"""
+Catalog ingestion: CSV -> Nomic embeddings -> Pinecone "programs" index.
+
+    python ingest_catalog.py                      # index CATALOG_CSV, resuming an interrupted run
+    python ingest_catalog.py catalog.csv --restart
+
+Rows are streamed in chunks. Each chunk is embedded in provider-sized batches with several
+requests in flight, then upserted in parallel batches; every embed and upsert call is
+retried with exponential backoff. After a chunk is fully upserted its position is written
+to a checkpoint file, so a crash partway through a large catalog resumes from the last
+completed chunk instead of starting over.
+
+A manifest of content hashes (embedded text and metadata per program-{id} vector) makes
+re-runs incremental: only programs whose text changed are re-embedded, programs whose
+cost/dates/other metadata changed get a metadata-only update, unchanged programs are
+skipped and vectors of programs no longer in the CSV are deleted. Pass --full to
+re-embed everything. The manifest is a SQLite file; each chunk upserts only the rows
+whose hashes changed, so saving it costs the size of the diff, not of the catalog.
+
+Vectors are embedded with the same Nomic model the app queries with ("search_document"
+side); run `python similarity_graph.py` afterwards to refresh the similarity graph.
+"""
+import os
+import json
+import hashlib
+import sqlite3
+import time
+import random
+import logging
+import argparse
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CATALOG_CSV = os.getenv("CATALOG_CSV", "updated_programs (1).csv")
+EMBEDDING_MODEL = "nomic-embed-text-v1.5"
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "1000"))
+# Texts per Nomic request and concurrent requests
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_EMBED_WORKERS = int(os.getenv("INGEST_EMBED_WORKERS", "4"))
+# Pinecone recommends at most 100 vectors (and 2MB) per upsert request
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "5"))
+INGEST_CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT_PATH", ".ingest_checkpoint.json")
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "catalog_manifest.db")
+INGEST_DELETE_BATCH_SIZE = 1000
+
+
+def with_retry(fn, description: str, max_retries: int = INGEST_MAX_RETRIES, base_delay: float = 1.0):
+    """Call fn(), retrying failures with exponential backoff plus jitter; re-raises the last error"""
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == max_retries:
+                logger.error("❌ %s failed after %s attempts: %s", description, attempt + 1, e)
+                raise
+            delay = base_delay * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("⚠️ %s failed (%s), retrying in %.1fs", description, e, delay)
+            time.sleep(delay)
+
+
+def program_text(row: dict):
+    """The text that is embedded for a program"""
+    return f"{row['title']}. {row['description']} Skills: {row['skills_required']}"
+
+
+def program_metadata(row: dict):
+    return {
+        "program_id": str(row["program_id"]),
+        "title": row["title"],
+        "category": row["category"],
+        "start_date": row["start_date"],
+        "end_date": row["end_date"],
+        "cost": float(row["cost"]),
+        "skills_required": row["skills_required"]
+    }
+
+
+def read_catalog_chunks(csv_path: str, chunk_size: int = INGEST_CHUNK_SIZE):
+    """Yield lists of (vector_id, text, metadata) for chunk_size CSV rows at a time"""
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, dtype=str, keep_default_na=False):
+        rows = chunk.to_dict("records")
+        yield [(f"program-{row['program_id']}", program_text(row), program_metadata(row)) for row in rows]
+
+
+def _embed_batch(texts: list):
+    from clients import nomic_embed
+    output = nomic_embed.text(
+        texts=[f"search_document: {text}" for text in texts],
+        model=EMBEDDING_MODEL
+    )
+    return output['embeddings']
+
+
+def embed_documents(texts: list, batch_size: int = INGEST_EMBED_BATCH_SIZE, workers: int = INGEST_EMBED_WORKERS):
+    """Embed texts in batch_size requests, up to workers at a time; order is preserved"""
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def embed_with_retry(numbered_batch):
+        number, batch = numbered_batch
+        return with_retry(lambda: _embed_batch(batch), f"Embedding batch {number + 1}/{len(batches)}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [vector for batch_vectors in executor.map(embed_with_retry, enumerate(batches)) for vector in batch_vectors]
+
+
+def upsert_vectors(index, vectors: list, batch_size: int = INGEST_UPSERT_BATCH_SIZE, workers: int = INGEST_UPSERT_WORKERS):
+    """Upsert (id, values, metadata) tuples in parallel batches; raises if any batch keeps failing"""
+    batches = [vectors[i:i + batch_size] for i in range(0, len(vectors), batch_size)]
+
+    def upsert_with_retry(numbered_batch):
+        number, batch = numbered_batch
+        with_retry(lambda: index.upsert(vectors=batch), f"Upsert batch {number + 1}/{len(batches)}")
+        return len(batch)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(upsert_with_retry, enumerate(batches)))
+
+
+def update_metadata(index, updates: list, workers: int = INGEST_UPSERT_WORKERS):
+    """Metadata-only updates for (id, metadata) pairs; the stored vectors are left as they are"""
+    def update_with_retry(update):
+        vector_id, metadata = update
+        with_retry(lambda: index.update(id=vector_id, set_metadata=metadata), f"Metadata update for {vector_id}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(update_with_retry, updates))
+    return len(updates)
+
+
+def delete_vectors(index, vector_ids: list, batch_size: int = INGEST_DELETE_BATCH_SIZE):
+    for i in range(0, len(vector_ids), batch_size):
+        batch = vector_ids[i:i + batch_size]
+        with_retry(lambda: index.delete(ids=batch), f"Delete batch {i // batch_size + 1}")
+    return len(vector_ids)
+
+
+def _hash(value):
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def open_manifest(path: str):
+    """SQLite connection to the manifest at path, creating its tables if missing"""
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS manifest_info (key TEXT PRIMARY KEY, value TEXT)")
+    db.execute("CREATE TABLE IF NOT EXISTS programs (vector_id TEXT PRIMARY KEY, text_hash TEXT, metadata_hash TEXT)")
+    db.commit()
+    return db
+
+
+def _read_json_manifest(path: str):
+    """Programs of a manifest written as JSON by earlier versions, or None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("⚠️ Ignoring unreadable manifest %s: %s", path, e)
+        return None
+    return manifest.get("programs", {}) if manifest.get("model") == EMBEDDING_MODEL else None
+
+
+def load_manifest(db, path: str):
+    """
+    {vector_id: {"text": hash, "metadata": hash}} of what the index holds. Empty when the
+    manifest was built with another model (its rows are dropped); a new manifest starts from
+    the JSON manifest next to it, if an earlier version left one.
+    """
+    row = db.execute("SELECT value FROM manifest_info WHERE key = 'model'").fetchone()
+    if row is None:
+        legacy_path = f"{os.path.splitext(path)[0]}.json"
+        programs = _read_json_manifest(legacy_path) or {}
+        with db:
+            db.execute("INSERT INTO manifest_info VALUES ('model', ?)", (EMBEDDING_MODEL,))
+        save_manifest(db, programs)
+        if programs:
+            logger.info("📥 Imported %s programs from manifest %s", len(programs), legacy_path)
+        return programs
+
+    if row[0] != EMBEDDING_MODEL:
+        logger.warning("⚠️ Manifest %s was built with %s, re-embedding everything", path, row[0])
+        with db:
+            db.execute("DELETE FROM programs")
+            db.execute("UPDATE manifest_info SET value = ? WHERE key = 'model'", (EMBEDDING_MODEL,))
+        return {}
+    return {
+        vector_id: {"text": text_hash, "metadata": metadata_hash}
+        for vector_id, text_hash, metadata_hash in db.execute("SELECT vector_id, text_hash, metadata_hash FROM programs")
+    }
+
+
+def save_manifest(db, programs: dict):
+    """Upsert just these {vector_id: hashes} rows, in one transaction"""
+    with db:
+        db.executemany(
+            "INSERT OR REPLACE INTO programs VALUES (?, ?, ?)",
+            ((vector_id, hashes["text"], hashes["metadata"]) for vector_id, hashes in programs.items())
+        )
+
+
+def remove_from_manifest(db, vector_ids: list):
+    with db:
+        db.executemany("DELETE FROM programs WHERE vector_id = ?", ((vector_id,) for vector_id in vector_ids))
+
+
+def plan_chunk(records: list, manifest: dict):
+    """Split a chunk into records to embed (new or text changed), metadata-only updates and unchanged"""
+    to_embed, metadata_only, unchanged = [], [], 0
+    for vector_id, text, metadata in records:
+        known = manifest.get(vector_id)
+        if known is None or known["text"] != _hash(text):
+            to_embed.append((vector_id, text, metadata))
+        elif known["metadata"] != _hash(metadata):
+            metadata_only.append((vector_id, metadata))
+        else:
+            unchanged += 1
+    return to_embed, metadata_only, unchanged
+
+
+def _source_fingerprint(csv_path: str, chunk_size: int):
+    stat = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime, "chunk_size": chunk_size}
+
+
+def load_checkpoint(path: str, fingerprint: dict):
+    """(chunks completed, vectors upserted) by an earlier run over this exact file, or (0, 0)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    except Exception as e:
+        logger.warning("⚠️ Ignoring unreadable checkpoint %s: %s", path, e)
+        return 0, 0
+
+    if checkpoint.get("source") != fingerprint:
+        logger.warning("⚠️ Checkpoint %s is for a different file or chunk size, starting over", path)
+        return 0, 0
+    return checkpoint.get("completed_chunks", 0), checkpoint.get("vectors_upserted", 0)
+
+
+def save_checkpoint(path: str, fingerprint: dict, completed_chunks: int, vectors_upserted: int):
+    """Write atomically so a crash never leaves a half-written checkpoint"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": fingerprint, "completed_chunks": completed_chunks, "vectors_upserted": vectors_upserted}, f)
+    os.replace(tmp_path, path)
+
+
+def ingest(index, csv_path: str = CATALOG_CSV, chunk_size: int = INGEST_CHUNK_SIZE,
+           checkpoint_path: str = INGEST_CHECKPOINT_PATH, manifest_path: str = INGEST_MANIFEST_PATH,
+           restart: bool = False, full: bool = False):
+    """
+    Bring the index in line with csv_path, resuming from the checkpoint unless restart.
+    Only the diff against the manifest is embedded/updated/deleted, unless full.
+    Returns {"embedded", "metadata_updated", "unchanged", "deleted"} counts for this run.
+    """
+    fingerprint = _source_fingerprint(csv_path, chunk_size)
+    completed_chunks, upserted = (0, 0) if restart else load_checkpoint(checkpoint_path, fingerprint)
+    if completed_chunks:
+        logger.info("⏩ Resuming after %s completed chunks (%s vectors already upserted)", completed_chunks, upserted)
+
+    with closing(open_manifest(manifest_path)) as manifest_db:
+        manifest = load_manifest(manifest_db, manifest_path)
+        seen_ids = set()
+        counts = {"embedded": 0, "metadata_updated": 0, "unchanged": 0, "deleted": 0}
+
+        started = time.time()
+        for number, records in enumerate(read_catalog_chunks(csv_path, chunk_size)):
+            seen_ids.update(vector_id for vector_id, _, _ in records)
+            if number < completed_chunks:
+                continue
+
+            to_embed, metadata_only, unchanged = plan_chunk(records, {} if full else manifest)
+            if to_embed:
+                vector_ids, texts, metadata = zip(*to_embed)
+                embeddings = embed_documents(list(texts))
+                upserted += upsert_vectors(index, list(zip(vector_ids, embeddings, metadata)))
+            if metadata_only:
+                update_metadata(index, metadata_only)
+
+            changed = {}
+            for vector_id, text, metadata in records:
+                hashes = {"text": _hash(text), "metadata": _hash(metadata)}
+                if manifest.get(vector_id) != hashes:
+                    changed[vector_id] = manifest[vector_id] = hashes
+            save_manifest(manifest_db, changed)
+            save_checkpoint(checkpoint_path, fingerprint, number + 1, upserted)
+
+            counts["embedded"] += len(to_embed)
+            counts["metadata_updated"] += len(metadata_only)
+            counts["unchanged"] += unchanged
+            logger.info(
+                "📦 Chunk %s: %s embedded, %s metadata-only, %s unchanged (%.1fs)",
+                number + 1, len(to_embed), len(metadata_only), unchanged, time.time() - started
+            )
+
+        # Only after the whole CSV was read do we know which programs were removed
+        removed = sorted(set(manifest) - seen_ids)
+        if removed:
+            counts["deleted"] = delete_vectors(index, removed)
+            for vector_id in removed:
+                manifest.pop(vector_id, None)
+            remove_from_manifest(manifest_db, removed)
+            logger.info("🗑️ Deleted %s vectors for programs no longer in the catalog", len(removed))
+
+        # Finished: a later run should start from the top
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        logger.info(
+            "✅ Catalog indexed: %s embedded, %s metadata-only updates, %s unchanged, %s deleted",
+            counts["embedded"], counts["metadata_updated"], counts["unchanged"], counts["deleted"]
+        )
+        return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed the program catalog and upsert it into Pinecone")
+    parser.add_argument("csv", nargs="?", default=CATALOG_CSV)
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", default=INGEST_CHECKPOINT_PATH)
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and ingest from the first row")
+    parser.add_argument("--full", action="store_true", help="re-embed every program instead of only changed ones")
+    args = parser.parse_args()
+
+    from logging_utils import configure_logging
+    configure_logging()
+
+    from clients import remote_index
+    ingest(remote_index.get(), args.csv, chunk_size=args.chunk_size, checkpoint_path=args.checkpoint,
+           manifest_path=args.manifest, restart=args.restart, full=args.full)
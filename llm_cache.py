@@ -0,0 +1,34 @@
+import os
+import json
+import hashlib
+from persistent_cache import PersistentLRUCache
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "0"))  # 0 = never expire
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")  # empty = memory only
+
+
+def fingerprint(namespace: str, inputs: dict):
+    """
+    Stable hash of exactly the prompt inputs. Any change to a profile field or program
+    metadata that feeds the prompt yields a new key, so stale entries are never served.
+    """
+    payload = json.dumps({"namespace": namespace, "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache(PersistentLRUCache):
+    """Parsed LLM chain outputs keyed by fingerprint(): in-memory LRU plus optional SQLite tier"""
+    def __init__(self, max_size: int = LLM_CACHE_SIZE, ttl_seconds: float = LLM_CACHE_TTL_SECONDS, db_path: str = LLM_CACHE_PATH):
+        super().__init__(
+            "LLM", "llm_cache", max_size, ttl_seconds, db_path,
+            # Parsed outputs may carry dates and other non-JSON values
+            serialize=lambda value: json.dumps(value, default=str)
+        )
+
+
+# Shared by the enhancement chain and the main recommendation chain
+llm_cache = LLMResponseCache()
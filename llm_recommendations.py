@@ -1,38 +1,143 @@
 import os
+import logging
 from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from nomic import embed
-from pinecone import Pinecone
+from embedding_cache import embedding_cache
+from llm_cache import llm_cache, fingerprint
+from data_loader import bind_to_scope, run_in_worker
+from metrics import timed, instrument_chain
+from llm_scheduler import llm_scheduler, schedule_chain, groq_http_client, groq_async_http_client, estimate_tokens
+from local_ranker import rank_candidates
+from clients import program_index as index, nomic_embed as embed
 from dotenv import load_dotenv
-import json
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
+import time
+import asyncio
+import threading
+import queue
+import inspect
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# "concurrent" runs the independent get_hybrid_recommendations stages together; "serial" runs them in order
+HYBRID_MODE = os.getenv("HYBRID_MODE", "concurrent")
+HYBRID_STAGE_TIMEOUT_SECONDS = float(os.getenv("HYBRID_STAGE_TIMEOUT_SECONDS", "20"))
+# "batch" enhances the final recommendations with one concurrent chain.batch call; "serial" invokes per item
+ENHANCEMENT_MODE = os.getenv("ENHANCEMENT_MODE", "batch")
+ENHANCEMENT_MAX_CONCURRENCY = int(os.getenv("ENHANCEMENT_MAX_CONCURRENCY", "5"))
+# Per-request budget of stream_ranked_recommendations: local ranking plus the LLM layer. The layer is skipped when what is left
+# is below its expected latency (a moving average seeded with LLM_LAYER_EXPECTED_MS) and cut off
+# when the budget runs out
+RECOMMENDATION_LATENCY_BUDGET_MS = float(os.getenv("RECOMMENDATION_LATENCY_BUDGET_MS", "4000"))
+LLM_LAYER_EXPECTED_MS = float(os.getenv("LLM_LAYER_EXPECTED_MS", "1500"))
+LOCAL_RANK_SEARCH_TOP_K = int(os.getenv("LOCAL_RANK_SEARCH_TOP_K", "25"))
+# Locally ranked programs the LLM may rerank; its picks move to the front of the top 5
+LLM_RERANK_SHORTLIST = int(os.getenv("LLM_RERANK_SHORTLIST", "8"))
+
+# Prompt budget for the main recommendation chain: candidates are pre-ranked and added as
+# one dense line each until LLM_PROMPT_CANDIDATE_TOKENS; long registration lists are summarized
+LLM_PROMPT_MAX_CANDIDATES = int(os.getenv("LLM_PROMPT_MAX_CANDIDATES", "10"))
+LLM_PROMPT_CANDIDATE_TOKENS = int(os.getenv("LLM_PROMPT_CANDIDATE_TOKENS", "700"))
+LLM_PROMPT_DESCRIPTION_CHARS = int(os.getenv("LLM_PROMPT_DESCRIPTION_CHARS", "140"))
+LLM_PROMPT_MAX_REGISTRATIONS = int(os.getenv("LLM_PROMPT_MAX_REGISTRATIONS", "8"))
+# The chain is asked for 3 picks, so at least this many candidates are kept whatever the budget
+LLM_PROMPT_MIN_CANDIDATES = 3
+
 # Initialize Groq LLM
 llm = ChatGroq(
     groq_api_key=os.getenv("GROQ_API_KEY"),
     model_name="llama3-70b-8192",
-    temperature=0.3
+    temperature=0.3,
+    # 429s are retried by llm_scheduler, which also reads the rate-limit headers off these clients
+    max_retries=0,
+    http_client=groq_http_client(),
+    http_async_client=groq_async_http_client()
 )
 
-# Initialize Pinecone
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("programs")
+EMBEDDING_MODEL = "nomic-embed-text-v1.5"
 
 def embed_text_nomic(text: str, input_type: str = "search_query"):
-    """Embed text using Nomic's embedding model"""
-    try:
-        output = embed.text(
-            texts=[f"{input_type}: {text}"],
-            model='nomic-embed-text-v1.5'
-        )
+    """Embed text using Nomic's embedding model (cached via the shared embedding cache)"""
+    def _embed():
+        with timed("nomic_embed"):
+            output = embed.text(
+                texts=[f"{input_type}: {text}"],
+                model=EMBEDDING_MODEL
+            )
         return output['embeddings'][0]
+    
+    try:
+        return embedding_cache.get_or_compute(EMBEDDING_MODEL, input_type, text, _embed)
     except Exception as e:
-        print(f"Error generating Nomic embedding: {e}")
+        logger.error("Error generating Nomic embedding: %s", e)
         return None
 
+def _compact(value, max_chars: int = None):
+    """One-line, pipe-free text, cut to max_chars"""
+    text = " ".join(str(value or "").split()).replace("|", "/")
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars - 3].rstrip() + "..."
+    return text
+
+
+def program_line(program: dict):
+    """A search result as one prompt line: id | title | category | level | cost | dates | duration | skills | similarity | description"""
+    try:
+        cost = f"${float(program.get('cost')):g}"
+    except (TypeError, ValueError):
+        cost = _compact(program.get('cost')) or "?"
+    return " | ".join([
+        _compact(program.get('program_id')),
+        _compact(program.get('title')),
+        _compact(program.get('category')),
+        _compact(program.get('level')) or "-",
+        cost,
+        f"{_compact(program.get('start_date'))}..{_compact(program.get('end_date'))}",
+        _compact(program.get('duration')) or "-",
+        _compact(program.get('skills_required'), 80),
+        f"{program.get('similarity_score') or 0:.2f}",
+        _compact(program.get('description'), LLM_PROMPT_DESCRIPTION_CHARS)
+    ])
+
+
+def budget_candidates(search_results: list, registered_ids: set, token_budget: int = LLM_PROMPT_CANDIDATE_TOKENS, max_candidates: int = LLM_PROMPT_MAX_CANDIDATES):
+    """
+    Prompt lines for the best candidates: registered programs dropped, the rest ranked by
+    similarity and added until token_budget (but at least LLM_PROMPT_MIN_CANDIDATES)
+    """
+    ranked = sorted(
+        (program for program in search_results if program.get('program_id') not in registered_ids),
+        key=lambda program: -(program.get('similarity_score') or 0)
+    )
+    lines, used = [], 0
+    for program in ranked[:max_candidates]:
+        line = program_line(program)
+        cost = estimate_tokens(line) + 1
+        if len(lines) >= LLM_PROMPT_MIN_CANDIDATES and used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return lines
+
+
+def summarize_registrations(user_registrations: list, limit: int = LLM_PROMPT_MAX_REGISTRATIONS):
+    """The limit most recently registered programs (by registered_at), one line each, plus a count of the rest"""
+    if not user_registrations:
+        return "None"
+    # get_user_registrations already returns them oldest first; the sort is stable, so rows without a timestamp keep that order
+    ordered = sorted(user_registrations, key=lambda reg: str(reg.get('registered_at') or ''))
+    shown = ordered[-limit:] if limit > 0 else []
+    lines = [f"- {_compact(reg.get('program_title'), 80)} ({reg.get('program_id')})" for reg in shown]
+    hidden = len(ordered) - len(shown)
+    if hidden:
+        lines.append(f"- ...and {hidden} earlier programs (all registered programs are already left out of the list below)")
+    return "\n".join(lines)
+
+
 class LLMRecommendationEngine:
     def __init__(self):
         self.llm = llm
@@ -54,7 +159,8 @@ EMPLOYEE PROFILE:
 CURRENTLY REGISTERED PROGRAMS:
 {user_registrations}
 
-AVAILABLE PROGRAMS FROM SEARCH:
+AVAILABLE PROGRAMS FROM SEARCH (best match first, one per line):
+program_id | title | category | level | cost | start..end | duration | skills | similarity | description
 {search_results}
 
 INSTRUCTIONS:
@@ -124,8 +230,13 @@ Only return valid JSON, no additional text.
         
         # Create chains
         self.json_parser = JsonOutputParser()
-        self.chain = self.recommendation_prompt | self.llm | self.json_parser
-        self.enhancement_chain = self.enhancement_prompt | self.llm | self.json_parser
+        # Every call goes through the process-wide LLM scheduler (concurrency cap, rate limits, priority, coalescing)
+        self.chain = instrument_chain(schedule_chain(self.recommendation_prompt | self.llm | self.json_parser, "groq_recommendation"), "groq_recommendation")
+        self.enhancement_chain = instrument_chain(schedule_chain(self.enhancement_prompt | self.llm | self.json_parser, "groq_enhancement"), "groq_enhancement")
+        
+        # Moving average of the LLM layer's latency, used to decide whether it fits a request's budget
+        self._llm_layer_ms = LLM_LAYER_EXPECTED_MS
+        self._llm_layer_lock = threading.Lock()
 
     def get_enhanced_search_results(self, user_profile, top_k=20):
         """Get comprehensive search results from Pinecone using Nomic embeddings"""
@@ -146,7 +257,7 @@ Only return valid JSON, no additional text.
             query_parts.append(f"Current level: {user_profile['skill_level']}")
         
         query = ". ".join(query_parts)
-        print(f"🔍 Enhanced search query: {query}")
+        logger.debug("🔍 Enhanced search query: %s", query)
         
         # Add filters
         filters = {}
@@ -154,19 +265,19 @@ Only return valid JSON, no additional text.
             try:
                 max_budget = float(user_profile['max_budget'])
                 filters["cost"] = {"$lte": max_budget}
-                print(f"💰 Budget filter: <= ${max_budget}")
+                logger.debug("💰 Budget filter: <= $%s", max_budget)
             except (ValueError, TypeError):
-                print("⚠️ Invalid budget value, skipping budget filter")
+                logger.warning("⚠️ Invalid budget value, skipping budget filter")
         
         # Generate embedding using Nomic
         try:
             query_embedding = embed_text_nomic(query, input_type="search_query")
             
             if query_embedding is None:
-                print("❌ Failed to generate query embedding")
+                logger.error("❌ Failed to generate query embedding")
                 return []
             
-            print(f"✅ Query embedding generated, length: {len(query_embedding)}")
+            logger.debug("✅ Query embedding generated, length: %s", len(query_embedding))
             
             # Search Pinecone
             response = self.index.query(
@@ -176,7 +287,7 @@ Only return valid JSON, no additional text.
                 filter=filters or {}
             )
             
-            print(f"📊 Pinecone returned {len(response.matches)} matches")
+            logger.debug("📊 Pinecone returned %s matches", len(response.matches))
             
             # Format results
             formatted_results = []
@@ -197,149 +308,315 @@ Only return valid JSON, no additional text.
                 }
                 formatted_results.append(formatted_result)
                 
-                print(f"   {i+1}. {metadata.get('title', 'Unknown')} (Score: {match.score:.3f})")
+                logger.debug("   %s. %s (Score: %.3f)", i+1, metadata.get('title', 'Unknown'), match.score)
             
             return formatted_results
             
         except Exception as e:
-            print(f"❌ Error in enhanced search: {e}")
+            logger.error("❌ Error in enhanced search: %s", e)
             return []
 
+    def _enhancement_input(self, user_profile, program_data, recommendation_source):
+        """Input variables for the enhancement prompt"""
+        return {
+            "role": user_profile.get('role', 'Professional'),
+            "skill_level": user_profile.get('skill_level', 'Intermediate'),
+            "interests": user_profile.get('interests', 'General'),
+            "preferred_skills": user_profile.get('preferred_skills', 'Various'),
+            "program_title": program_data.get('title', 'Program'),
+            "program_category": program_data.get('category', 'Learning'),
+            "program_skills": program_data.get('skills_required', 'Various skills'),
+            "recommendation_source": recommendation_source
+        }
+
+    def _fallback_enhancement(self, recommendation_source):
+        """Static enhancement used when the LLM call fails or returns something unusable"""
+        return {
+            "recommendation_reason": f"This {recommendation_source} program aligns with your role and interests",
+            "skills_gained": "Relevant professional skills",
+            "career_impact": "Will contribute to your career advancement",
+            "urgency": "medium",
+            "enhanced_explanation": f"Selected through {recommendation_source} analysis"
+        }
+
     def enhance_recommendation_with_ai(self, user_profile, program_data, recommendation_source):
         """Use AI to enhance any recommendation with detailed insights"""
         try:
-            print(f"🤖 Enhancing {recommendation_source} recommendation: {program_data.get('title', 'Unknown')}")
+            logger.debug("🤖 Enhancing %s recommendation: %s", recommendation_source, program_data.get('title', 'Unknown'))
             
             # Prepare input for enhancement
-            enhancement_input = {
-                "role": user_profile.get('role', 'Professional'),
-                "skill_level": user_profile.get('skill_level', 'Intermediate'),
-                "interests": user_profile.get('interests', 'General'),
-                "preferred_skills": user_profile.get('preferred_skills', 'Various'),
-                "program_title": program_data.get('title', 'Program'),
-                "program_category": program_data.get('category', 'Learning'),
-                "program_skills": program_data.get('skills_required', 'Various skills'),
-                "recommendation_source": recommendation_source
-            }
+            enhancement_input = self._enhancement_input(user_profile, program_data, recommendation_source)
+            
+            cache_key = fingerprint("enhancement", enhancement_input)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("⚡ Using cached enhancement for %s", program_data.get('title', 'Unknown'))
+                return cached
             
             # Get AI enhancement
             enhancement = self.enhancement_chain.invoke(enhancement_input)
+            if isinstance(enhancement, dict):
+                llm_cache.put(cache_key, enhancement)
             
-            print(f"✅ Enhanced {recommendation_source} recommendation with AI insights")
+            logger.debug("✅ Enhanced %s recommendation with AI insights", recommendation_source)
             return enhancement
             
         except Exception as e:
-            print(f"❌ Error enhancing recommendation: {e}")
+            logger.error("❌ Error enhancing recommendation: %s", e)
             # Fallback enhancement
-            return {
-                "recommendation_reason": f"This {recommendation_source} program aligns with your role and interests",
-                "skills_gained": "Relevant professional skills",
-                "career_impact": "Will contribute to your career advancement",
-                "urgency": "medium",
-                "enhanced_explanation": f"Selected through {recommendation_source} analysis"
-            }
+            return self._fallback_enhancement(recommendation_source)
+
+    def _plan_enhancement_batch(self, user_profile, items):
+        """Prompt inputs, cache keys, cached results (None where missing) and the indexes still to send"""
+        inputs = [self._enhancement_input(user_profile, program_data, source) for program_data, source in items]
+        cache_keys = [fingerprint("enhancement", enhancement_input) for enhancement_input in inputs]
+        results = [llm_cache.get(cache_key) for cache_key in cache_keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.info("🤖 Enhancing %s recommendations in one batch (%s cached, max concurrency %s)", len(missing), len(items) - len(missing), ENHANCEMENT_MAX_CONCURRENCY)
+        else:
+            logger.info("⚡ All %s enhancements served from cache", len(items))
+        return inputs, cache_keys, results, missing
+
+    def _finish_enhancement_batch(self, items, cache_keys, results, missing, batch_results):
+        """Cache fresh results and substitute the static fallback for anything unusable"""
+        for i, result in zip(missing, batch_results):
+            results[i] = result
+            if isinstance(result, dict):
+                llm_cache.put(cache_keys[i], result)
+        
+        enhancements = []
+        for (program_data, source), result in zip(items, results):
+            if isinstance(result, dict):
+                enhancements.append(result)
+            else:
+                logger.warning("⚠️ Using fallback enhancement for %s: %s", program_data.get('title', 'Unknown'), result)
+                enhancements.append(self._fallback_enhancement(source))
+        
+        return enhancements
+
+    def enhance_recommendations_batch(self, user_profile, items):
+        """
+        Enhance several (program_data, recommendation_source) pairs with one concurrent
+        enhancement_chain.batch call, capped at ENHANCEMENT_MAX_CONCURRENCY in-flight requests.
+        Items whose call fails or does not parse to a JSON object get the static fallback.
+        Items already in the LLM cache are not sent at all.
+        """
+        if not items:
+            return []
+        
+        inputs, cache_keys, results, missing = self._plan_enhancement_batch(user_profile, items)
+        batch_results = []
+        if missing:
+            try:
+                batch_results = self.enhancement_chain.batch(
+                    [inputs[i] for i in missing],
+                    config={"max_concurrency": ENHANCEMENT_MAX_CONCURRENCY},
+                    return_exceptions=True
+                )
+            except Exception as e:
+                logger.error("❌ Error in batch enhancement: %s", e)
+                batch_results = [e] * len(missing)
+        
+        return self._finish_enhancement_batch(items, cache_keys, results, missing, batch_results)
+
+    async def aenhance_recommendations_batch(self, user_profile, items):
+        """Async enhance_recommendations_batch using enhancement_chain.abatch"""
+        if not items:
+            return []
+        
+        inputs, cache_keys, results, missing = self._plan_enhancement_batch(user_profile, items)
+        batch_results = []
+        if missing:
+            try:
+                batch_results = await self.enhancement_chain.abatch(
+                    [inputs[i] for i in missing],
+                    config={"max_concurrency": ENHANCEMENT_MAX_CONCURRENCY},
+                    return_exceptions=True
+                )
+            except Exception as e:
+                logger.error("❌ Error in batch enhancement: %s", e)
+                batch_results = [e] * len(missing)
+        
+        return self._finish_enhancement_batch(items, cache_keys, results, missing, batch_results)
+
+    def enhance_recommendations_as_completed(self, user_profile, items, fallback=True):
+        """
+        Generator form of enhance_recommendations_batch: yields (index, enhancement) for each
+        item as soon as it is ready - cached items first, the rest in completion order.
+        A failed item gets the static fallback enhancement, or None with fallback=False.
+        """
+        if not items:
+            return
+        
+        inputs, cache_keys, results, missing = self._plan_enhancement_batch(user_profile, items)
+        for i, result in enumerate(results):
+            if result is not None:
+                yield i, result
+        if not missing:
+            return
+        
+        finished = set()
+        try:
+            completed = self.enhancement_chain.batch_as_completed(
+                [inputs[i] for i in missing],
+                config={"max_concurrency": ENHANCEMENT_MAX_CONCURRENCY},
+                return_exceptions=True
+            )
+            for position, result in completed:
+                i = missing[position]
+                finished.add(i)
+                if fallback or isinstance(result, dict):
+                    yield i, self._finish_enhancement_batch([items[i]], [cache_keys[i]], [None], [0], [result])[0]
+                else:
+                    logger.warning("⚠️ Enhancement failed for %s: %s", items[i][0].get('title', 'Unknown'), result)
+                    yield i, None
+        except Exception as e:
+            logger.error("❌ Error in streamed enhancement: %s", e)
+            for i in missing:
+                if i not in finished:
+                    yield i, self._fallback_enhancement(items[i][1]) if fallback else None
 
+    def _llm_chain_input(self, user_profile, user_registrations, search_results):
+        """Input variables for the main recommendation chain"""
+        registered_ids = {reg.get('program_id') for reg in user_registrations}
+        candidate_lines = budget_candidates(search_results, registered_ids)
+        
+        chain_input = {
+            "full_name": user_profile.get('full_name', 'Unknown'),
+            "role": user_profile.get('role', 'Not specified'),
+            "skill_level": user_profile.get('skill_level', 'Not specified'),
+            "interests": user_profile.get('interests', 'Not specified'),
+            "preferred_skills": user_profile.get('preferred_skills', 'Not specified'),
+            "max_budget": user_profile.get('max_budget', 'Not specified'),
+            "preferred_month": user_profile.get('preferred_month', 'Not specified'),
+            "user_registrations": summarize_registrations(user_registrations),
+            "search_results": "\n".join(candidate_lines)
+        }
+        logger.info("🧮 Recommendation prompt: %s of %s candidates, %s registrations, ~%s tokens",
+                    len(candidate_lines), len(search_results), len(user_registrations),
+                    estimate_tokens(self.recommendation_prompt.format(**chain_input)))
+        return chain_input
+
+    def _merge_llm_output(self, recommendations, search_results):
+        """Join the LLM's picks with their search metadata; picks not in the search results are dropped"""
+        logger.info("✅ LLM generated %s recommendations", len(recommendations))
+        
+        # Enhance recommendations with metadata
+        enhanced_recommendations = []
+        search_dict = {r['program_id']: r for r in search_results}
+        
+        for i, rec in enumerate(recommendations):
+            program_id = rec.get('program_id')
+            logger.debug("   Processing rec %s: %s", i+1, program_id)
+            
+            if program_id in search_dict:
+                search_data = search_dict[program_id]
+                
+                enhanced_rec = {
+                    "program_id": program_id,
+                    "title": rec.get('title', search_data['title']),
+                    "category": rec.get('category', search_data['category']),
+                    "skills_required": search_data.get('skills_required', ''),
+                    "cost": search_data.get('cost', 0),
+                    "start_date": search_data.get('start_date', ''),
+                    "end_date": search_data.get('end_date', ''),
+                    "score": rec.get('recommendation_score', 0.8),
+                    "recommendation_type": "llm_powered",
+                    "llm_reasoning": {
+                        "reason": rec.get('recommendation_reason', ''),
+                        "skills_gained": rec.get('skills_gained', ''),
+                        "career_impact": rec.get('career_impact', ''),
+                        "urgency": rec.get('urgency', 'medium')
+                    },
+                    "is_registered": False,
+                    "similarity_score": search_data.get('similarity_score', 0)
+                }
+                enhanced_recommendations.append(enhanced_rec)
+                logger.debug("   ✅ Enhanced: %s", enhanced_rec['title'])
+        
+        logger.info("🎯 Enhanced %s LLM recommendations", len(enhanced_recommendations))
+        return enhanced_recommendations
+
+    @timed("hybrid_llm")
     def get_llm_recommendations(self, user_profile, user_registrations):
         """Get LLM-powered recommendations (3 items)"""
         try:
-            print(f"\n🤖 GETTING LLM RECOMMENDATIONS FOR: {user_profile.get('full_name', 'Unknown')}")
+            logger.info("🤖 GETTING LLM RECOMMENDATIONS FOR: %s", user_profile.get('full_name', 'Unknown'))
             
             # Get comprehensive search results
             search_results = self.get_enhanced_search_results(user_profile, top_k=15)
-            print(f"📊 Retrieved {len(search_results)} programs from vector search")
+            logger.info("📊 Retrieved %s programs from vector search", len(search_results))
             
             if not search_results:
-                print("❌ No search results found, cannot generate LLM recommendations")
+                logger.error("❌ No search results found, cannot generate LLM recommendations")
                 return []
             
-            # Format user registrations
-            registered_programs = []
-            for reg in user_registrations:
-                registered_programs.append(f"- {reg['program_title']} (ID: {reg['program_id']})")
-            
-            registrations_text = "\n".join(registered_programs) if registered_programs else "None"
-            
-            # Format search results for LLM
-            search_text = json.dumps(search_results[:10], indent=1)
-            
             # Prepare input variables for the chain
-            chain_input = {
-                "full_name": user_profile.get('full_name', 'Unknown'),
-                "role": user_profile.get('role', 'Not specified'),
-                "skill_level": user_profile.get('skill_level', 'Not specified'),
-                "interests": user_profile.get('interests', 'Not specified'),
-                "preferred_skills": user_profile.get('preferred_skills', 'Not specified'),
-                "max_budget": user_profile.get('max_budget', 'Not specified'),
-                "preferred_month": user_profile.get('preferred_month', 'Not specified'),
-                "user_registrations": registrations_text,
-                "search_results": search_text
-            }
+            chain_input = self._llm_chain_input(user_profile, user_registrations, search_results)
             
             # Generate recommendations using LLM
-            print("🧠 Generating LLM recommendations...")
+            logger.debug("🧠 Generating LLM recommendations...")
             try:
-                recommendations = self.chain.invoke(chain_input)
-                print(f"✅ LLM generated {len(recommendations)} recommendations")
-                
-                # Enhance recommendations with metadata
-                enhanced_recommendations = []
-                search_dict = {r['program_id']: r for r in search_results}
+                cache_key = fingerprint("recommendation", chain_input)
+                recommendations = llm_cache.get(cache_key)
+                if recommendations is not None:
+                    logger.info("⚡ Using cached LLM recommendations")
+                else:
+                    recommendations = self.chain.invoke(chain_input)
+                    if isinstance(recommendations, list):
+                        llm_cache.put(cache_key, recommendations)
                 
-                for i, rec in enumerate(recommendations):
-                    program_id = rec.get('program_id')
-                    print(f"   Processing rec {i+1}: {program_id}")
-                    
-                    if program_id in search_dict:
-                        search_data = search_dict[program_id]
-                        
-                        enhanced_rec = {
-                            "program_id": program_id,
-                            "title": rec.get('title', search_data['title']),
-                            "category": rec.get('category', search_data['category']),
-                            "skills_required": search_data.get('skills_required', ''),
-                            "cost": search_data.get('cost', 0),
-                            "start_date": search_data.get('start_date', ''),
-                            "end_date": search_data.get('end_date', ''),
-                            "score": rec.get('recommendation_score', 0.8),
-                            "recommendation_type": "llm_powered",
-                            "llm_reasoning": {
-                                "reason": rec.get('recommendation_reason', ''),
-                                "skills_gained": rec.get('skills_gained', ''),
-                                "career_impact": rec.get('career_impact', ''),
-                                "urgency": rec.get('urgency', 'medium')
-                            },
-                            "is_registered": False,
-                            "similarity_score": search_data.get('similarity_score', 0)
-                        }
-                        enhanced_recommendations.append(enhanced_rec)
-                        print(f"   ✅ Enhanced: {enhanced_rec['title']}")
-                
-                print(f"🎯 Enhanced {len(enhanced_recommendations)} LLM recommendations")
-                return enhanced_recommendations
+                return self._merge_llm_output(recommendations, search_results)
                 
             except Exception as parse_error:
-                print(f"❌ Error with JSON parsing: {parse_error}")
+                logger.error("❌ Error with JSON parsing: %s", parse_error)
                 return []
                 
         except Exception as e:
-            print(f"❌ Error getting LLM recommendations: {e}")
+            logger.error("❌ Error getting LLM recommendations: %s", e)
             return []
 
+    async def aget_llm_recommendations(self, user_profile, user_registrations):
+        """Async get_llm_recommendations: vector search on a worker thread, chain via ainvoke"""
+        # timed() decorates sync functions only, so the async variant times its body
+        with timed("hybrid_llm"):
+            try:
+                search_results = await run_in_worker(self.get_enhanced_search_results, user_profile, 15)
+                if not search_results:
+                    logger.error("❌ No search results found, cannot generate LLM recommendations")
+                    return []
+            
+                chain_input = self._llm_chain_input(user_profile, user_registrations, search_results)
+                cache_key = fingerprint("recommendation", chain_input)
+                recommendations = llm_cache.get(cache_key)
+                if recommendations is None:
+                    recommendations = await self.chain.ainvoke(chain_input)
+                    if isinstance(recommendations, list):
+                        llm_cache.put(cache_key, recommendations)
+            
+                return self._merge_llm_output(recommendations, search_results)
+            
+            except Exception as e:
+                logger.error("❌ Error getting LLM recommendations: %s", e)
+                return []
+
+    @timed("hybrid_similarity")
     def get_program_similarity_recommendations(self, user_profile, user_registrations):
         """Get program similarity recommendations - WITHOUT AI enhancement initially"""
         try:
-            print(f"\n🔗 GETTING PROGRAM SIMILARITY RECOMMENDATIONS")
+            logger.info("🔗 GETTING PROGRAM SIMILARITY RECOMMENDATIONS")
             
             if not user_registrations:
-                print("📭 No registered programs found for similarity search")
+                logger.info("📭 No registered programs found for similarity search")
                 return []
             
             # Get list of registered program IDs
             registered_program_ids = [reg['program_id'] for reg in user_registrations]
             
-            print(f"📚 Finding programs similar to {len(registered_program_ids)} registered programs:")
+            logger.debug("📚 Finding programs similar to %s registered programs:", len(registered_program_ids))
             for reg in user_registrations:
-                print(f"   - {reg['program_title']} (ID: {reg['program_id']})")
+                logger.debug("   - %s (ID: %s)", reg['program_title'], reg['program_id'])
             
             # Import the similarity function
             from pinecone_utils import find_similar_programs_by_registration
@@ -351,7 +628,7 @@ Only return valid JSON, no additional text.
                 exclude_ids=set(registered_program_ids)
             )
             
-            print(f"🔍 Found {len(similar_results)} similar programs")
+            logger.debug("🔍 Found %s similar programs", len(similar_results))
             
             # Just create basic recommendations WITHOUT AI enhancement
             similarity_recommendations = []
@@ -383,26 +660,27 @@ Only return valid JSON, no additional text.
                     }
                     
                     similarity_recommendations.append(similarity_rec)
-                    print(f"   ✅ Added similarity rec: {metadata.get('title')} (Score: {match.score:.3f})")
+                    logger.debug("   ✅ Added similarity rec: %s (Score: %.3f)", metadata.get('title'), match.score)
             
             # Sort by similarity score and return top 3
             similarity_recommendations.sort(key=lambda x: x['score'], reverse=True)
             top_similarity = similarity_recommendations[:3]
             
-            print(f"🎯 Generated {len(top_similarity)} basic similarity recommendations (no AI enhancement yet)")
+            logger.info("🎯 Generated %s basic similarity recommendations (no AI enhancement yet)", len(top_similarity))
             return top_similarity
             
         except Exception as e:
-            print(f"❌ Error getting program similarity recommendations: {e}")
+            logger.error("❌ Error getting program similarity recommendations: %s", e)
             return []
 
+    @timed("hybrid_collaborative")
     def get_enhanced_collaborative_recommendations(self, user_profile, user_registrations, collaborative_recs):
         """Get collaborative recommendations - WITHOUT AI enhancement initially"""
         try:
-            print(f"\n👥 GETTING COLLABORATIVE RECOMMENDATIONS")
+            logger.info("👥 GETTING COLLABORATIVE RECOMMENDATIONS")
             
             if not collaborative_recs:
-                print("📭 No collaborative recommendations to process")
+                logger.info("📭 No collaborative recommendations to process")
                 return []
             
             # Just create basic collaborative recommendations WITHOUT AI enhancement
@@ -435,207 +713,843 @@ Only return valid JSON, no additional text.
                             # NO llm_reasoning here - will be added later for selected items only
                         }
                         collaborative_recommendations.append(collab_recommendation)
-                        print(f"   ✅ Added collaborative rec: {metadata.get('title')}")
+                        logger.debug("   ✅ Added collaborative rec: %s", metadata.get('title'))
                         
                 except Exception as e:
-                    print(f"Error fetching program details for {collab_rec['program_id']}: {e}")
+                    logger.error("Error fetching program details for %s: %s", collab_rec['program_id'], e)
                     continue
             
-            print(f"🎯 Generated {len(collaborative_recommendations)} basic collaborative recommendations (no AI enhancement yet)")
+            logger.info("🎯 Generated %s basic collaborative recommendations (no AI enhancement yet)", len(collaborative_recommendations))
             return collaborative_recommendations
             
         except Exception as e:
-            print(f"❌ Error getting collaborative recommendations: {e}")
+            logger.error("❌ Error getting collaborative recommendations: %s", e)
             return []
 
-    def enhance_final_recommendations(self, user_profile, recommendations):
-        """Enhance ONLY the final selected recommendations with AI insights"""
+    def _pending_enhancements(self, recommendations):
+        """(rec, program_data, recommendation_source) for each recommendation still without llm_reasoning"""
+        # Determine source for enhancement
+        source_map = {
+            'program_similarity': 'program similarity',
+            'collaborative_llm': 'collaborative filtering',
+            'profile_match': 'profile matching'
+        }
+        
+        pending = []
+        for rec in recommendations:
+            # Skip if already has LLM reasoning (for llm_powered type)
+            if rec.get('llm_reasoning'):
+                logger.debug("   ✅ Skipped (already enhanced): %s", rec['title'])
+                continue
+            
+            # Enhance with AI for consistency
+            program_data = {
+                'title': rec.get('title'),
+                'category': rec.get('category'),
+                'skills_required': rec.get('skills_required', '')
+            }
+            recommendation_source = source_map.get(rec['recommendation_type'], 'recommendation')
+            pending.append((rec, program_data, recommendation_source))
+        return pending
+
+    def _apply_enhancements(self, pending, ai_enhancements):
+        for (rec, _, _), ai_enhancement in zip(pending, ai_enhancements):
+            # Add AI enhancement to the recommendation
+            rec['llm_reasoning'] = {
+                "reason": ai_enhancement.get('recommendation_reason', ''),
+                "skills_gained": ai_enhancement.get('skills_gained', ''),
+                "career_impact": ai_enhancement.get('career_impact', ''),
+                "urgency": ai_enhancement.get('urgency', 'medium')
+            }
+            logger.debug("   ✅ Enhanced: %s", rec['title'])
+
+    @timed("enhancement")
+    def enhance_final_recommendations(self, user_profile, recommendations, mode=None):
+        """
+        Enhance ONLY the final selected recommendations with AI insights
+        mode can be "batch" (one concurrent chain.batch call) or "serial"; defaults to ENHANCEMENT_MODE
+        """
         try:
-            print(f"\n🤖 ENHANCING FINAL {len(recommendations)} RECOMMENDATIONS WITH AI...")
+            mode = mode or ENHANCEMENT_MODE
+            logger.info("🤖 ENHANCING FINAL %s RECOMMENDATIONS WITH AI (%s)...", len(recommendations), mode)
             
-            enhanced_recommendations = []
+            pending = self._pending_enhancements(recommendations)
             
-            for rec in recommendations:
-                # Skip if already has LLM reasoning (for llm_powered type)
-                if rec.get('llm_reasoning'):
-                    enhanced_recommendations.append(rec)
-                    print(f"   ✅ Skipped (already enhanced): {rec['title']}")
-                    continue
-                
-                # Enhance with AI for consistency
-                program_data = {
-                    'title': rec.get('title'),
-                    'category': rec.get('category'),
-                    'skills_required': rec.get('skills_required', '')
-                }
-                
-                # Determine source for enhancement
-                source_map = {
-                    'program_similarity': 'program similarity',
-                    'collaborative_llm': 'collaborative filtering',
-                    'profile_match': 'profile matching'
-                }
-                
-                recommendation_source = source_map.get(rec['recommendation_type'], 'recommendation')
-                
-                # Get AI enhancement
-                ai_enhancement = self.enhance_recommendation_with_ai(
-                    user_profile, 
-                    program_data, 
-                    recommendation_source
+            # Get AI enhancement
+            if mode == "serial":
+                ai_enhancements = [
+                    self.enhance_recommendation_with_ai(user_profile, program_data, source)
+                    for _, program_data, source in pending
+                ]
+            else:
+                ai_enhancements = self.enhance_recommendations_batch(
+                    user_profile, [(program_data, source) for _, program_data, source in pending]
                 )
-                
-                # Add AI enhancement to the recommendation
-                rec['llm_reasoning'] = {
-                    "reason": ai_enhancement.get('recommendation_reason', ''),
-                    "skills_gained": ai_enhancement.get('skills_gained', ''),
-                    "career_impact": ai_enhancement.get('career_impact', ''),
-                    "urgency": ai_enhancement.get('urgency', 'medium')
-                }
-                
-                enhanced_recommendations.append(rec)
-                print(f"   ✅ Enhanced: {rec['title']}")
             
-            print(f"🎯 Enhanced {len(enhanced_recommendations)} final recommendations with AI insights")
-            return enhanced_recommendations
+            self._apply_enhancements(pending, ai_enhancements)
+            
+            logger.info("🎯 Enhanced %s final recommendations with AI insights", len(recommendations))
+            return recommendations
             
         except Exception as e:
-            print(f"❌ Error enhancing final recommendations: {e}")
+            logger.error("❌ Error enhancing final recommendations: %s", e)
             return recommendations  # Return original if enhancement fails
 
-    def get_hybrid_recommendations(self, user_profile, user_registrations, collaborative_recs):
-        """Enhanced hybrid recommendations: 3 AI + 2 Profile Match for new users"""
+    async def aenhance_final_recommendations(self, user_profile, recommendations):
+        """Async enhance_final_recommendations (batch mode only)"""
         try:
-            print(f"\n🔄 GENERATING HYBRID RECOMMENDATIONS (EFFICIENT AI ENHANCEMENT)")
-            
-            all_recommendations = []
-            
-            # 1. Get LLM recommendations (3 items) - Already enhanced
-            print("\n🤖 Getting LLM recommendations...")
-            llm_recommendations = self.get_llm_recommendations(user_profile, user_registrations)
-            llm_program_ids = {rec['program_id'] for rec in llm_recommendations}
-            all_recommendations.extend(llm_recommendations)
+            pending = self._pending_enhancements(recommendations)
+            with timed("enhancement"):
+                ai_enhancements = await self.aenhance_recommendations_batch(
+                    user_profile, [(program_data, source) for _, program_data, source in pending]
+                )
+            self._apply_enhancements(pending, ai_enhancements)
+            return recommendations
             
-            # 2. Get program similarity recommendations (if user has registrations) - NOT enhanced yet
-            if user_registrations:
-                print("\n🔗 Getting program similarity recommendations...")
-                similarity_recommendations = self.get_program_similarity_recommendations(user_profile, user_registrations)
-                
-                # Filter out duplicates from LLM recommendations
-                unique_similarity_recs = []
-                for rec in similarity_recommendations:
-                    if rec['program_id'] not in llm_program_ids:
-                        unique_similarity_recs.append(rec)
-                
-                print(f"   📋 Program similarity (after deduplication): {len(unique_similarity_recs)}")
-                all_recommendations.extend(unique_similarity_recs)
-            else:
-                print("\n🔗 No registered programs - getting profile match recommendations...")
-                
-                # For new users, get 2 basic profile match recommendations - NOT enhanced yet
-                additional_search_results = self.get_enhanced_search_results(user_profile, top_k=25)
-                existing_program_ids = {rec['program_id'] for rec in all_recommendations}
-                
-                profile_match_count = 0
-                for search_result in additional_search_results:
-                    if (search_result['program_id'] not in existing_program_ids and 
-                        profile_match_count < 2 and 
-                        search_result['similarity_score'] > 0.65):
-                        
-                        # Create basic profile match WITHOUT AI enhancement
-                        profile_match_rec = {
-                            "program_id": search_result['program_id'],
-                            "title": search_result['title'],
-                            "category": search_result['category'],
-                            "skills_required": search_result.get('skills_required', ''),
-                            "cost": search_result.get('cost', 0),
-                            "start_date": search_result.get('start_date', ''),
-                            "end_date": search_result.get('end_date', ''),
-                            "score": search_result['similarity_score'],
-                            "recommendation_type": "profile_match",
-                            "is_registered": False,
-                            "similarity_score": search_result['similarity_score'],
-                            "match_info": {
-                                "message": "Matches your profile and interests",
-                                "explanation": f"This program aligns well with your role as {user_profile.get('role', 'professional')} and interests in {user_profile.get('interests', 'your field')}"
-                            }
-                            # NO llm_reasoning here - will be added later
-                        }
-                        
-                        all_recommendations.append(profile_match_rec)
-                        profile_match_count += 1
-                        print(f"   ✅ Added profile match: {search_result['title']} (Score: {search_result['similarity_score']:.3f})")
+        except Exception as e:
+            logger.error("❌ Error enhancing final recommendations: %s", e)
+            return recommendations
+
+    def _profile_match_rec(self, user_profile, search_result):
+        """A search result as a basic profile_match recommendation (no llm_reasoning)"""
+        return {
+            "program_id": search_result['program_id'],
+            "title": search_result['title'],
+            "category": search_result['category'],
+            "skills_required": search_result.get('skills_required', ''),
+            "cost": search_result.get('cost', 0),
+            "start_date": search_result.get('start_date', ''),
+            "end_date": search_result.get('end_date', ''),
+            "score": search_result['similarity_score'],
+            "recommendation_type": "profile_match",
+            "is_registered": False,
+            "similarity_score": search_result['similarity_score'],
+            "match_info": {
+                "message": "Matches your profile and interests",
+                "explanation": f"This program aligns well with your role as {user_profile.get('role', 'professional')} and interests in {user_profile.get('interests', 'your field')}"
+            }
+        }
+
+    def _select_profile_matches(self, user_profile, search_results, existing_program_ids):
+        """Pick up to 2 basic profile match recommendations (no AI enhancement yet) from search results"""
+        profile_matches = []
+        for search_result in search_results:
+            if (search_result['program_id'] not in existing_program_ids and 
+                len(profile_matches) < 2 and 
+                search_result['similarity_score'] > 0.65):
                 
-                print(f"   📊 Added {profile_match_count} basic profile match recommendations (no AI enhancement yet)")
+                # Create basic profile match WITHOUT AI enhancement
+                profile_matches.append(self._profile_match_rec(user_profile, search_result))
+                logger.debug("   ✅ Added profile match: %s (Score: %.3f)", search_result['title'], search_result['similarity_score'])
+        
+        logger.debug("   📊 Added %s basic profile match recommendations (no AI enhancement yet)", len(profile_matches))
+        return profile_matches
+
+    def _run_hybrid_stages_serial(self, user_profile, user_registrations, collaborative_recs):
+        """Run the LLM, similarity/profile-match and collaborative stages one after another"""
+        all_recommendations = []
+        
+        # 1. Get LLM recommendations (3 items) - Already enhanced
+        logger.debug("🤖 Getting LLM recommendations...")
+        llm_recommendations = self.get_llm_recommendations(user_profile, user_registrations)
+        llm_program_ids = {rec['program_id'] for rec in llm_recommendations}
+        all_recommendations.extend(llm_recommendations)
+        
+        # 2. Get program similarity recommendations (if user has registrations) - NOT enhanced yet
+        if user_registrations:
+            logger.debug("🔗 Getting program similarity recommendations...")
+            similarity_recommendations = self.get_program_similarity_recommendations(user_profile, user_registrations)
             
-            # 3. Get collaborative recommendations (if space allows) - NOT enhanced yet
-            print("\n👥 Getting collaborative recommendations...")
-            existing_program_ids = {rec['program_id'] for rec in all_recommendations}
+            # Filter out duplicates from LLM recommendations
+            unique_similarity_recs = [rec for rec in similarity_recommendations if rec['program_id'] not in llm_program_ids]
             
-            # Filter collaborative recs to avoid duplicates
-            unique_collaborative_recs = []
-            for collab_rec in collaborative_recs:
-                if collab_rec['program_id'] not in existing_program_ids and len(all_recommendations) < 5:
-                    unique_collaborative_recs.append(collab_rec)
+            logger.debug("   📋 Program similarity (after deduplication): %s", len(unique_similarity_recs))
+            all_recommendations.extend(unique_similarity_recs)
+        else:
+            logger.debug("🔗 No registered programs - getting profile match recommendations...")
             
-            collaborative_recommendations = self.get_enhanced_collaborative_recommendations(
-                user_profile, user_registrations, unique_collaborative_recs
+            # For new users, get 2 basic profile match recommendations - NOT enhanced yet
+            additional_search_results = self.get_enhanced_search_results(user_profile, top_k=25)
+            existing_program_ids = {rec['program_id'] for rec in all_recommendations}
+            all_recommendations.extend(
+                self._select_profile_matches(user_profile, additional_search_results, existing_program_ids)
             )
+        
+        # 3. Get collaborative recommendations (if space allows) - NOT enhanced yet
+        logger.debug("👥 Getting collaborative recommendations...")
+        existing_program_ids = {rec['program_id'] for rec in all_recommendations}
+        
+        # Filter collaborative recs to avoid duplicates
+        unique_collaborative_recs = []
+        for collab_rec in collaborative_recs:
+            if collab_rec['program_id'] not in existing_program_ids and len(all_recommendations) < 5:
+                unique_collaborative_recs.append(collab_rec)
+        
+        collaborative_recommendations = self.get_enhanced_collaborative_recommendations(
+            user_profile, user_registrations, unique_collaborative_recs
+        )
+        
+        logger.debug("   👥 Collaborative (after deduplication): %s", len(collaborative_recommendations))
+        all_recommendations.extend(collaborative_recommendations)
+        return all_recommendations
+
+    def _run_hybrid_stages_concurrent(self, user_profile, user_registrations, collaborative_recs, stage_timeout=None):
+        """
+        Start the independent stages together, each bounded by stage_timeout seconds, then
+        apply the same dedupe rules as the serial path in a fixed order. A stage that fails
+        or times out contributes nothing.
+        """
+        stage_timeout = stage_timeout or HYBRID_STAGE_TIMEOUT_SECONDS
+        
+        stages = {
+            "llm": (self.get_llm_recommendations, (user_profile, user_registrations)),
+            "collaborative": (self.get_enhanced_collaborative_recommendations, (user_profile, user_registrations, collaborative_recs))
+        }
+        if user_registrations:
+            stages["similarity"] = (self.get_program_similarity_recommendations, (user_profile, user_registrations))
+        else:
+            stages["profile_search"] = (self.get_enhanced_search_results, (user_profile, 25))
+        
+        logger.info("⚡ Running %s hybrid stages concurrently (timeout %ss each)", len(stages), stage_timeout)
+        
+        executor = ThreadPoolExecutor(max_workers=len(stages))
+        results = {}
+        try:
+            # bind_to_scope lets the stages share the request's memoized Supabase reads
+            futures = {name: executor.submit(bind_to_scope(fn), *args) for name, (fn, args) in stages.items()}
+            deadline = time.monotonic() + stage_timeout
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.warning("⏱️ Hybrid stage '%s' timed out after %ss", name, stage_timeout)
+                    results[name] = []
+                except Exception as e:
+                    logger.error("❌ Hybrid stage '%s' failed: %s", name, e)
+                    results[name] = []
+        finally:
+            # Don't block the response on a stage that overran its timeout
+            executor.shutdown(wait=False)
+        
+        return self._merge_hybrid_stage_results(user_profile, user_registrations, results)
+
+    def _merge_hybrid_stage_results(self, user_profile, user_registrations, results):
+        """Deterministic merge of concurrent stage results: LLM -> similarity/profile match -> collaborative"""
+        all_recommendations = list(results["llm"])
+        llm_program_ids = {rec['program_id'] for rec in all_recommendations}
+        
+        if user_registrations:
+            unique_similarity_recs = [rec for rec in results["similarity"] if rec['program_id'] not in llm_program_ids]
+            logger.debug("   📋 Program similarity (after deduplication): %s", len(unique_similarity_recs))
+            all_recommendations.extend(unique_similarity_recs)
+        else:
+            all_recommendations.extend(
+                self._select_profile_matches(user_profile, results["profile_search"], llm_program_ids)
+            )
+        
+        existing_program_ids = {rec['program_id'] for rec in all_recommendations}
+        unique_collaborative = []
+        if len(all_recommendations) < 5:
+            unique_collaborative = [rec for rec in results["collaborative"] if rec['program_id'] not in existing_program_ids]
+        
+        logger.debug("   👥 Collaborative (after deduplication): %s", len(unique_collaborative))
+        all_recommendations.extend(unique_collaborative)
+        return all_recommendations
+
+    async def _arun_hybrid_stages(self, user_profile, user_registrations, collaborative_recs, stage_timeout=None):
+        """
+        asyncio.gather counterpart of _run_hybrid_stages_concurrent. collaborative_recs may be
+        an awaitable, so computing them overlaps with the LLM and similarity stages.
+        """
+        stage_timeout = stage_timeout or HYBRID_STAGE_TIMEOUT_SECONDS
+        
+        async def collaborative_stage():
+            recs = await collaborative_recs if inspect.isawaitable(collaborative_recs) else collaborative_recs
+            return await run_in_worker(self.get_enhanced_collaborative_recommendations, user_profile, user_registrations, recs)
+        
+        stages = {
+            "llm": self.aget_llm_recommendations(user_profile, user_registrations),
+            "collaborative": collaborative_stage()
+        }
+        if user_registrations:
+            stages["similarity"] = run_in_worker(self.get_program_similarity_recommendations, user_profile, user_registrations)
+        else:
+            stages["profile_search"] = run_in_worker(self.get_enhanced_search_results, user_profile, 25)
+        
+        logger.info("⚡ Running %s hybrid stages with asyncio.gather (timeout %ss each)", len(stages), stage_timeout)
+        
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(stage, timeout=stage_timeout) for stage in stages.values()),
+            return_exceptions=True
+        )
+        results = {}
+        for name, outcome in zip(stages, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.warning("⏱️ Hybrid stage '%s' timed out after %ss", name, stage_timeout)
+                results[name] = []
+            elif isinstance(outcome, BaseException):
+                logger.error("❌ Hybrid stage '%s' failed: %s", name, outcome)
+                results[name] = []
+            else:
+                results[name] = outcome
+        
+        return self._merge_hybrid_stage_results(user_profile, user_registrations, results)
+
+    def _select_top_recommendations(self, all_recommendations):
+        """Order by recommendation type priority, then score, and keep the top 5"""
+        logger.debug("🎯 SELECTING TOP 5 AND ENHANCING WITH AI...")
+        
+        # Sort by recommendation type priority and score
+        def get_priority(rec):
+            type_priority = {
+                'program_similarity': 1,    # Highest priority - similar to registered programs
+                'llm_powered': 2,          # AI recommendations  
+                'profile_match': 3,        # Enhanced profile matches
+                'collaborative_llm': 4     # Social recommendations
+            }
+            return (type_priority.get(rec['recommendation_type'], 5), -rec.get('score', 0))
+        
+        all_recommendations.sort(key=get_priority)
+        
+        # Take top 5 and THEN enhance them
+        return all_recommendations[:5]
+
+    def _print_hybrid_summary(self, final_enhanced_recommendations):
+        # Final summary
+        logger.info("🎯 FINAL EFFICIENT HYBRID RECOMMENDATIONS SUMMARY:")
+        llm_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'llm_powered'])
+        similarity_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'program_similarity'])
+        collaborative_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'collaborative_llm'])
+        profile_match_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'profile_match'])
+        
+        logger.debug("   🤖 LLM-powered (AI Analysis): %s", llm_count)
+        logger.debug("   🔗 Program Similarity (AI Enhanced): %s", similarity_count)
+        logger.debug("   🎯 Profile Match (AI Enhanced): %s", profile_match_count)
+        logger.debug("   👥 Collaborative (AI Enhanced): %s", collaborative_count)
+        logger.debug("   🔄 Total: %s", len(final_enhanced_recommendations))
+        
+        # Print final order
+        logger.debug("📋 FINAL RECOMMENDATION ORDER (Efficiently Enhanced):")
+        for i, rec in enumerate(final_enhanced_recommendations):
+            type_label = {
+                'program_similarity': '🔗 Similar to Registered',
+                'llm_powered': '🤖 AI Recommended',
+                'profile_match': '🎯 Profile Match',
+                'collaborative_llm': '👥 Social Proof'
+            }.get(rec['recommendation_type'], '📋 Other')
             
-            print(f"   👥 Collaborative (after deduplication): {len(collaborative_recommendations)}")
-            all_recommendations.extend(collaborative_recommendations)
-            
-            # 4. NOW enhance ONLY the final selected recommendations with AI
-            print(f"\n🎯 SELECTING TOP 5 AND ENHANCING WITH AI...")
-            
-            # Sort by recommendation type priority and score
-            def get_priority(rec):
-                type_priority = {
-                    'program_similarity': 1,    # Highest priority - similar to registered programs
-                    'llm_powered': 2,          # AI recommendations  
-                    'profile_match': 3,        # Enhanced profile matches
-                    'collaborative_llm': 4     # Social recommendations
-                }
-                return (type_priority.get(rec['recommendation_type'], 5), -rec.get('score', 0))
+            logger.debug("   %s. %s (%s) - Score: %.3f", i+1, rec['title'], type_label, rec.get('score', 0))
+
+    def get_hybrid_recommendations(self, user_profile, user_registrations, collaborative_recs, mode=None):
+        """
+        Enhanced hybrid recommendations: 3 AI + 2 Profile Match for new users
+        mode can be "concurrent" (independent stages run together) or "serial"; defaults to HYBRID_MODE
+        """
+        try:
+            mode = mode or HYBRID_MODE
+            logger.info("🔄 GENERATING HYBRID RECOMMENDATIONS (EFFICIENT AI ENHANCEMENT, %s)", mode.upper())
             
-            all_recommendations.sort(key=get_priority)
+            if mode == "serial":
+                all_recommendations = self._run_hybrid_stages_serial(user_profile, user_registrations, collaborative_recs)
+            else:
+                all_recommendations = self._run_hybrid_stages_concurrent(user_profile, user_registrations, collaborative_recs)
             
-            # Take top 5 and THEN enhance them
-            top_5_recommendations = all_recommendations[:5]
+            # 4. NOW enhance ONLY the final selected recommendations with AI
+            top_5_recommendations = self._select_top_recommendations(all_recommendations)
             
             # Final AI enhancement for selected recommendations only
             final_enhanced_recommendations = self.enhance_final_recommendations(user_profile, top_5_recommendations)
             
-            # Final summary
-            print(f"\n🎯 FINAL EFFICIENT HYBRID RECOMMENDATIONS SUMMARY:")
-            llm_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'llm_powered'])
-            similarity_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'program_similarity'])
-            collaborative_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'collaborative_llm'])
-            profile_match_count = len([r for r in final_enhanced_recommendations if r['recommendation_type'] == 'profile_match'])
-            
-            print(f"   🤖 LLM-powered (AI Analysis): {llm_count}")
-            print(f"   🔗 Program Similarity (AI Enhanced): {similarity_count}")
-            print(f"   🎯 Profile Match (AI Enhanced): {profile_match_count}")
-            print(f"   👥 Collaborative (AI Enhanced): {collaborative_count}")
-            print(f"   🔄 Total: {len(final_enhanced_recommendations)}")
-            
-            # Print final order
-            print(f"\n📋 FINAL RECOMMENDATION ORDER (Efficiently Enhanced):")
-            for i, rec in enumerate(final_enhanced_recommendations):
-                type_label = {
-                    'program_similarity': '🔗 Similar to Registered',
-                    'llm_powered': '🤖 AI Recommended',
-                    'profile_match': '🎯 Profile Match',
-                    'collaborative_llm': '👥 Social Proof'
-                }.get(rec['recommendation_type'], '📋 Other')
-                
-                print(f"   {i+1}. {rec['title']} ({type_label}) - Score: {rec.get('score', 0):.3f}")
+            self._print_hybrid_summary(final_enhanced_recommendations)
+            return final_enhanced_recommendations
             
+        except Exception as e:
+            logger.error("❌ Error generating hybrid recommendations: %s", e)
+            return []
+
+    async def aget_hybrid_recommendations(self, user_profile, user_registrations, collaborative_recs):
+        """
+        Async get_hybrid_recommendations for async views: stages fan out with asyncio.gather,
+        LLM calls use ainvoke/abatch and blocking vector-store/Supabase calls run via run_in_worker.
+        collaborative_recs may be a list or an awaitable producing one.
+        """
+        try:
+            logger.info("🔄 GENERATING HYBRID RECOMMENDATIONS (ASYNC)")
+            all_recommendations = await self._arun_hybrid_stages(user_profile, user_registrations, collaborative_recs)
+            top_5_recommendations = self._select_top_recommendations(all_recommendations)
+            final_enhanced_recommendations = await self.aenhance_final_recommendations(user_profile, top_5_recommendations)
+            self._print_hybrid_summary(final_enhanced_recommendations)
             return final_enhanced_recommendations
             
         except Exception as e:
-            print(f"❌ Error generating hybrid recommendations: {e}")
+            logger.error("❌ Error generating hybrid recommendations: %s", e)
+            return []
+
+    def stream_hybrid_recommendations(self, user_profile, user_registrations, collaborative_recs, stage_timeout=None):
+        """
+        Streaming get_hybrid_recommendations. Yields (event, data) pairs:
+          ("recommendation", rec) as soon as the stage producing rec finishes, so vector
+            matches arrive first, then collaborative and LLM results;
+          ("patch", {"program_id", "llm_reasoning"}) as each final AI enhancement completes;
+          ("done", recommendations) with the same top 5 get_hybrid_recommendations returns.
+        Streamed recommendations are provisional: "done" is authoritative.
+        collaborative_recs may be a list or a callable returning one, run as its own stage.
+        """
+        stage_timeout = stage_timeout or HYBRID_STAGE_TIMEOUT_SECONDS
+        logger.info("🔄 STREAMING HYBRID RECOMMENDATIONS")
+        
+        def collaborative_stage():
+            recs = collaborative_recs() if callable(collaborative_recs) else collaborative_recs
+            return self.get_enhanced_collaborative_recommendations(user_profile, user_registrations, recs)
+        
+        stages = {
+            "llm": (self.get_llm_recommendations, (user_profile, user_registrations)),
+            "collaborative": (collaborative_stage, ())
+        }
+        if user_registrations:
+            stages["similarity"] = (self.get_program_similarity_recommendations, (user_profile, user_registrations))
+        else:
+            stages["profile_search"] = (self.get_enhanced_search_results, (user_profile, 25))
+        
+        executor = ThreadPoolExecutor(max_workers=len(stages))
+        results = {name: [] for name in stages}
+        emitted_program_ids = set()
+        try:
+            futures = {executor.submit(bind_to_scope(fn), *args): name for name, (fn, args) in stages.items()}
+            try:
+                for future in as_completed(futures, timeout=stage_timeout):
+                    name = futures[future]
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error("❌ Hybrid stage '%s' failed: %s", name, e)
+                        continue
+                    
+                    if name == "profile_search":
+                        stage_recommendations = self._select_profile_matches(user_profile, results[name], emitted_program_ids)
+                    else:
+                        stage_recommendations = results[name]
+                    for rec in stage_recommendations:
+                        if rec['program_id'] not in emitted_program_ids:
+                            emitted_program_ids.add(rec['program_id'])
+                            yield "recommendation", rec
+            except FutureTimeoutError:
+                for future, name in futures.items():
+                    if not future.done():
+                        logger.warning("⏱️ Hybrid stage '%s' timed out after %ss", name, stage_timeout)
+        finally:
+            # Also runs if the client disconnects mid-stream
+            executor.shutdown(wait=False)
+        
+        all_recommendations = self._merge_hybrid_stage_results(user_profile, user_registrations, results)
+        top_5_recommendations = self._select_top_recommendations(all_recommendations)
+        
+        try:
+            pending = self._pending_enhancements(top_5_recommendations)
+            enhancements = self.enhance_recommendations_as_completed(
+                user_profile, [(program_data, source) for _, program_data, source in pending]
+            )
+            for i, ai_enhancement in enhancements:
+                self._apply_enhancements([pending[i]], [ai_enhancement])
+                rec = pending[i][0]
+                yield "patch", {"program_id": rec['program_id'], "llm_reasoning": rec['llm_reasoning']}
+        except Exception as e:
+            logger.error("❌ Error enhancing final recommendations: %s", e)
+        
+        self._print_hybrid_summary(top_5_recommendations)
+        yield "done", top_5_recommendations
+
+    def _gather_local_candidates(self, user_profile, user_registrations, collaborative_recs, stage_timeout=None):
+        """
+        Run the candidate sources concurrently: profile vector search, similarity to registered
+        programs and collaborative filtering. None of them calls the LLM. Returns
+        {source: recommendations}; a source that fails or times out gives [].
+        """
+        stage_timeout = stage_timeout or HYBRID_STAGE_TIMEOUT_SECONDS
+        
+        def collaborative_stage():
+            recs = collaborative_recs() if callable(collaborative_recs) else collaborative_recs
+            return self.get_enhanced_collaborative_recommendations(user_profile, user_registrations, recs)
+        
+        stages = {
+            "profile_search": (self.get_enhanced_search_results, (user_profile, LOCAL_RANK_SEARCH_TOP_K)),
+            "collaborative": (collaborative_stage, ())
+        }
+        if user_registrations:
+            stages["similarity"] = (self.get_program_similarity_recommendations, (user_profile, user_registrations))
+        
+        executor = ThreadPoolExecutor(max_workers=len(stages))
+        results = {name: [] for name in ("profile_search", "similarity", "collaborative")}
+        try:
+            futures = {name: executor.submit(bind_to_scope(fn), *args) for name, (fn, args) in stages.items()}
+            deadline = time.monotonic() + stage_timeout
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    logger.warning("⏱️ Candidate source '%s' timed out after %ss", name, stage_timeout)
+                except Exception as e:
+                    logger.error("❌ Candidate source '%s' failed: %s", name, e)
+        finally:
+            executor.shutdown(wait=False)
+        return results
+
+    def _merge_local_candidates(self, user_profile, user_registrations, results):
+        """
+        One candidate per program, registered programs left out. A program found by several
+        sources keeps the first source's recommendation_type (similarity, collaborative,
+        profile match) and the best vector similarity of any of them.
+        Returns (recommendations, {program_id: search metadata}).
+        """
+        registered_ids = {reg.get('program_id') for reg in user_registrations}
+        candidates = {}
+        for rec in results["similarity"] + results["collaborative"]:
+            if rec.get('program_id') not in registered_ids:
+                candidates.setdefault(rec['program_id'], dict(rec))
+        
+        details = {}
+        for search_result in results["profile_search"]:
+            program_id = search_result.get('program_id')
+            if program_id in registered_ids:
+                continue
+            details.setdefault(program_id, search_result)
+            rec = candidates.get(program_id)
+            if rec is None:
+                candidates[program_id] = self._profile_match_rec(user_profile, search_result)
+            else:
+                rec['similarity_score'] = max(rec.get('similarity_score') or 0, search_result.get('similarity_score') or 0)
+        return list(candidates.values()), details
+
+    async def _agather_local_candidates(self, user_profile, user_registrations, collaborative_recs, stage_timeout=None):
+        """
+        asyncio.gather counterpart of _gather_local_candidates: each source's blocking calls
+        run via run_in_worker and are awaited on the event loop. collaborative_recs may be an
+        awaitable, a callable or a list.
+        """
+        stage_timeout = stage_timeout or HYBRID_STAGE_TIMEOUT_SECONDS
+        
+        async def collaborative_stage():
+            if inspect.isawaitable(collaborative_recs):
+                recs = await collaborative_recs
+            elif callable(collaborative_recs):
+                recs = await run_in_worker(collaborative_recs)
+            else:
+                recs = collaborative_recs
+            return await run_in_worker(self.get_enhanced_collaborative_recommendations, user_profile, user_registrations, recs)
+        
+        stages = {
+            "profile_search": run_in_worker(self.get_enhanced_search_results, user_profile, LOCAL_RANK_SEARCH_TOP_K),
+            "collaborative": collaborative_stage()
+        }
+        if user_registrations:
+            stages["similarity"] = run_in_worker(self.get_program_similarity_recommendations, user_profile, user_registrations)
+        
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(stage, timeout=stage_timeout) for stage in stages.values()),
+            return_exceptions=True
+        )
+        results = {name: [] for name in ("profile_search", "similarity", "collaborative")}
+        for name, outcome in zip(stages, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                logger.warning("⏱️ Candidate source '%s' timed out after %ss", name, stage_timeout)
+            elif isinstance(outcome, BaseException):
+                logger.error("❌ Candidate source '%s' failed: %s", name, outcome)
+            else:
+                results[name] = outcome
+        return results
+
+    def rank_locally(self, user_profile, user_registrations, collaborative_recs, limit=5):
+        """
+        Candidates from every non-LLM source, scored and ordered by local_ranker. Each
+        recommendation's score is its local score and ranking_signals holds the per-signal
+        values behind it. Returns (recommendations, {program_id: search metadata}).
+        """
+        results = self._gather_local_candidates(user_profile, user_registrations, collaborative_recs)
+        return self._rank_local_candidates(user_profile, user_registrations, results, limit)
+
+    def _rank_local_candidates(self, user_profile, user_registrations, results, limit):
+        """rank_locally once the candidate sources are in"""
+        candidates, details = self._merge_local_candidates(user_profile, user_registrations, results)
+        # Collaborative recommendations carry collaborative_score / 10 as their score
+        collaborative_scores = {rec['program_id']: rec['score'] * 10 for rec in results["collaborative"]}
+        
+        with timed("local_rank"):
+            # Search metadata (description, level) is only used for scoring, not returned
+            ranked = rank_candidates(
+                user_profile,
+                [{**details.get(rec['program_id'], {}), **rec} for rec in candidates],
+                collaborative_scores,
+                limit=limit
+            )
+        by_id = {rec['program_id']: rec for rec in candidates}
+        recommendations = []
+        for candidate, score, signals in ranked:
+            rec = by_id[candidate['program_id']]
+            rec['score'] = score
+            rec['ranking_signals'] = signals
+            recommendations.append(rec)
+        
+        logger.info("📐 Ranked %s local candidates, kept %s", len(candidates), len(recommendations))
+        return recommendations, details
+
+    def _llm_layer_fits(self, remaining_ms):
+        """Whether the LLM layer is expected to finish within remaining_ms"""
+        backoff_ms = llm_scheduler.backoff_remaining() * 1000
+        with self._llm_layer_lock:
+            expected_ms = self._llm_layer_ms
+            if remaining_ms >= expected_ms and backoff_ms < remaining_ms:
+                return True
+            # Drift back toward the configured estimate so one slow spell doesn't disable the layer for good
+            self._llm_layer_ms += 0.2 * (LLM_LAYER_EXPECTED_MS - self._llm_layer_ms)
+        logger.info("⏭️ Skipping LLM layer: %.0fms left, expected %.0fms, rate-limit backoff %.0fms",
+                    remaining_ms, expected_ms, backoff_ms)
+        return False
+
+    def _observe_llm_layer(self, elapsed_ms):
+        with self._llm_layer_lock:
+            self._llm_layer_ms += 0.2 * (elapsed_ms - self._llm_layer_ms)
+
+    def _llm_rerank(self, user_profile, user_registrations, shortlist):
+        """The main recommendation chain run over the locally ranked shortlist only"""
+        chain_input = self._llm_chain_input(user_profile, user_registrations, shortlist)
+        cache_key = fingerprint("recommendation", chain_input)
+        picks = llm_cache.get(cache_key)
+        if picks is None:
+            picks = self.chain.invoke(chain_input)
+            if isinstance(picks, list):
+                llm_cache.put(cache_key, picks)
+        return picks if isinstance(picks, list) else []
+
+    def _run_llm_layer(self, user_profile, user_registrations, recommendations, shortlist, deadline):
+        """
+        Rerank the shortlist and explain the top recommendations with the LLM, in parallel,
+        until deadline (time.monotonic()). Yields ("explanation", (rec, source, enhancement))
+        as explanations complete, with enhancement None when the call failed, and
+        ("rerank", picks) once the rerank is back. Work still running at the deadline is
+        abandoned; its results still land in the LLM cache.
+        """
+        events = queue.Queue()
+        pending = self._pending_enhancements(recommendations)
+        
+        def rerank():
+            try:
+                events.put(("rerank", self._llm_rerank(user_profile, user_registrations, shortlist)))
+            except Exception as e:
+                logger.error("❌ Error in LLM rerank: %s", e)
+            finally:
+                events.put(("finished", "rerank"))
+        
+        def explain():
+            try:
+                items = [(program_data, source) for _, program_data, source in pending]
+                for i, enhancement in self.enhance_recommendations_as_completed(user_profile, items, fallback=False):
+                    events.put(("explanation", (pending[i][0], pending[i][2], enhancement)))
+            except Exception as e:
+                logger.error("❌ Error explaining recommendations: %s", e)
+            finally:
+                events.put(("finished", "explain"))
+        
+        executor = ThreadPoolExecutor(max_workers=2)
+        try:
+            executor.submit(bind_to_scope(rerank))
+            executor.submit(bind_to_scope(explain))
+            running = 2
+            while running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("⏱️ LLM layer cut off by the latency budget")
+                    return
+                try:
+                    event, data = events.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if event == "finished":
+                    running -= 1
+                else:
+                    yield event, data
+        finally:
+            executor.shutdown(wait=False)
+
+    def stream_ranked_recommendations(self, user_profile, user_registrations, collaborative_recs, latency_budget_ms=None):
+        """
+        Local-first recommendations. Yields (event, data) pairs like stream_hybrid_recommendations:
+          ("recommendation", rec) for the locally ranked top 5, available without any LLM call;
+          ("patch", {"program_id", "llm_reasoning"}) as LLM explanations arrive;
+          ("done", recommendations) with the final top 5, LLM rerank picks first.
+        The LLM layer only runs if what is left of latency_budget_ms (default
+        RECOMMENDATION_LATENCY_BUDGET_MS, 0 = never) is expected to cover it, and is cut off
+        when the budget runs out, leaving the local ranking and its explanations in place.
+        collaborative_recs may be a list or a callable returning one.
+        """
+        started = time.monotonic()
+        latency_budget_ms = RECOMMENDATION_LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+        logger.info("🔄 RANKING RECOMMENDATIONS LOCALLY (latency budget %.0fms)", latency_budget_ms)
+        
+        shortlist, details = self.rank_locally(
+            user_profile, user_registrations, collaborative_recs, limit=max(5, LLM_RERANK_SHORTLIST)
+        )
+        recommendations = shortlist[:5]
+        for rec in recommendations:
+            yield "recommendation", rec
+        
+        remaining_ms = latency_budget_ms - (time.monotonic() - started) * 1000
+        if recommendations and self._llm_layer_fits(remaining_ms):
+            picks = []
+            layer_started = time.monotonic()
+            with timed("llm_layer"):
+                layer = self._run_llm_layer(
+                    user_profile,
+                    user_registrations,
+                    recommendations,
+                    self._rerank_shortlist(shortlist, details),
+                    layer_started + remaining_ms / 1000
+                )
+                for event, data in layer:
+                    if event == "rerank":
+                        picks = data
+                        continue
+                    rec, source, enhancement = data
+                    if self._apply_explanation(rec, source, enhancement):
+                        yield "patch", {"program_id": rec['program_id'], "llm_reasoning": rec['llm_reasoning']}
+            self._observe_llm_layer((time.monotonic() - layer_started) * 1000)
+            recommendations = self._apply_llm_picks(shortlist, recommendations, picks)
+        
+        self._print_hybrid_summary(recommendations)
+        yield "done", recommendations
+
+    @staticmethod
+    def _rerank_shortlist(shortlist, details):
+        """The shortlist the LLM may rerank, with search metadata (description, level) for its prompt"""
+        return [{**details.get(rec['program_id'], {}), **rec} for rec in shortlist[:LLM_RERANK_SHORTLIST]]
+
+    def _apply_explanation(self, rec, source, enhancement):
+        """Set rec's llm_reasoning from a finished explanation; False if it failed or rec already has one"""
+        # A failed explanation keeps the recommendation's own similarity/collaborative/match info
+        if rec.get('llm_reasoning') or enhancement is None:
+            return False
+        self._apply_enhancements([(rec, None, source)], [enhancement])
+        return True
+
+    async def _allm_rerank(self, user_profile, user_registrations, shortlist):
+        """Async _llm_rerank via chain.ainvoke"""
+        try:
+            chain_input = self._llm_chain_input(user_profile, user_registrations, shortlist)
+            cache_key = fingerprint("recommendation", chain_input)
+            picks = llm_cache.get(cache_key)
+            if picks is None:
+                picks = await self.chain.ainvoke(chain_input)
+                if isinstance(picks, list):
+                    llm_cache.put(cache_key, picks)
+            return picks if isinstance(picks, list) else []
+        except Exception as e:
+            logger.error("❌ Error in LLM rerank: %s", e)
+            return []
+
+    async def _arun_llm_layer(self, user_profile, user_registrations, recommendations, shortlist, timeout):
+        """
+        Async _run_llm_layer: the rerank and one task per explanation run on the event loop
+        for at most timeout seconds. Returns (picks, [(rec, source, enhancement)]) for what
+        finished; the rest is cancelled, since the view's event loop ends with the request.
+        """
+        pending = self._pending_enhancements(recommendations)
+        inputs, cache_keys, results, missing = self._plan_enhancement_batch(
+            user_profile, [(program_data, source) for _, program_data, source in pending]
+        )
+        explanations = [(pending[i][0], pending[i][2], result) for i, result in enumerate(results) if result is not None]
+        semaphore = asyncio.Semaphore(ENHANCEMENT_MAX_CONCURRENCY)
+        
+        async def explain(i):
+            rec, program_data, source = pending[i]
+            try:
+                async with semaphore:
+                    result = await self.enhancement_chain.ainvoke(inputs[i])
+            except Exception as e:
+                result = e
+            if isinstance(result, dict):
+                llm_cache.put(cache_keys[i], result)
+                explanations.append((rec, source, result))
+            else:
+                logger.warning("⚠️ Enhancement failed for %s: %s", program_data.get('title', 'Unknown'), result)
+        
+        rerank = asyncio.ensure_future(self._allm_rerank(user_profile, user_registrations, shortlist))
+        tasks = [rerank] + [asyncio.ensure_future(explain(i)) for i in missing]
+        _, unfinished = await asyncio.wait(tasks, timeout=timeout)
+        if unfinished:
+            logger.warning("⏱️ LLM layer cut off by the latency budget")
+            for task in unfinished:
+                task.cancel()
+        picks = rerank.result() if rerank.done() and not rerank.cancelled() else []
+        return picks, explanations
+
+    async def aget_ranked_recommendations(self, user_profile, user_registrations, collaborative_recs, latency_budget_ms=None):
+        """
+        Async get_ranked_recommendations for async views: candidate sources fan out with
+        asyncio.gather and the LLM layer awaits ainvoke on the event loop, so no worker thread
+        is held for the latency budget. collaborative_recs may be an awaitable, a callable or a list.
+        """
+        try:
+            started = time.monotonic()
+            latency_budget_ms = RECOMMENDATION_LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+            logger.info("🔄 RANKING RECOMMENDATIONS LOCALLY (ASYNC, latency budget %.0fms)", latency_budget_ms)
+            
+            results = await self._agather_local_candidates(user_profile, user_registrations, collaborative_recs)
+            shortlist, details = self._rank_local_candidates(
+                user_profile, user_registrations, results, limit=max(5, LLM_RERANK_SHORTLIST)
+            )
+            recommendations = shortlist[:5]
+            
+            remaining_ms = latency_budget_ms - (time.monotonic() - started) * 1000
+            if recommendations and self._llm_layer_fits(remaining_ms):
+                layer_started = time.monotonic()
+                with timed("llm_layer"):
+                    picks, explanations = await self._arun_llm_layer(
+                        user_profile,
+                        user_registrations,
+                        recommendations,
+                        self._rerank_shortlist(shortlist, details),
+                        remaining_ms / 1000
+                    )
+                for rec, source, enhancement in explanations:
+                    self._apply_explanation(rec, source, enhancement)
+                self._observe_llm_layer((time.monotonic() - layer_started) * 1000)
+                recommendations = self._apply_llm_picks(shortlist, recommendations, picks)
+            
+            self._print_hybrid_summary(recommendations)
+            return recommendations
+            
+        except Exception as e:
+            logger.error("❌ Error generating ranked recommendations: %s", e)
             return []
 
+    def _apply_llm_picks(self, shortlist, recommendations, picks):
+        """The LLM's shortlist picks first, in its order and with its reasoning, then the local top 5, truncated to 5"""
+        by_id = {rec['program_id']: rec for rec in shortlist}
+        reranked = []
+        for pick in picks:
+            rec = by_id.pop(pick.get('program_id'), None) if isinstance(pick, dict) else None
+            if rec is None:
+                continue
+            rec['llm_reasoning'] = {
+                "reason": pick.get('recommendation_reason', ''),
+                "skills_gained": pick.get('skills_gained', ''),
+                "career_impact": pick.get('career_impact', ''),
+                "urgency": pick.get('urgency', 'medium')
+            }
+            reranked.append(rec)
+        if reranked:
+            logger.info("🤖 LLM reranked %s of %s shortlisted programs to the front", len(reranked), len(shortlist))
+        reranked_ids = {rec['program_id'] for rec in reranked}
+        return (reranked + [rec for rec in recommendations if rec['program_id'] not in reranked_ids])[:5]
+
+    def get_ranked_recommendations(self, user_profile, user_registrations, collaborative_recs, latency_budget_ms=None):
+        """Final list of stream_ranked_recommendations; [] if local ranking itself fails"""
+        try:
+            for event, data in self.stream_ranked_recommendations(user_profile, user_registrations, collaborative_recs, latency_budget_ms):
+                if event == "done":
+                    return data
+        except Exception as e:
+            logger.error("❌ Error generating ranked recommendations: %s", e)
+        return []
+
 # Global instance
 llm_engine = LLMRecommendationEngine()
\ No newline at end of file
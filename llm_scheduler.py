@@ -0,0 +1,494 @@
+"""
+Process-wide scheduler for Groq calls.
+
+Both LangChain chains are wrapped by schedule_chain(), so every invoke/batch call (sync or
+async, from any request or worker thread):
+- waits for one of LLM_MAX_CONCURRENCY slots and for the request and token buckets. The
+  buckets start from LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE (0 = no limit) and
+  are re-synced from the x-ratelimit-* headers of every Groq response
+- is admitted in priority order: interactive work (request handlers) before background
+  work (snapshot refreshes run inside llm_priority(BACKGROUND))
+- shares the completion of an identical prompt that is already in flight
+- is retried on HTTP 429 with jittered exponential backoff; retry-after pauses every caller
+"""
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from llm_cache import fingerprint
+from data_loader import bind_to_scope
+from metrics import record, prompt_tokens, METRICS_ENABLED
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+# Completion tokens reserved per call on top of the prompt
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "400"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "30"))
+# A call that can't be admitted within this long fails, and callers fall back as for any LLM error
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+
+INTERACTIVE, BACKGROUND = 0, 1
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run LLM calls made inside the block (and in workers bound to it) at priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str):
+    """Rough token count (about 4 characters per token for English prose and JSON)"""
+    return len(text) // 4
+
+
+def _parse_duration(value):
+    """Seconds from a rate-limit header value: "7.66s", "2m59.56s", "120ms" or a plain number"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    return sum(float(amount) * units[unit] for amount, unit in parts) if parts else None
+
+
+def _parse_number(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Refilling budget; capacity None means unlimited until a rate-limit header sets one"""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute or None
+        self.rate = (per_minute or 0) / 60.0
+        self.level = self.capacity or 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float):
+        """0 when amount is available, else seconds until it will be"""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else 1.0
+
+    def take(self, amount: float, now: float):
+        if self.capacity is not None:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def sync(self, limit, remaining, reset_seconds, now: float):
+        """Adopt the provider's view: its limit, at most its remaining budget, its refill pace"""
+        if limit is None or remaining is None:
+            return
+        self._refill(now)
+        if self.capacity is None:
+            self.level = remaining
+        self.capacity = limit
+        self.level = min(self.level, remaining)
+        if reset_seconds and limit > remaining:
+            # Refilling the used part by the reset time
+            self.rate = (limit - remaining) / reset_seconds
+
+
+class _Ticket:
+    __slots__ = ("priority", "seq")
+
+    def __init__(self, priority: int, seq: int):
+        self.priority = priority
+        self.seq = seq
+
+    def order(self):
+        return (self.priority, self.seq)
+
+
+def _is_rate_limited(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _error_headers(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "headers", None) or {}
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE, max_retries: int = LLM_MAX_RETRIES,
+                 queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []
+        self._async_waiters = set()  # (event loop, asyncio.Event) per coroutine waiting in _aacquire
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._in_flight = {}  # coalescing key -> (Future, _Ticket)
+        self._in_flight_lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.queue_timeouts = 0
+
+    # --- admission ---
+
+    def _notify(self):
+        """Under _cond: wake every waiter, blocked threads and async admissions on their loops"""
+        self._cond.notify_all()
+        for loop, wake in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # loop already closed; its waiter is on the way out
+
+    def _admit(self, ticket: _Ticket, tokens: int, now: float):
+        """Under _cond: 0 once ticket is admitted, else seconds to wait (None: until notified)"""
+        if min(self._waiting, key=_Ticket.order) is not ticket or self._active >= self.max_concurrency:
+            return None
+        wait = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if wait > 0:
+            return wait
+        self._waiting.remove(ticket)
+        self.requests.take(1, now)
+        self.tokens.take(tokens, now)
+        self._active += 1
+        self.calls += 1
+        # The next ticket in line re-checks
+        self._notify()
+        return 0
+
+    def _timed_out(self):
+        self.queue_timeouts += 1
+        return TimeoutError(f"LLM call not admitted within {self.queue_timeout:.0f}s")
+
+    def _withdraw(self, ticket: _Ticket):
+        """Under _cond: drop a ticket that gave up waiting"""
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            self._notify()
+
+    def _acquire(self, ticket: _Ticket, tokens: int):
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.queue_timeout
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._admit(ticket, tokens, now)
+                    if wait == 0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise self._timed_out()
+                    self._cond.wait(min(wait, remaining) if wait else remaining)
+            except BaseException:
+                self._withdraw(ticket)
+                raise
+        record("llm_queue_wait", time.perf_counter() - started)
+
+    async def _aacquire(self, ticket: _Ticket, tokens: int):
+        """_acquire for coroutines: waits on the caller's event loop instead of holding a thread"""
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.queue_timeout
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        wake = waiter[1]
+        with self._cond:
+            self._waiting.append(ticket)
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                with self._cond:
+                    # Cleared under the lock, so any later _notify sets it again
+                    wake.clear()
+                    now = time.monotonic()
+                    wait = self._admit(ticket, tokens, now)
+                    if wait == 0:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise self._timed_out()
+                try:
+                    await asyncio.wait_for(wake.wait(), min(wait, remaining) if wait else remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Admission happens under the lock with no await after it, so a cancelled
+            # waiter never holds a slot; it only has to leave the queue
+            with self._cond:
+                self._async_waiters.discard(waiter)
+                self._withdraw(ticket)
+        record("llm_queue_wait", time.perf_counter() - started)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._notify()
+
+    def _boost(self, ticket: _Ticket, priority: int):
+        """An interactive caller sharing a background call's result must not wait behind background work"""
+        if priority < ticket.priority:
+            with self._cond:
+                ticket.priority = priority
+                self._notify()
+
+    # --- rate-limit feedback ---
+
+    def observe_headers(self, headers):
+        """Re-sync the buckets from x-ratelimit-* response headers (Groq/OpenAI style)"""
+        if not headers or "x-ratelimit-remaining-requests" not in headers and "x-ratelimit-remaining-tokens" not in headers:
+            return
+        now = time.monotonic()
+        with self._cond:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                bucket.sync(
+                    _parse_number(headers.get(f"x-ratelimit-limit-{kind}")),
+                    _parse_number(headers.get(f"x-ratelimit-remaining-{kind}")),
+                    _parse_duration(headers.get(f"x-ratelimit-reset-{kind}")),
+                    now
+                )
+            self._notify()
+
+    def _retry_delay(self, error, attempt: int):
+        """Seconds to back off before retrying error, or None when it must not be retried"""
+        if not _is_rate_limited(error) or attempt >= self.max_retries:
+            return None
+        headers = _error_headers(error)
+        self.observe_headers(headers)
+        backoff = min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt)
+        delay = max(_parse_duration(headers.get("retry-after")) or 0.0, backoff) + random.uniform(0, backoff)
+        with self._cond:
+            self.rate_limited += 1
+            self.retries += 1
+            # Everyone else would hit the same limit, so the whole scheduler waits
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        logger.warning("⏳ LLM rate limited, retrying in %.1fs (attempt %s/%s)", delay, attempt + 1, self.max_retries)
+        return delay
+
+    # --- execution ---
+
+    def _join(self, key: str):
+        """(future, ticket, is_leader) for key; followers share the leader's future"""
+        priority = _priority.get()
+        with self._in_flight_lock:
+            entry = self._in_flight.get(key)
+            if entry is None:
+                entry = self._in_flight[key] = (Future(), _Ticket(priority, next(self._seq)))
+                return entry[0], entry[1], True
+            self.coalesced += 1
+        self._boost(entry[1], priority)
+        return entry[0], entry[1], False
+
+    def _finish(self, key: str, future: Future, result=None, error=None):
+        with self._in_flight_lock:
+            self._in_flight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key: str, call, tokens: int):
+        """call() under the scheduler; concurrent runs with the same key share one call"""
+        future, ticket, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            for attempt in itertools.count():
+                self._acquire(ticket, tokens)
+                try:
+                    result = call()
+                    break
+                except Exception as e:
+                    if self._retry_delay(e, attempt) is None:
+                        raise
+                finally:
+                    self._release()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    async def arun(self, key: str, acall, tokens: int):
+        """Async run: admission and acall() are both awaited on the caller's loop"""
+        future, ticket, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            for attempt in itertools.count():
+                await self._aacquire(ticket, tokens)
+                try:
+                    result = await acall()
+                    break
+                except Exception as e:
+                    if self._retry_delay(e, attempt) is None:
+                        raise
+                finally:
+                    self._release()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def backoff_remaining(self):
+        """Seconds until calls are admitted again after a 429 (0 when not paused)"""
+        with self._cond:
+            return max(0.0, self._paused_until - time.monotonic())
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiting),
+                "interactive_waiting": sum(1 for ticket in self._waiting if ticket.priority == INTERACTIVE),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "queue_timeouts": self.queue_timeouts,
+                "request_budget": None if self.requests.capacity is None else round(self.requests.level, 1),
+                "token_budget": None if self.tokens.capacity is None else round(self.tokens.level, 1)
+            }
+
+
+class ScheduledChain:
+    """LangChain runnable proxy sending every call through the scheduler, one prompt at a time"""
+    def __init__(self, chain, name: str, scheduler: LLMScheduler):
+        self._chain = chain
+        self._name = name
+        self._scheduler = scheduler
+
+    def _plan(self, chain_input):
+        """Coalescing key and token reservation for one prompt"""
+        try:
+            prompt_text = self._chain.first.format(**chain_input)
+        except Exception:
+            prompt_text = json.dumps(chain_input, default=str)
+        tokens = estimate_tokens(prompt_text)
+        if METRICS_ENABLED:
+            prompt_tokens.observe((self._name,), tokens)
+        logger.debug("🧮 %s prompt: ~%s tokens", self._name, tokens)
+        return fingerprint(self._name, chain_input), tokens + LLM_EXPECTED_OUTPUT_TOKENS
+
+    def invoke(self, chain_input, config=None, **kwargs):
+        key, tokens = self._plan(chain_input)
+        return self._scheduler.run(key, lambda: self._chain.invoke(chain_input, config=config, **kwargs), tokens)
+
+    async def ainvoke(self, chain_input, config=None, **kwargs):
+        key, tokens = self._plan(chain_input)
+        return await self._scheduler.arun(key, lambda: self._chain.ainvoke(chain_input, config=config, **kwargs), tokens)
+
+    def batch_as_completed(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        """Yields (position, result) as calls finish; max_concurrency caps this batch's share of the slots"""
+        if not inputs:
+            return
+        max_concurrency = (config or {}).get("max_concurrency") or len(inputs)
+        executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(inputs)), thread_name_prefix=f"{self._name}-batch")
+        try:
+            futures = {executor.submit(bind_to_scope(self.invoke), chain_input, config, **kwargs): i for i, chain_input in enumerate(inputs)}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    yield futures[future], e
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        results = [None] * len(inputs)
+        for i, result in self.batch_as_completed(inputs, config, return_exceptions=return_exceptions, **kwargs):
+            results[i] = result
+        return results
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        semaphore = asyncio.Semaphore((config or {}).get("max_concurrency") or max(len(inputs), 1))
+
+        async def one(chain_input):
+            async with semaphore:
+                return await self.ainvoke(chain_input, config, **kwargs)
+
+        return list(await asyncio.gather(*(one(chain_input) for chain_input in inputs), return_exceptions=return_exceptions))
+
+    def __getattr__(self, name):
+        return getattr(self._chain, name)
+
+
+llm_scheduler = LLMScheduler()
+
+
+def schedule_chain(chain, name: str):
+    return ScheduledChain(chain, name, llm_scheduler)
+
+
+def _observe_response(response):
+    llm_scheduler.observe_headers(response.headers)
+
+
+async def _aobserve_response(response):
+    llm_scheduler.observe_headers(response.headers)
+
+
+def groq_http_client():
+    """
+    httpx client for ChatGroq whose responses re-sync the scheduler's buckets from the
+    rate-limit headers; None (ChatGroq's own client) when httpx isn't installed
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+    limits = httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY)
+    return httpx.Client(limits=limits, timeout=60.0, event_hooks={"response": [_observe_response]})
+
+
+def groq_async_http_client():
+    """groq_http_client for ChatGroq's ainvoke path (httpx async clients need async hooks)"""
+    try:
+        import httpx
+    except ImportError:
+        return None
+    # Async views each run on a fresh event loop, and a pooled connection can't outlive
+    # the loop that opened it, so connections aren't kept alive between calls
+    limits = httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=0)
+    return httpx.AsyncClient(limits=limits, timeout=60.0, event_hooks={"response": [_aobserve_response]})
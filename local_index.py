@@ -0,0 +1,276 @@
+import os
+import logging
+import csv
+import time
+import threading
+import numpy as np
+from recommendation_store import bump_catalog_version
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Set USE_LOCAL_INDEX=true to answer query/fetch from an in-process copy of the catalog
+USE_LOCAL_INDEX = os.getenv("USE_LOCAL_INDEX", "false").lower() in ("1", "true", "yes")
+LOCAL_INDEX_REFRESH_SECONDS = int(os.getenv("LOCAL_INDEX_REFRESH_SECONDS", "0"))
+# While the mirror is empty (e.g. the first load failed) queries go to Pinecone and a reload is retried this often
+LOCAL_INDEX_RETRY_SECONDS = float(os.getenv("LOCAL_INDEX_RETRY_SECONDS", "30"))
+CATALOG_CSV = os.getenv("CATALOG_CSV", "updated_programs (1).csv")
+FETCH_BATCH_SIZE = 100
+
+
+class LocalMatch:
+    """Same shape as a Pinecone ScoredVector: id, score, values, metadata"""
+    def __init__(self, id, score, values, metadata):
+        self.id = id
+        self.score = score
+        self.values = values
+        self.metadata = metadata
+
+
+class LocalQueryResponse:
+    def __init__(self, matches):
+        self.matches = matches
+
+
+class LocalVector:
+    """Same shape as a Pinecone Vector: id, values, metadata"""
+    def __init__(self, id, values, metadata):
+        self.id = id
+        self.values = values
+        self.metadata = metadata
+
+
+class LocalFetchResponse:
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+
+def _matches_filter(metadata: dict, filters: dict):
+    """Evaluate the subset of Pinecone's metadata filter language used by the app"""
+    for field, condition in (filters or {}).items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for op, target in condition.items():
+            try:
+                if op == "$eq" and value != target:
+                    return False
+                if op == "$ne" and value == target:
+                    return False
+                if op == "$in" and value not in target:
+                    return False
+                if op == "$nin" and value in target:
+                    return False
+                if op == "$lte" and not (value is not None and float(value) <= float(target)):
+                    return False
+                if op == "$lt" and not (value is not None and float(value) < float(target)):
+                    return False
+                if op == "$gte" and not (value is not None and float(value) >= float(target)):
+                    return False
+                if op == "$gt" and not (value is not None and float(value) > float(target)):
+                    return False
+            except (ValueError, TypeError):
+                return False
+    return True
+
+
+class LocalProgramIndex:
+    """
+    In-memory mirror of the Pinecone "programs" index.
+    All vectors live in one contiguous, L2-normalized float32 matrix so a query is a
+    single matrix-vector product. Call refresh() to reload from Pinecone without a restart.
+    on_reload() runs after every successful load. While nothing is loaded, queries are
+    answered by remote_index and a reload is retried in the background.
+    """
+    def __init__(self, remote_index, catalog_csv: str = CATALOG_CSV, on_reload=None):
+        self.remote = remote_index
+        self.catalog_csv = catalog_csv
+        self._on_reload = on_reload
+        self._lock = threading.Lock()
+        # (ids, id -> row, normalized matrix, raw values, metadata) swapped atomically on refresh
+        self._snapshot = ([], {}, np.zeros((0, 0), dtype=np.float32), [], [])
+        self._refresh_timer = None
+        self._retrying = False
+        self._last_attempt = 0.0
+
+    def _list_vector_ids(self):
+        """List every vector id, via index.list() when supported, else from the catalog CSV"""
+        try:
+            vector_ids = []
+            for page in self.remote.list():
+                vector_ids.extend(page)
+            if vector_ids:
+                return vector_ids
+        except Exception as e:
+            logger.warning("⚠️ index.list() unavailable (%s), falling back to %s", e, self.catalog_csv)
+
+        with open(self.catalog_csv, newline="", encoding="utf-8") as f:
+            return [f"program-{row['program_id']}" for row in csv.DictReader(f)]
+
+    def refresh(self):
+        """Reload all program vectors and metadata from Pinecone; returns the count, 0 if the load failed"""
+        self._last_attempt = time.monotonic()
+        try:
+            vector_ids = self._list_vector_ids()
+            records = {}
+            for i in range(0, len(vector_ids), FETCH_BATCH_SIZE):
+                response = self.remote.fetch(ids=vector_ids[i:i + FETCH_BATCH_SIZE])
+                records.update(response.vectors)
+
+            ids = [vector_id for vector_id in vector_ids if vector_id in records]
+            values = [list(records[vector_id].values) for vector_id in ids]
+            metadata = [dict(records[vector_id].metadata or {}) for vector_id in ids]
+
+            matrix = np.ascontiguousarray(np.array(values, dtype=np.float32))
+            if matrix.size:
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix /= norms
+
+            with self._lock:
+                self._snapshot = (ids, {vector_id: row for row, vector_id in enumerate(ids)}, matrix, values, metadata)
+
+            logger.info("✅ Local index loaded %s program vectors", len(ids))
+            if ids and self._on_reload is not None:
+                self._on_reload()
+            return len(ids)
+
+        except Exception as e:
+            logger.error("❌ Error refreshing local index: %s", e)
+            return 0
+
+    def start_auto_refresh(self, interval_seconds: int):
+        """Reload the mirror every interval_seconds on a daemon timer"""
+        def _tick():
+            self.refresh()
+            self.start_auto_refresh(interval_seconds)
+
+        self._refresh_timer = threading.Timer(interval_seconds, _tick)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _retry_in_background(self):
+        """Start one background reload if none is running and the last attempt is old enough"""
+        with self._lock:
+            if self._retrying or time.monotonic() - self._last_attempt < LOCAL_INDEX_RETRY_SECONDS:
+                return
+            self._retrying = True
+
+        def _retry():
+            try:
+                self.refresh()
+            finally:
+                with self._lock:
+                    self._retrying = False
+
+        threading.Thread(target=_retry, name="local-index-retry", daemon=True).start()
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    def query(self, vector, top_k: int = 10, include_metadata: bool = True, filter: dict = None, include_values: bool = False, **kwargs):
+        """Top-k cosine similarity over the mirrored catalog (Pinecone while the mirror is empty)"""
+        ids, _, matrix, values, metadata = self._snapshot
+        if not ids:
+            self._retry_in_background()
+            return self.remote.query(vector=vector, top_k=top_k, include_metadata=include_metadata,
+                                     filter=filter, include_values=include_values, **kwargs)
+
+        query_vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm:
+            query_vec = query_vec / norm
+
+        scores = matrix @ query_vec
+
+        if filter:
+            mask = np.fromiter((_matches_filter(meta, filter) for meta in metadata), dtype=bool, count=len(metadata))
+            scores = np.where(mask, scores, -np.inf)
+            available = int(mask.sum())
+        else:
+            available = len(ids)
+
+        k = min(top_k, available)
+        if k <= 0:
+            return LocalQueryResponse([])
+
+        if k < len(ids):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(ids))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        matches = [
+            LocalMatch(
+                id=ids[row],
+                score=float(scores[row]),
+                values=list(values[row]) if include_values else [],
+                # Copy so callers that annotate match.metadata don't mutate the mirror
+                metadata=dict(metadata[row]) if include_metadata else {}
+            )
+            for row in top if np.isfinite(scores[row])
+        ]
+        return LocalQueryResponse(matches)
+
+    def fetch(self, ids: list, **kwargs):
+        """Return stored vectors by id, going to Pinecone only for ids the mirror does not hold"""
+        _, row_of, _, values, metadata = self._snapshot
+        vectors = {}
+        missing = []
+        for vector_id in ids:
+            row = row_of.get(vector_id)
+            if row is None:
+                missing.append(vector_id)
+            else:
+                vectors[vector_id] = LocalVector(vector_id, list(values[row]), dict(metadata[row]))
+
+        if missing:
+            try:
+                vectors.update(self.remote.fetch(ids=missing).vectors)
+            except Exception as e:
+                logger.warning("⚠️ Remote fetch for %s ids not in local index failed: %s", len(missing), e)
+
+        return LocalFetchResponse(vectors)
+
+    def export(self):
+        """(ids, normalized matrix, metadata list) of the current snapshot"""
+        ids, _, matrix, _, metadata = self._snapshot
+        return list(ids), matrix, [dict(meta) for meta in metadata]
+
+    def get_metadata(self, vector_id: str):
+        """Metadata for one vector id, or None if it is not mirrored"""
+        _, row_of, _, _, metadata = self._snapshot
+        row = row_of.get(vector_id)
+        return dict(metadata[row]) if row is not None else None
+
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+def get_program_index(remote_index):
+    """
+    Return the index callers should use: the shared local mirror when USE_LOCAL_INDEX
+    is enabled (loaded on first call), otherwise remote_index unchanged
+    """
+    global _local_index
+    if not USE_LOCAL_INDEX:
+        return remote_index
+
+    with _local_index_lock:
+        if _local_index is None:
+            # Every successful load (including auto-refreshes) marks stored recommendation snapshots stale
+            _local_index = LocalProgramIndex(remote_index, on_reload=bump_catalog_version)
+            _local_index.refresh()
+            if LOCAL_INDEX_REFRESH_SECONDS > 0:
+                _local_index.start_auto_refresh(LOCAL_INDEX_REFRESH_SECONDS)
+        return _local_index
+
+def refresh_local_index():
+    """Reload the shared mirror if one is active; returns the number of vectors loaded (0 on failure)"""
+    if _local_index is None:
+        return 0
+    # The mirror's on_reload bumps the catalog version, only when the load succeeded
+    return _local_index.refresh()
@@ -0,0 +1,125 @@
+"""
+Deterministic local ranking of recommendation candidates.
+
+Every candidate gets five signals in [0, 1], computed as arrays over the whole candidate
+set, and a weighted sum of them as its score:
+  similarity     vector similarity to the profile query or to a registered program
+  collaborative  collaborative filtering score / the best score among the candidates
+  budget         1 within max_budget, falling linearly to 0 at twice the budget
+  month          1 if the program runs in preferred_month (is_program_available_in_month)
+  level          1 for the profile's skill level, 0.5 one level away, 0 two levels away
+A signal the profile gives no preference for is 1 for every candidate. Ranking needs no
+network calls, so a full top 5 is available even when the LLM is slow or down.
+"""
+import os
+import calendar
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SIGNALS = ("similarity", "collaborative", "budget", "month", "level")
+LOCAL_RANK_WEIGHTS = np.array([
+    float(os.getenv("LOCAL_RANK_WEIGHT_SIMILARITY", "0.45")),
+    float(os.getenv("LOCAL_RANK_WEIGHT_COLLABORATIVE", "0.2")),
+    float(os.getenv("LOCAL_RANK_WEIGHT_BUDGET", "0.15")),
+    float(os.getenv("LOCAL_RANK_WEIGHT_MONTH", "0.1")),
+    float(os.getenv("LOCAL_RANK_WEIGHT_LEVEL", "0.1"))
+])
+
+SKILL_LEVELS = {"beginner": 0, "intermediate": 1, "advanced": 2, "expert": 2}
+# The catalog has no level column, so a program's level is read from its title/description
+_BEGINNER_WORDS = ("introduction", "intro to", "basics", "fundamentals", "overview", "essentials", "getting started", "for business users")
+_ADVANCED_WORDS = ("advanced", "mastering", "mastery", "deep dive", "expert", "performance tuning", "architecture")
+
+
+def month_to_number(month_name):
+    """Convert month name to number"""
+    try:
+        return list(calendar.month_name).index(month_name.capitalize())
+    except ValueError:
+        try:
+            return list(calendar.month_abbr).index(month_name.capitalize())
+        except ValueError:
+            return None
+
+
+def is_program_available_in_month(start_date, end_date, target_month_num):
+    """Check if program runs during the target month"""
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d")
+        end = datetime.strptime(end_date, "%Y-%m-%d")
+
+        # Check if target month falls within the program duration
+        return start.month <= target_month_num <= end.month or \
+               (start.year < end.year and (start.month <= target_month_num or target_month_num <= end.month))
+    except:
+        return True
+
+
+def program_level(program: dict):
+    """0 beginner, 1 intermediate, 2 advanced: the level field if present, else title/description wording"""
+    level = SKILL_LEVELS.get(str(program.get('level') or '').strip().lower())
+    if level is not None:
+        return level
+    text = f"{program.get('title') or ''} {program.get('description') or ''}".lower()
+    if any(word in text for word in _ADVANCED_WORDS):
+        return 2
+    if any(word in text for word in _BEGINNER_WORDS):
+        return 0
+    return 1
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def score_candidates(profile: dict, candidates: list, collaborative_scores: dict = None, weights=LOCAL_RANK_WEIGHTS):
+    """(scores, signals): scores has one entry per candidate, signals is len(SIGNALS) x len(candidates)"""
+    collaborative_scores = collaborative_scores or {}
+    n = len(candidates)
+    signals = np.ones((len(SIGNALS), n))
+    if not n:
+        return np.zeros(0), signals
+
+    signals[0] = np.clip([c.get('similarity_score') or 0.0 for c in candidates], 0.0, 1.0)
+    # User-based scores are unbounded sums of similarity weights, so scale by the best one
+    # here rather than by a fixed constant that would saturate them all at 1
+    collaborative = np.clip([collaborative_scores.get(c.get('program_id')) or 0.0 for c in candidates], 0.0, None)
+    best = collaborative.max()
+    signals[1] = collaborative / best if best > 0 else 0.0
+
+    budget = _to_float(profile.get('max_budget'))
+    if budget > 0:
+        costs = np.array([_to_float(c.get('cost')) for c in candidates])
+        over = np.clip((costs - budget) / budget, 0.0, None)
+        # Unknown cost: neither rewarded nor excluded
+        signals[2] = np.where(np.isnan(costs), 0.5, np.clip(1.0 - over, 0.0, 1.0))
+
+    month = month_to_number(profile.get('preferred_month') or '')
+    if month:
+        signals[3] = [1.0 if is_program_available_in_month(c.get('start_date'), c.get('end_date'), month) else 0.0 for c in candidates]
+
+    level = SKILL_LEVELS.get(str(profile.get('skill_level') or '').strip().lower())
+    if level is not None:
+        levels = np.array([program_level(c) for c in candidates])
+        signals[4] = 1.0 - np.abs(levels - level) / 2
+
+    return weights @ signals, signals
+
+
+def rank_candidates(profile: dict, candidates: list, collaborative_scores: dict = None, limit: int = 5):
+    """
+    The limit best candidates as (candidate, score, {signal: value}), best first; ties keep
+    candidate order, so the same inputs always give the same ranking
+    """
+    scores, signals = score_candidates(profile, candidates, collaborative_scores)
+    order = np.argsort(-scores, kind="stable")[:limit]
+    return [
+        (candidates[i], round(float(scores[i]), 4), {name: round(float(signals[row, i]), 3) for row, name in enumerate(SIGNALS)})
+        for i in order
+    ]
@@ -0,0 +1,73 @@
+"""
+Logging setup shared by the app and the CLI scripts.
+
+Modules log through `logger = logging.getLogger(__name__)` with lazy %-style arguments, so
+a message below the configured level costs one level check: no string formatting, no I/O.
+Records that pass are put on a queue by a QueueHandler and written by a QueueListener
+thread, which keeps stream I/O off the request path.
+
+LOG_LEVEL sets the root level (run production at WARNING); LOG_LEVELS overrides single
+modules, e.g. "llm_recommendations=DEBUG,supabase_utils=DEBUG" to trace one subsystem.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "text" for humans, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener = None
+
+def configure_logging(level: str = None):
+    """Install the queued root handler once per process; later calls only change the level"""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel((level or LOG_LEVEL).upper())
+    for override in filter(None, LOG_LEVELS.split(",")):
+        name, _, module_level = override.partition("=")
+        logging.getLogger(name.strip()).setLevel(module_level.strip().upper())
+
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    # Flush queued records on shutdown
+    atexit.register(_listener.stop)
+
+
+def set_log_level(level: str, logger_name: str = None):
+    """Change a level at runtime, e.g. set_log_level("DEBUG", "pinecone_utils")"""
+    logging.getLogger(logger_name).setLevel(level.upper())
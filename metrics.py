@@ -0,0 +1,236 @@
+"""
+Per-stage latency instrumentation.
+
+`with timed("stage"):` (or @timed("stage")) records the block's duration in a process-wide
+histogram per stage and, inside a request timing scope, in a per-request breakdown that
+app.py returns as a Server-Timing header. instrument_index, instrument_chain and
+instrument_supabase wrap the vector index, LangChain chains and the Supabase client so
+every index.query/fetch, chain call and table(...).execute() is timed.
+prompt_tokens tracks prompt sizes per LLM chain.
+render_prometheus() renders every histogram in the Prometheus text exposition format.
+"""
+import os
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import ContextDecorator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Upper bounds in seconds; LLM calls take seconds, cache hits and local queries microseconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by a tuple of label values"""
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, seconds: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            bucket = bisect.bisect_left(self.buckets, seconds)
+            if bucket < len(self.buckets):
+                series[bucket] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        def label_text(labels, extra=()):
+            pairs = list(zip(self.label_names, labels)) + list(extra)
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+            return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{label_text(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{label_text(labels, [('le', '+Inf')])} {values[-1]}")
+            lines.append(f"{self.name}_sum{label_text(labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{label_text(labels)} {values[-1]}")
+        return "\n".join(lines)
+
+
+stage_latency = Histogram("stage_duration_seconds", "Latency of backend calls and pipeline stages", ("stage",))
+route_latency = Histogram("http_request_duration_seconds", "Latency of Flask routes", ("route", "method", "status"))
+# Estimated (characters / 4) prompt size of every LLM call, per chain
+prompt_tokens = Histogram("llm_prompt_tokens", "Estimated prompt tokens per LLM call", ("chain",),
+                          buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000))
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Per-request {stage: [total seconds, calls]}; shared by worker threads via bind_to_scope/run_in_worker"""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self):
+        """Server-Timing header value; stages overlap when they ran concurrently"""
+        with self._lock:
+            entries = [
+                f'{stage};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"'
+                for stage, (seconds, calls) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+            ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def begin_request_timing():
+    """Start collecting a per-request breakdown; returns a token for end_request_timing"""
+    return _request_timings.set(RequestTimings())
+
+
+def current_request_timings():
+    return _request_timings.get()
+
+
+def end_request_timing(token):
+    _request_timings.reset(token)
+
+
+def record(stage: str, seconds: float):
+    if not METRICS_ENABLED:
+        return
+    stage_latency.observe((stage,), seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+class timed(ContextDecorator):
+    """Time a block or a (sync) function as one observation of stage; failures are timed too"""
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._started = None
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share a start time
+        return timed(self.stage)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self._started)
+        return False
+
+
+class TimedIndex:
+    """Vector index proxy timing query and fetch as <stage>_query / <stage>_fetch"""
+    def __init__(self, index, stage: str = "vector"):
+        self._index = index
+        self._stage = stage
+
+    def query(self, *args, **kwargs):
+        with timed(f"{self._stage}_query"):
+            return self._index.query(*args, **kwargs)
+
+    def fetch(self, *args, **kwargs):
+        with timed(f"{self._stage}_fetch"):
+            return self._index.fetch(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+def instrument_index(index, stage: str = "vector"):
+    return TimedIndex(index, stage) if METRICS_ENABLED else index
+
+
+class TimedChain:
+    """LangChain runnable proxy timing invoke/ainvoke and whole batch calls as stage"""
+    def __init__(self, chain, stage: str):
+        self._chain = chain
+        self._stage = stage
+
+    def invoke(self, *args, **kwargs):
+        with timed(self._stage):
+            return self._chain.invoke(*args, **kwargs)
+
+    async def ainvoke(self, *args, **kwargs):
+        with timed(self._stage):
+            return await self._chain.ainvoke(*args, **kwargs)
+
+    def batch(self, *args, **kwargs):
+        with timed(f"{self._stage}_batch"):
+            return self._chain.batch(*args, **kwargs)
+
+    async def abatch(self, *args, **kwargs):
+        with timed(f"{self._stage}_batch"):
+            return await self._chain.abatch(*args, **kwargs)
+
+    def batch_as_completed(self, *args, **kwargs):
+        with timed(f"{self._stage}_batch"):
+            yield from self._chain.batch_as_completed(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._chain, name)
+
+
+def instrument_chain(chain, stage: str):
+    return TimedChain(chain, stage) if METRICS_ENABLED else chain
+
+
+class _TimedQuery:
+    """Supabase query builder proxy: builder methods chain through, execute() is timed"""
+    def __init__(self, builder, stage: str):
+        self._builder = builder
+        self._stage = stage
+
+    def execute(self, *args, **kwargs):
+        with timed(self._stage):
+            return self._builder.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def chained(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return _TimedQuery(result, self._stage) if hasattr(result, "execute") else result
+        return chained
+
+
+class TimedSupabase:
+    """Supabase client proxy timing every table(name)...execute() as supabase_<name>"""
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _TimedQuery(self._client.table(name), f"supabase_{name}")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_supabase(client):
+    return TimedSupabase(client) if METRICS_ENABLED else client
+
+
+def render_prometheus():
+    return "\n".join([stage_latency.render(), route_latency.render(), prompt_tokens.render()]) + "\n"
@@ -0,0 +1,124 @@
+import logging
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentLRUCache:
+    """
+    String-keyed cache: a size-bounded in-memory LRU with optional TTL (0 = never expire),
+    plus an optional SQLite tier at db_path that survives restarts, is written through on
+    put() and is consulted on memory misses. Values go to disk as serialize(value) and come
+    back as deserialize(stored); name only labels log messages.
+    """
+    def __init__(self, name: str, table: str, max_size: int, ttl_seconds: float = 0, db_path: str = "",
+                 serialize=json.dumps, deserialize=json.loads):
+        self.name = name
+        self.table = table
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._serialize = serialize
+        self._deserialize = deserialize
+        self._entries = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, created_at REAL)")
+                self._db.commit()
+            except Exception as e:
+                logger.warning("⚠️ %s disk cache disabled (%s): %s", name, db_path, e)
+                self._db = None
+
+    def _expired(self, created_at: float):
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _store_memory(self, key, created_at, value):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str):
+        """Cached value or None; counts a hit or a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                    if row and not self._expired(row[1]):
+                        value = self._deserialize(row[0])
+                        self._store_memory(key, row[1], value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                except Exception as e:
+                    logger.warning("⚠️ %s disk cache read failed: %s", self.name, e)
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value):
+        created_at = time.time()
+        with self._lock:
+            self._store_memory(key, created_at, value)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)",
+                        (key, self._serialize(value), created_at)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    logger.warning("⚠️ %s disk cache write failed: %s", self.name, e)
+
+    def get_or_compute(self, key: str, compute):
+        """Return the cached value, or call compute() and cache a non-None result"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        value = compute()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_enabled": self._db is not None,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
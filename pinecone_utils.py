@@ -1,38 +1,50 @@
 import os
-from nomic import embed
-from pinecone import Pinecone
-import pandas as pd
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from local_index import LocalMatch
+from embedding_cache import embedding_cache
+from similarity_graph import get_similarity_graph
+from metrics import timed
+from clients import program_index as index, nomic_embed as embed
 from dotenv import load_dotenv
 
 load_dotenv()
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_ENV = os.getenv("PINECONE_ENV") or "gcp-starter"
-INDEX_NAME = "programs"
+logger = logging.getLogger(__name__)
 
-# Fix: Use the loaded variable instead of os.environ
-pc = Pinecone(api_key=PINECONE_API_KEY, environment=PINECONE_ENV) 
-index = pc.Index(INDEX_NAME)
+EMBEDDING_MODEL = "nomic-embed-text-v1.5"
+
+# "batched" fetches all registered vectors at once and runs the similarity queries concurrently;
+# "serial" keeps the original one-fetch-one-query-per-program loop
+SIMILARITY_FANOUT_MODE = os.getenv("SIMILARITY_FANOUT_MODE", "batched")
+SIMILARITY_MAX_WORKERS = int(os.getenv("SIMILARITY_MAX_WORKERS", "8"))
+# Serve neighbours from the precomputed graph (similarity_graph.py) when it has been built
+USE_SIMILARITY_GRAPH = os.getenv("USE_SIMILARITY_GRAPH", "true").lower() in ("1", "true", "yes")
 
 def embed_text(text: str, input_type: str = "search_query"):
     """
     Embed text using Nomic's embedding model
     input_type can be "search_query" or "search_document"
+    Results are served from the shared embedding cache when possible
     """
-    output = embed.text(
-        texts=[f"{input_type}: {text}"],
-        model='nomic-embed-text-v1.5'
-    )
-    return output['embeddings'][0]
+    def _embed():
+        with timed("nomic_embed"):
+            output = embed.text(
+                texts=[f"{input_type}: {text}"],
+                model=EMBEDDING_MODEL
+            )
+        return output['embeddings'][0]
+    
+    return embedding_cache.get_or_compute(EMBEDDING_MODEL, input_type, text, _embed)
 
 def search_similar_programs(query: str, filters: dict = None, top_k: int = 10):  # Changed from 5 to 10
-    print(f"🔍 Search query: {query}")
-    print(f"🔧 Filters: {filters}")
-    print(f"📊 Top K: {top_k}")
+    logger.debug("🔍 Search query: %s", query)
+    logger.debug("🔧 Filters: %s", filters)
+    logger.debug("📊 Top K: %s", top_k)
     
     try:
         query_vec = embed_text(query, input_type="search_query")
-        print(f"✅ Query vector generated, length: {len(query_vec)}")
+        logger.debug("✅ Query vector generated, length: %s", len(query_vec))
         
         response = index.query(
             vector=query_vec, 
@@ -41,67 +53,165 @@ def search_similar_programs(query: str, filters: dict = None, top_k: int = 10):
             filter=filters or {}
         )
         
-        print(f"📋 Pinecone response: {len(response.matches)} matches")
+        logger.info("📋 Pinecone response: %s matches", len(response.matches))
         for i, match in enumerate(response.matches):
-            print(f"   {i+1}. Score: {match.score}, ID: {match.id}")
+            logger.debug("   %s. Score: %s, ID: %s", i+1, match.score, match.id)
         
         return response.matches
     
     except Exception as e:
-        print(f"❌ Error in search_similar_programs: {e}")
+        logger.error("❌ Error in search_similar_programs: %s", e)
+        return []
+
+def _similar_matches_for_vector(program_id, vector_record, top_k: int, exclude_ids: set = None):
+    """Query neighbours of one registered program's vector and tag them with the source program"""
+    program_vector = vector_record.values
+    
+    # Get the registered program's metadata for better context
+    registered_program_metadata = vector_record.metadata
+    registered_program_title = registered_program_metadata.get('title', f'Program {program_id}')
+    
+    # Find similar programs using this vector
+    similar_response = index.query(
+        vector=program_vector,
+        top_k=top_k + 5,
+        include_metadata=True
+    )
+    
+    logger.debug("📋 Found %s similar programs for %s", len(similar_response.matches), registered_program_title)
+    
+    matches = []
+    # Add similarity info and filter
+    for match in similar_response.matches:
+        match_program_id = match.metadata.get("program_id")
+        
+        # Skip if it's the same program or already registered
+        if (match_program_id == program_id or 
+            (exclude_ids and match_program_id in exclude_ids)):
+            continue
+        
+        # Add detailed reference to which program this is similar to
+        match.metadata['similar_to_program_id'] = program_id
+        match.metadata['similar_to_program_title'] = registered_program_title
+        match.metadata['similarity_reason'] = f"Similar to '{registered_program_title}'"
+        match.metadata['recommendation_explanation'] = f"You registered for '{registered_program_title}', so you might be interested in this similar program"
+        
+        matches.append(match)
+    
+    return matches
+
+def _fetch_similar_matches_serial(registered_program_ids: list, top_k: int, exclude_ids: set = None):
+    """One fetch + one query per registered program, in sequence"""
+    all_similar_matches = []
+    
+    # For each registered program, find similar ones
+    for program_id in registered_program_ids:
+        vector_id = f"program-{program_id}"
+        
+        # Get the vector for this program
+        fetch_response = index.fetch(ids=[vector_id])
+        
+        if vector_id in fetch_response.vectors:
+            all_similar_matches.extend(
+                _similar_matches_for_vector(program_id, fetch_response.vectors[vector_id], top_k, exclude_ids)
+            )
+    
+    return all_similar_matches
+
+def _fetch_similar_matches_batched(registered_program_ids: list, top_k: int, exclude_ids: set = None):
+    """One multi-id fetch, then the per-vector queries on a bounded worker pool"""
+    # De-duplicate while keeping registration order so the merge below stays deterministic
+    program_ids = list(dict.fromkeys(registered_program_ids))
+    vector_ids = [f"program-{program_id}" for program_id in program_ids]
+    
+    fetch_response = index.fetch(ids=vector_ids)
+    found = [
+        (program_id, fetch_response.vectors[vector_id])
+        for program_id, vector_id in zip(program_ids, vector_ids)
+        if vector_id in fetch_response.vectors
+    ]
+    
+    if not found:
         return []
+    
+    workers = max(1, min(SIMILARITY_MAX_WORKERS, len(found)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # executor.map yields results in submission order, not completion order
+        results = executor.map(
+            lambda item: _similar_matches_for_vector(item[0], item[1], top_k, exclude_ids),
+            found
+        )
+        all_similar_matches = []
+        for matches in results:
+            all_similar_matches.extend(matches)
+    
+    return all_similar_matches
+
+def _similar_matches_from_graph(graph: dict, program_id, top_k: int, exclude_ids: set = None):
+    """Neighbours of one registered program from the precomputed graph, tagged like the live path"""
+    vector_id = f"program-{program_id}"
+    registered_program_title = graph["metadata"][vector_id].get('title', f'Program {program_id}')
+    
+    matches = []
+    for neighbour_id, score in graph["neighbours"][vector_id][:top_k + 5]:
+        metadata = dict(graph["metadata"].get(neighbour_id, {}))
+        match_program_id = metadata.get("program_id")
+        
+        # Skip if it's the same program or already registered
+        if (match_program_id == program_id or 
+            (exclude_ids and match_program_id in exclude_ids)):
+            continue
+        
+        metadata['similar_to_program_id'] = program_id
+        metadata['similar_to_program_title'] = registered_program_title
+        metadata['similarity_reason'] = f"Similar to '{registered_program_title}'"
+        metadata['recommendation_explanation'] = f"You registered for '{registered_program_title}', so you might be interested in this similar program"
+        
+        matches.append(LocalMatch(id=neighbour_id, score=score, values=[], metadata=metadata))
+    
+    return matches
 
-def find_similar_programs_by_registration(registered_program_ids: list, top_k: int = 10, exclude_ids: set = None):
+def _fetch_similar_matches_graph(graph: dict, registered_program_ids: list, top_k: int, exclude_ids: set = None, mode: str = None):
+    """Dictionary lookups in the similarity graph; programs not in it yet go through the live path"""
+    all_similar_matches = []
+    missing = []
+    for program_id in dict.fromkeys(registered_program_ids):
+        if f"program-{program_id}" in graph["neighbours"]:
+            all_similar_matches.extend(_similar_matches_from_graph(graph, program_id, top_k, exclude_ids))
+        else:
+            missing.append(program_id)
+    
+    if missing:
+        logger.warning("⚠️ %s registered programs not in similarity graph, querying live", len(missing))
+        if mode == "serial":
+            all_similar_matches.extend(_fetch_similar_matches_serial(missing, top_k, exclude_ids))
+        else:
+            all_similar_matches.extend(_fetch_similar_matches_batched(missing, top_k, exclude_ids))
+    
+    return all_similar_matches
+
+def find_similar_programs_by_registration(registered_program_ids: list, top_k: int = 10, exclude_ids: set = None, mode: str = None):
     """
     Find programs similar to the ones user has already registered for
+    mode can be "batched" (single fetch, concurrent queries) or "serial";
+    defaults to SIMILARITY_FANOUT_MODE. When the similarity graph has been built
+    it is used instead and mode only applies to programs missing from it
     """
     if not registered_program_ids:
         return []
     
-    print(f"🔍 Finding programs similar to registered programs: {registered_program_ids}")
+    mode = mode or SIMILARITY_FANOUT_MODE
+    logger.info("🔍 Finding programs similar to registered programs: %s (mode: %s)", registered_program_ids, mode)
     
     try:
-        all_similar_matches = []
+        graph = get_similarity_graph() if USE_SIMILARITY_GRAPH else None
         
-        # For each registered program, find similar ones
-        for program_id in registered_program_ids:
-            vector_id = f"program-{program_id}"
-            
-            # Get the vector for this program
-            fetch_response = index.fetch(ids=[vector_id])
-            
-            if vector_id in fetch_response.vectors:
-                program_vector = fetch_response.vectors[vector_id].values
-                
-                # Get the registered program's metadata for better context
-                registered_program_metadata = fetch_response.vectors[vector_id].metadata
-                registered_program_title = registered_program_metadata.get('title', f'Program {program_id}')
-                
-                # Find similar programs using this vector
-                similar_response = index.query(
-                    vector=program_vector,
-                    top_k=top_k + 5,
-                    include_metadata=True
-                )
-                
-                print(f"📋 Found {len(similar_response.matches)} similar programs for {registered_program_title}")
-                
-                # Add similarity info and filter
-                for match in similar_response.matches:
-                    match_program_id = match.metadata.get("program_id")
-                    
-                    # Skip if it's the same program or already registered
-                    if (match_program_id == program_id or 
-                        (exclude_ids and match_program_id in exclude_ids)):
-                        continue
-                    
-                    # Add detailed reference to which program this is similar to
-                    match.metadata['similar_to_program_id'] = program_id
-                    match.metadata['similar_to_program_title'] = registered_program_title
-                    match.metadata['similarity_reason'] = f"Similar to '{registered_program_title}'"
-                    match.metadata['recommendation_explanation'] = f"You registered for '{registered_program_title}', so you might be interested in this similar program"
-                    
-                    all_similar_matches.append(match)
+        if graph:
+            all_similar_matches = _fetch_similar_matches_graph(graph, registered_program_ids, top_k, exclude_ids, mode)
+        elif mode == "serial":
+            all_similar_matches = _fetch_similar_matches_serial(registered_program_ids, top_k, exclude_ids)
+        else:
+            all_similar_matches = _fetch_similar_matches_batched(registered_program_ids, top_k, exclude_ids)
         
         # Remove duplicates and sort by similarity score
         unique_matches = {}
@@ -113,25 +223,25 @@ def find_similar_programs_by_registration(registered_program_ids: list, top_k: i
         # Sort by score and return top results
         sorted_matches = sorted(unique_matches.values(), key=lambda x: x.score, reverse=True)
         
-        print(f"✅ Returning {len(sorted_matches[:top_k])} unique similar programs")
+        logger.info("✅ Returning %s unique similar programs", len(sorted_matches[:top_k]))
         return sorted_matches[:top_k]
         
     except Exception as e:
-        print(f"❌ Error finding similar programs by registration: {e}")
+        logger.error("❌ Error finding similar programs by registration: %s", e)
         return []
 
 def get_program_details(program_id: str):
     """Get full program details from Pinecone by program ID"""
     try:
         vector_id = f"program-{program_id}"
-        print(f"🔍 Fetching details for program: {vector_id}")
+        logger.debug("🔍 Fetching details for program: %s", vector_id)
         
         # Fetch from Pinecone
         fetch_response = index.fetch(ids=[vector_id])
         
         if vector_id in fetch_response.vectors:
             metadata = fetch_response.vectors[vector_id].metadata
-            print(f"✅ Found program details: {metadata.get('title', 'Unknown')}")
+            logger.debug("✅ Found program details: %s", metadata.get('title', 'Unknown'))
             return {
                 "program_id": metadata.get("program_id"),
                 "title": metadata.get("title"),
@@ -142,9 +252,9 @@ def get_program_details(program_id: str):
                 "end_date": metadata.get("end_date")
             }
         else:
-            print(f"❌ Program {vector_id} not found in Pinecone")
+            logger.warning("⚠️ Program %s not found in Pinecone", vector_id)
             return None
             
     except Exception as e:
-        print(f"❌ Error fetching program details: {e}")
+        logger.error("❌ Error fetching program details: %s", e)
         return None
@@ -0,0 +1,147 @@
+import os
+import logging
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Full reload from user_profiles at most this often, to pick up writes from other processes
+PROFILE_INDEX_REFRESH_SECONDS = float(os.getenv("PROFILE_INDEX_REFRESH_SECONDS", "300"))
+PROFILE_FIELDS = ("id", "full_name", "role", "skill_level", "interests")
+
+
+class ProfileIndex:
+    """
+    Feature index over user profiles for similar-user lookups.
+    Roles and skill levels are integer codes, interests a sparse binary word matrix, so
+    scoring every profile (role +3, skill level +2, +1 per shared interest word) is one
+    vectorized pass. Loaded once from load_profiles(); upsert() applies profile writes.
+    """
+    def __init__(self, load_profiles):
+        self._load_profiles = load_profiles
+        self._lock = threading.Lock()
+        self._profiles = {}  # user_id -> profile dict (PROFILE_FIELDS only)
+        self._loaded_at = 0.0
+        self._has_data = False  # set by the first successful load; refresh() keeps it
+        self._dirty = True
+        # Derived state, rebuilt lazily when _dirty
+        self._user_ids = []
+        self._row_of = {}
+        self._role_codes = np.zeros(0, dtype=np.int32)
+        self._skill_codes = np.zeros(0, dtype=np.int32)
+        self._interests = None
+
+    def _ensure_loaded(self):
+        """
+        (Re)load when due. A failed read is never cached: with nothing loaded yet the error
+        propagates, on a periodic reload the previous profiles keep being served; either way
+        _loaded_at is not stamped, so the next call retries.
+        """
+        if self._loaded_at and time.time() - self._loaded_at < PROFILE_INDEX_REFRESH_SECONDS:
+            return
+        try:
+            profiles = self._load_profiles() or []
+        except Exception as e:
+            if not self._has_data:
+                raise
+            logger.error("❌ Profile index reload failed, keeping previous profiles: %s", e)
+            return
+        self._profiles = {profile['id']: {field: profile.get(field) for field in PROFILE_FIELDS} for profile in profiles}
+        self._loaded_at = time.time()
+        self._has_data = True
+        self._dirty = True
+        logger.info("📥 Profile index loaded %s profiles", len(self._profiles))
+
+    def _ensure_index(self):
+        self._ensure_loaded()
+        if not self._dirty:
+            return
+        self._user_ids = list(self._profiles)
+        self._row_of = {user_id: row for row, user_id in enumerate(self._user_ids)}
+
+        def encode(field):
+            codes = {}
+            return np.array(
+                [codes.setdefault((self._profiles[user_id].get(field) or '').lower(), len(codes)) for user_id in self._user_ids],
+                dtype=np.int32
+            )
+
+        self._role_codes = encode('role')
+        self._skill_codes = encode('skill_level')
+
+        # Binary bag of lower-cased, whitespace-separated words: row dot row = shared word count
+        from sklearn.feature_extraction.text import CountVectorizer
+        vectorizer = CountVectorizer(binary=True, lowercase=True, token_pattern=r"\S+", dtype=np.int32)
+        try:
+            self._interests = vectorizer.fit_transform(
+                [self._profiles[user_id].get('interests') or '' for user_id in self._user_ids]
+            ).tocsr()
+        except ValueError:
+            # No interest words at all
+            self._interests = None
+        self._dirty = False
+
+    def refresh(self):
+        """Force a full reload on next use"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def upsert(self, user_id: str, fields: dict):
+        """Apply a profile insert/update without re-reading the table"""
+        with self._lock:
+            if not self._has_data:
+                return  # Nothing loaded yet; the first read will include this write
+            profile = self._profiles.setdefault(user_id, {field: None for field in PROFILE_FIELDS})
+            profile['id'] = user_id
+            for field in PROFILE_FIELDS:
+                if field in fields:
+                    profile[field] = fields[field]
+            self._dirty = True
+
+    def get_profile(self, user_id: str):
+        with self._lock:
+            self._ensure_loaded()
+            profile = self._profiles.get(user_id)
+            return dict(profile) if profile else None
+
+    def find_similar(self, user_id: str, limit: int = 10):
+        """
+        [{'user_id', 'similarity_score', 'profile'}] for the limit most similar users with a
+        positive score, best first; ties keep table order. Empty if user_id is not indexed.
+        """
+        with self._lock:
+            self._ensure_index()
+            row = self._row_of.get(user_id)
+            if row is None or limit <= 0:
+                return []
+
+            scores = 3 * (self._role_codes == self._role_codes[row]).astype(np.int64)
+            scores += 2 * (self._skill_codes == self._skill_codes[row])
+            if self._interests is not None:
+                scores += np.asarray((self._interests @ self._interests[row].T).todense()).ravel()
+            scores[row] = 0
+
+            candidates = np.flatnonzero(scores > 0)
+            if not len(candidates):
+                return []
+
+            # Unique sort key: score first, then earlier rows, so the result is deterministic
+            n = len(self._user_ids)
+            keys = scores[candidates].astype(np.float64) * (n + 1) + (n - candidates)
+            if len(candidates) > limit:
+                top = np.argpartition(-keys, limit - 1)[:limit]
+                candidates, keys = candidates[top], keys[top]
+            candidates = candidates[np.argsort(-keys)]
+
+            return [
+                {
+                    'user_id': self._user_ids[r],
+                    'similarity_score': int(scores[r]),
+                    'profile': dict(self._profiles[self._user_ids[r]])
+                }
+                for r in candidates
+            ]
@@ -0,0 +1,235 @@
+"""
+Materialized per-user recommendation snapshots.
+
+Each snapshot stores the last get_hybrid_recommendations result for a user together with
+the version vector of its inputs (profile, registrations, catalog). Reads are served from
+the snapshot immediately; when the catalog has moved on, the snapshot was invalidated, or it
+is older than RECOMMENDATION_SNAPSHOT_MAX_AGE_SECONDS, the stale result is still served and a
+refresh is queued on a background worker pool (stale-while-revalidate). A snapshot computed
+from a different profile or different registrations is never served: the read is a miss,
+so e.g. a just-registered program is not listed. On a miss the caller first waits for a
+refresh already computing the user's current generation (the one a write just queued),
+and only computes synchronously when there is none.
+"""
+import os
+import logging
+import json
+import time
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from llm_scheduler import llm_priority, BACKGROUND
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+USE_RECOMMENDATION_SNAPSHOTS = os.getenv("USE_RECOMMENDATION_SNAPSHOTS", "true").lower() in ("1", "true", "yes")
+RECOMMENDATION_SNAPSHOT_SIZE = int(os.getenv("RECOMMENDATION_SNAPSHOT_SIZE", "10000"))
+RECOMMENDATION_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv("RECOMMENDATION_SNAPSHOT_MAX_AGE_SECONDS", "3600"))
+RECOMMENDATION_REFRESH_WORKERS = int(os.getenv("RECOMMENDATION_REFRESH_WORKERS", "2"))
+# How long a read that missed waits for an in-flight refresh before computing itself
+RECOMMENDATION_REFRESH_WAIT_SECONDS = float(os.getenv("RECOMMENDATION_REFRESH_WAIT_SECONDS", "15"))
+
+_catalog_version = 0
+_catalog_version_lock = threading.Lock()
+
+def bump_catalog_version():
+    """Call when the program catalog (vectors, metadata, similarity graph) changes"""
+    global _catalog_version
+    with _catalog_version_lock:
+        _catalog_version += 1
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def input_version(profile: dict, user_registrations: list):
+    """Version vector of everything a user's recommendations are computed from"""
+    return (
+        _digest(profile),
+        _digest(sorted(str(reg['program_id']) for reg in user_registrations)),
+        _catalog_version
+    )
+
+
+class RecommendationStore:
+    """
+    Per-user snapshots of (version, result, computed_at) in an LRU of bounded size.
+    refresh_fn(user_id) must recompute from fresh reads and return (version, result).
+    """
+    def __init__(self, max_size: int = RECOMMENDATION_SNAPSHOT_SIZE, max_age_seconds: float = RECOMMENDATION_SNAPSHOT_MAX_AGE_SECONDS, workers: int = RECOMMENDATION_REFRESH_WORKERS):
+        self.max_size = max_size
+        self.max_age_seconds = max_age_seconds
+        self._snapshots = OrderedDict()  # user_id -> (version, result, computed_at)
+        self._invalidated = set()
+        # user_id -> generation, a fresh value from _generation_counter on every invalidate(), so
+        # a result computed before one can't clear it. An LRU of max_size users like the
+        # snapshots; users that fell out read _generation_floor, which is at least any
+        # generation they had, so a put() that predates their eviction still counts as stale.
+        self._generations = OrderedDict()
+        self._generation_counter = itertools.count(1)
+        self._generation_floor = 0
+        self._refreshing = {}  # user_id -> (generation, Future) of the refresh in flight
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommendation-refresh")
+        self._refresh_fn = None
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def set_refresh_function(self, refresh_fn):
+        self._refresh_fn = refresh_fn
+
+    @staticmethod
+    def _user_inputs_changed(snapshot, version):
+        """The profile or registrations differ; only the catalog part of the version may lag"""
+        return version is not None and snapshot[0][:2] != version[:2]
+
+    def _is_stale(self, user_id: str, snapshot, version):
+        return (
+            user_id in self._invalidated or
+            (version is not None and snapshot[0] != version) or
+            time.time() - snapshot[2] > self.max_age_seconds
+        )
+
+    def get(self, user_id: str, version=None):
+        """
+        Snapshot result for user_id, or None if there is none or it was computed from other
+        profile/registration inputs than version. Any other stale snapshot is still returned,
+        and a background refresh is queued.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(user_id)
+            if snapshot is None or self._user_inputs_changed(snapshot, version):
+                self.misses += 1
+                return None
+            self._snapshots.move_to_end(user_id)
+            stale = self._is_stale(user_id, snapshot, version)
+            if stale:
+                self.stale_hits += 1
+            else:
+                self.fresh_hits += 1
+
+        if stale:
+            logger.info("♻️ Serving stale recommendations for %s, refreshing in background", user_id)
+            self.schedule_refresh(user_id)
+        return snapshot[1]
+
+    def _generation(self, user_id: str):
+        """Under _lock: user_id's generation, remembered (most recently used) from now on"""
+        generation = self._generations.setdefault(user_id, self._generation_floor)
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_size:
+            self._forget_generation(next(iter(self._generations)))
+        return generation
+
+    def _forget_generation(self, user_id: str):
+        """Under _lock"""
+        generation = self._generations.pop(user_id, None)
+        if generation is not None:
+            self._generation_floor = max(self._generation_floor, generation)
+
+    def generation(self, user_id: str):
+        """Read before the inputs a result is computed from, and pass it to put()"""
+        with self._lock:
+            return self._generation(user_id)
+
+    def pending_refresh(self, user_id: str, generation: int):
+        """
+        Future of a background refresh started at generation (so from inputs at least as
+        new as the caller's), or None. It resolves once the refresh has stored its result.
+        """
+        with self._lock:
+            in_flight = self._refreshing.get(user_id)
+            return in_flight[1] if in_flight is not None and in_flight[0] == generation else None
+
+    def put(self, user_id: str, version, result, generation: int = None):
+        """
+        Store a result. If the user was invalidated after generation was read, the snapshot
+        stays invalidated (it may predate the change); returns whether it is current.
+        """
+        with self._lock:
+            self._snapshots[user_id] = (version, result, time.time())
+            self._snapshots.move_to_end(user_id)
+            current = generation is None or generation == self._generation(user_id)
+            if current:
+                self._invalidated.discard(user_id)
+            else:
+                self._invalidated.add(user_id)
+            while len(self._snapshots) > self.max_size:
+                evicted, _ = self._snapshots.popitem(last=False)
+                self._invalidated.discard(evicted)
+        return current
+
+    def invalidate(self, user_id: str, refresh: bool = True):
+        """Mark a user's snapshot stale; by default also recompute it in the background"""
+        with self._lock:
+            self._generation(user_id)
+            self._generations[user_id] = next(self._generation_counter)
+            if user_id not in self._snapshots:
+                return
+            self._invalidated.add(user_id)
+        if refresh:
+            self.schedule_refresh(user_id)
+
+    def drop(self, user_id: str):
+        """Remove a user's snapshot entirely; the next read computes synchronously"""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+            self._invalidated.discard(user_id)
+            self._forget_generation(user_id)
+
+    def schedule_refresh(self, user_id: str):
+        """Queue a background recompute, at most one in flight per user"""
+        if self._refresh_fn is None:
+            return
+        with self._lock:
+            if user_id in self._refreshing:
+                return
+            generation = self._generation(user_id)
+            done = Future()
+            # Running from the start, so a reader that gives up waiting can't cancel it
+            done.set_running_or_notify_cancel()
+            self._refreshing[user_id] = (generation, done)
+        self._executor.submit(self._refresh, user_id, generation)
+
+    def _refresh(self, user_id: str, generation: int):
+        current = True
+        try:
+            # Refreshes yield the LLM to interactive requests
+            with llm_priority(BACKGROUND):
+                version, result = self._refresh_fn(user_id)
+            if result is not None:
+                current = self.put(user_id, version, result, generation)
+                self.refreshes += 1
+                logger.info("✅ Refreshed recommendation snapshot for %s", user_id)
+        except Exception as e:
+            logger.error("❌ Background recommendation refresh failed for %s: %s", user_id, e)
+        finally:
+            with self._lock:
+                _, done = self._refreshing.pop(user_id)
+            done.set_result(current)
+        if not current:
+            # Invalidated mid-refresh; its own refresh was skipped because this one was in flight
+            self.schedule_refresh(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "snapshots": len(self._snapshots),
+                "invalidated": len(self._invalidated),
+                "refreshing": len(self._refreshing),
+                "fresh_hits": self.fresh_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes
+            }
+
+
+recommendation_store = RecommendationStore()
@@ -0,0 +1,177 @@
+"""
+Offline program-to-program similarity graph.
+
+Run `python similarity_graph.py` after the catalog is (re)indexed. Only programs whose
+vector or metadata changed since the last build have their neighbour lists recomputed;
+pass --full to rebuild everything. find_similar_programs_by_registration reads the
+stored graph at request time instead of querying the vector store.
+"""
+import os
+import sys
+import logging
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+from recommendation_store import bump_catalog_version
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_GRAPH_PATH = os.getenv("SIMILARITY_GRAPH_PATH", "similarity_graph.json")
+SIMILARITY_GRAPH_TOP_N = int(os.getenv("SIMILARITY_GRAPH_TOP_N", "20"))
+
+
+def _fingerprint(vector, metadata: dict):
+    """Hash of a program's vector and metadata; a change means its neighbours must be recomputed"""
+    digest = hashlib.sha256()
+    digest.update(np.asarray(vector, dtype=np.float32).tobytes())
+    digest.update(json.dumps(metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _top_neighbours(scores, ids, self_row: int, top_n: int):
+    """[[vector_id, score], ...] for the top_n highest scores, excluding the program itself"""
+    scores = scores.copy()
+    scores[self_row] = -np.inf
+    k = min(top_n, len(ids) - 1)
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [[ids[row], round(float(scores[row]), 6)] for row in top]
+
+
+def build_similarity_graph(ids: list, matrix, metadata: list, previous: dict = None, top_n: int = SIMILARITY_GRAPH_TOP_N):
+    """
+    Compute the top-N neighbour list of every program from L2-normalized vectors.
+    With a previous graph of the same top_n, unchanged programs keep their lists unless one
+    of their neighbours changed or was removed; changed programs are merged into them otherwise.
+    """
+    fingerprints = {vector_id: _fingerprint(matrix[row], metadata[row]) for row, vector_id in enumerate(ids)}
+    row_of = {vector_id: row for row, vector_id in enumerate(ids)}
+
+    if previous and previous.get("top_n") == top_n:
+        old_fingerprints = previous.get("fingerprints", {})
+        old_neighbours = previous.get("neighbours", {})
+    else:
+        old_fingerprints, old_neighbours = {}, {}
+
+    changed = {vector_id for vector_id in ids if old_fingerprints.get(vector_id) != fingerprints[vector_id]}
+    removed = set(old_fingerprints) - set(fingerprints)
+    stale = changed | removed
+
+    neighbours = {}
+    recomputed = 0
+    changed_rows = np.array([row_of[vector_id] for vector_id in changed], dtype=int)
+
+    for vector_id in ids:
+        row = row_of[vector_id]
+        previous_list = old_neighbours.get(vector_id)
+
+        if vector_id in changed or previous_list is None or any(n_id in stale for n_id, _ in previous_list):
+            neighbours[vector_id] = _top_neighbours(matrix @ matrix[row], ids, row, top_n)
+            recomputed += 1
+        elif len(changed_rows):
+            # Only newly changed programs can enter an otherwise unchanged neighbour list
+            candidates = list(previous_list)
+            changed_scores = matrix[changed_rows] @ matrix[row]
+            for changed_row, score in zip(changed_rows, changed_scores):
+                candidates.append([ids[changed_row], round(float(score), 6)])
+            candidates.sort(key=lambda item: -item[1])
+            neighbours[vector_id] = candidates[:top_n]
+        else:
+            neighbours[vector_id] = previous_list
+
+    logger.info("🕸️ Similarity graph: %s programs, %s changed, %s removed, %s lists recomputed", len(ids), len(changed), len(removed), recomputed)
+
+    return {
+        "top_n": top_n,
+        "built_at": time.time(),
+        "fingerprints": fingerprints,
+        "metadata": {vector_id: metadata[row_of[vector_id]] for vector_id in ids},
+        "neighbours": neighbours
+    }
+
+
+def load_graph(path: str = SIMILARITY_GRAPH_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error("❌ Error loading similarity graph from %s: %s", path, e)
+        return None
+
+
+def save_graph(graph: dict, path: str = SIMILARITY_GRAPH_PATH):
+    """Write atomically so a request never reads a half-written file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(graph, f)
+    os.replace(tmp_path, path)
+
+
+def rebuild(remote_index, path: str = SIMILARITY_GRAPH_PATH, top_n: int = SIMILARITY_GRAPH_TOP_N, full: bool = False):
+    """
+    Load every program vector from the index, update the stored graph and return it.
+    Raises RuntimeError, leaving the stored graph untouched, if no vectors could be loaded.
+    """
+    from local_index import LocalProgramIndex
+
+    mirror = LocalProgramIndex(remote_index)
+    # refresh() logs and returns 0 when the scan fails; an empty graph must not replace a good one
+    if not mirror.refresh():
+        raise RuntimeError("no program vectors loaded from the index, keeping the existing similarity graph")
+    ids, matrix, metadata = mirror.export()
+
+    previous = None if full else load_graph(path)
+    graph = build_similarity_graph(ids, matrix, metadata, previous=previous, top_n=top_n)
+    save_graph(graph, path)
+    logger.info("✅ Saved similarity graph to %s", path)
+    return graph
+
+
+_cached_graph = None
+_cached_mtime = None
+_cache_lock = threading.Lock()
+
+def get_similarity_graph(path: str = SIMILARITY_GRAPH_PATH):
+    """Stored graph for request-time lookups, reloaded when the file changes; None if not built"""
+    global _cached_graph, _cached_mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _cache_lock:
+        if _cached_graph is None or mtime != _cached_mtime:
+            graph = load_graph(path)
+            if graph is not None:
+                if _cached_graph is not None:
+                    bump_catalog_version()
+                _cached_graph, _cached_mtime = graph, mtime
+        return _cached_graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the program-to-program similarity graph")
+    parser.add_argument("--top-n", type=int, default=SIMILARITY_GRAPH_TOP_N)
+    parser.add_argument("--path", default=SIMILARITY_GRAPH_PATH)
+    parser.add_argument("--full", action="store_true", help="ignore the previous graph and recompute every list")
+    args = parser.parse_args()
+
+    from logging_utils import configure_logging
+    configure_logging()
+
+    from clients import remote_index
+    try:
+        rebuild(remote_index.get(), path=args.path, top_n=args.top_n, full=args.full)
+    except RuntimeError as e:
+        logger.error("❌ Similarity graph not rebuilt: %s", e)
+        sys.exit(1)
@@ -0,0 +1,153 @@
+"""
+Fast start.
+
+Importing app loads only Flask and the app's own modules; LangChain, the Pinecone, Supabase
+and Nomic SDKs, scikit-learn and SciPy are imported when first used. STARTUP_MODE picks
+when that happens:
+  eager   load everything while app is imported (slow boot, no first-request cost)
+  lazy    load each subsystem on first use
+  warmup  lazy, plus a background thread that loads everything WARMUP_DELAY_SECONDS
+          after import, once the server is accepting requests (default)
+
+`python startup.py` reports what `import app` costs per subsystem (an -X importtime
+run grouped by package); pass --mode eager to compare with loading everything up front.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+import subprocess
+from importlib import import_module
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warmup")
+WARMUP_DELAY_SECONDS = float(os.getenv("WARMUP_DELAY_SECONDS", "1"))
+
+# Top-level packages per subsystem for the import-time report; the app's own modules are "app"
+SUBSYSTEM_PACKAGES = {
+    "langchain": ("langchain", "langchain_core", "langchain_groq", "langchain_text_splitters", "langsmith",
+                  "groq", "pydantic", "pydantic_core", "tenacity", "jsonpatch", "jsonpointer", "yaml", "orjson"),
+    "pinecone": ("pinecone", "pinecone_plugins", "urllib3"),
+    "supabase": ("supabase", "postgrest", "gotrue", "supabase_auth", "storage3", "realtime", "supafunc",
+                 "supabase_functions", "httpx", "httpcore", "h2", "hpack", "websockets", "deprecation"),
+    "nomic": ("nomic",),
+    "scikit-learn": ("sklearn", "joblib", "threadpoolctl"),
+    "numpy/scipy": ("numpy", "scipy"),
+    "pandas": ("pandas", "pytz", "dateutil"),
+    "flask": ("flask", "werkzeug", "jinja2", "markupsafe", "itsdangerous", "click", "blinker", "asgiref"),
+    "jwt": ("jwt", "cryptography"),
+}
+# Imported by the warm-up so the first collaborative/similar-user request doesn't pay for them
+WARMUP_MODULES = ("scipy.sparse", "sklearn.feature_extraction.text")
+
+_load_times = {}
+_load_times_lock = threading.Lock()
+
+
+def record_load(subsystem: str, seconds: float):
+    """Called by lazy loaders; the times show up in load_times() and the warm-up log"""
+    with _load_times_lock:
+        _load_times[subsystem] = seconds
+
+
+def load_times():
+    """{subsystem: seconds} for everything loaded lazily so far"""
+    with _load_times_lock:
+        return dict(_load_times)
+
+
+def _load(name: str, loader):
+    started = time.perf_counter()
+    try:
+        loader()
+    except Exception as e:
+        logger.error("❌ Error loading %s: %s", name, e)
+        return
+    # Lazy clients record their own time; plain module imports are recorded here
+    if name not in _load_times:
+        record_load(name, time.perf_counter() - started)
+
+
+def start_warmup(loaders: dict):
+    """
+    Load {name: callable} now (eager), in a delayed background thread (warmup) or not at
+    all (lazy). Loaders must be idempotent: a request may trigger the same load first.
+    """
+    loaders = dict(loaders)
+    for module_name in WARMUP_MODULES:
+        loaders.setdefault(module_name, lambda module_name=module_name: import_module(module_name))
+
+    def run():
+        started = time.perf_counter()
+        for name, loader in loaders.items():
+            _load(name, loader)
+        times = load_times()
+        logger.info("🔥 Loaded %s subsystems in %.2fs: %s", len(loaders), time.perf_counter() - started,
+                    ", ".join(f"{name} {times[name]:.2f}s" for name in loaders if name in times))
+
+    if STARTUP_MODE == "eager":
+        run()
+    elif STARTUP_MODE == "warmup":
+        def delayed():
+            time.sleep(WARMUP_DELAY_SECONDS)
+            run()
+        threading.Thread(target=delayed, name="startup-warmup", daemon=True).start()
+
+
+def _subsystem_of(package: str, app_modules: set):
+    if package in app_modules:
+        return "app"
+    for subsystem, packages in SUBSYSTEM_PACKAGES.items():
+        if package in packages:
+            return subsystem
+    return "stdlib/other"
+
+
+def import_report(mode: str = None, target: str = "app"):
+    """
+    Import target in a fresh interpreter under -X importtime and return
+    (total seconds, {subsystem: seconds}) summed from each module's self time
+    """
+    env = dict(os.environ)
+    if mode:
+        env["STARTUP_MODE"] = mode
+    code = f"import sys, time; started = time.perf_counter(); import {target}; print('total', time.perf_counter() - started, file=sys.stderr)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=here, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    app_modules = {name[:-3] for name in os.listdir(here) if name.endswith(".py")}
+    per_subsystem = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if line.startswith("total "):
+            total = float(line.split()[1])
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue  # Header line
+        subsystem = _subsystem_of(module.split(".")[0], app_modules)
+        per_subsystem[subsystem] = per_subsystem.get(subsystem, 0.0) + int(self_us) / 1e6
+    return total, per_subsystem
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-subsystem import-time report for the app")
+    parser.add_argument("--mode", choices=("eager", "lazy", "warmup"), default=None,
+                        help="STARTUP_MODE for the measured import (default: the configured one)")
+    parser.add_argument("--target", default="app", help="module to import")
+    args = parser.parse_args()
+
+    total, per_subsystem = import_report(args.mode, args.target)
+    print(f"import {args.target} ({args.mode or STARTUP_MODE}): {total * 1000:.0f} ms")
+    for subsystem, seconds in sorted(per_subsystem.items(), key=lambda item: -item[1]):
+        print(f"  {subsystem:<14} {seconds * 1000:8.1f} ms")
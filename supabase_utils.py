@@ -1,28 +1,51 @@
 import os
-from supabase import create_client, Client
+import logging
 from dotenv import load_dotenv
-from collections import defaultdict, Counter
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from collaborative_engine import CollaborativeEngine
+from profile_index import ProfileIndex, PROFILE_FIELDS
+from data_loader import get_loader, register_loader
+from recommendation_store import recommendation_store
+from metrics import timed
+from clients import supabase_client
 
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
+logger = logging.getLogger(__name__)
 
-supabase_client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def _clear_cached(name: str, user_id: str):
+    """Forget a memoized read after a write in the same request"""
+    loader = get_loader(name)
+    if loader is not None:
+        loader.clear(user_id)
+
+COLLABORATIVE_MODE = os.getenv("COLLABORATIVE_MODE", "user")  # "user" or "item"
+COLLABORATIVE_ITEM_MIN_SIMILARITY = float(os.getenv("COLLABORATIVE_ITEM_MIN_SIMILARITY", "0.1"))
+
+def _fetch_user_profiles(user_ids: list):
+    """Read several profiles in one query: {user_id: profile}; errors propagate so they aren't memoized"""
+    logger.debug("Fetching profiles for %s users", len(user_ids))
+    response = supabase_client.table("user_profiles").select("*").in_("id", user_ids).execute()
+    return {profile['id']: profile for profile in response.data}
 
 def get_user_profile(user_id: str):
-    """Get user profile from Supabase"""
+    """Get user profile from Supabase (at most once per request scope)"""
+    loader = get_loader("profile")
+    if loader is not None:
+        try:
+            return loader.load(user_id)
+        except Exception as e:
+            logger.error("Error fetching user profile: %s", e)
+            return None
+    
     try:
-        print(f"Fetching profile for user_id: {user_id}")  # Debug
+        logger.debug("Fetching profile for user_id: %s", user_id)
         response = supabase_client.table("user_profiles").select("*").eq("id", user_id).execute()
-        print(f"Response data: {response.data}")  # Debug
+        logger.debug("Response data: %s", response.data)
         if response.data:
             return response.data[0]
         return None
     except Exception as e:
-        print(f"Error fetching user profile: {e}")
+        logger.error("Error fetching user profile: %s", e)
         return None
 
 def create_user_profile(user_id: str, email: str, full_name: str):
@@ -31,41 +54,49 @@ def create_user_profile(user_id: str, email: str, full_name: str):
         # First check if profile already exists
         existing = get_user_profile(user_id)
         if existing:
-            print(f"Profile already exists for user {user_id}")
+            logger.info("Profile already exists for user %s", user_id)
             return existing
         
-        print(f"Creating profile for user_id: {user_id}")  # Debug
+        logger.debug("Creating profile for user_id: %s", user_id)
         response = supabase_client.table("user_profiles").insert({
             "id": user_id,
             "email": email,
             "full_name": full_name
         }).execute()
         
-        print(f"Profile created successfully: {response.data}")  # Debug
+        logger.info("Profile created for user %s", user_id)
+        logger.debug("Profile created: %s", response.data)
+        profile_index.upsert(user_id, {"email": email, "full_name": full_name})
+        _clear_cached("profile", user_id)
         return response.data
     except Exception as e:
-        print(f"Error creating user profile: {e}")
+        logger.error("Error creating user profile: %s", e)
         try:
             response = supabase_client.table("user_profiles").upsert({
                 "id": user_id,
                 "email": email,
                 "full_name": full_name
             }).execute()
-            print(f"Profile upserted successfully: {response.data}")
+            logger.debug("Profile upserted: %s", response.data)
+            profile_index.upsert(user_id, {"email": email, "full_name": full_name})
+            _clear_cached("profile", user_id)
             return response.data
         except Exception as e2:
-            print(f"Error upserting user profile: {e2}")
+            logger.error("Error upserting user profile: %s", e2)
             return None
 
 def update_user_profile(user_id: str, updates: dict):
     """Update user profile"""
     try:
-        print(f"Updating profile for user_id: {user_id} with data: {updates}")  # Debug
+        logger.debug("Updating profile for user_id: %s with data: %s", user_id, updates)
         response = supabase_client.table("user_profiles").update(updates).eq("id", user_id).execute()
-        print(f"Update response: {response.data}")  # Debug
+        logger.debug("Update response: %s", response.data)
+        profile_index.upsert(user_id, updates)
+        _clear_cached("profile", user_id)
+        recommendation_store.invalidate(user_id)
         return response.data
     except Exception as e:
-        print(f"Error updating user profile: {e}")
+        logger.error("Error updating user profile: %s", e)
         return None
 
 def register_for_program(user_id: str, program_id: str, program_title: str):
@@ -82,193 +113,156 @@ def register_for_program(user_id: str, program_id: str, program_title: str):
             "program_title": program_title
         }).execute()
         
+        collaborative_engine.add_registration(user_id, program_id, program_title)
+        _clear_cached("registrations", user_id)
+        recommendation_store.invalidate(user_id)
         return {"success": True, "data": response.data}
     except Exception as e:
-        print(f"Error registering for program: {e}")
+        logger.error("Error registering for program: %s", e)
         return {"success": False, "message": str(e)}
 
+def _fetch_user_registrations(user_ids: list):
+    """Read registrations for several users in one query: {user_id: [registration, ...] oldest first}; errors propagate"""
+    response = supabase_client.table("program_registrations").select("*").in_("user_id", user_ids).order("registered_at").execute()
+    registrations = {user_id: [] for user_id in user_ids}
+    for reg in response.data:
+        registrations.setdefault(reg['user_id'], []).append(reg)
+    return registrations
+
 def get_user_registrations(user_id: str):
-    """Get all programs user has registered for"""
+    """Get all programs user has registered for, oldest first (at most once per request scope)"""
+    loader = get_loader("registrations")
+    if loader is not None:
+        try:
+            return loader.load(user_id)
+        except Exception as e:
+            logger.error("Error fetching user registrations: %s", e)
+            return []
+    
     try:
-        response = supabase_client.table("program_registrations").select("*").eq("user_id", user_id).execute()
+        response = supabase_client.table("program_registrations").select("*").eq("user_id", user_id).order("registered_at").execute()
         return response.data
     except Exception as e:
-        print(f"Error fetching user registrations: {e}")
+        logger.error("Error fetching user registrations: %s", e)
         return []
 
 def unregister_from_program(user_id: str, program_id: str):
     """Unregister user from a program"""
     try:
         response = supabase_client.table("program_registrations").delete().eq("user_id", user_id).eq("program_id", program_id).execute()
+        collaborative_engine.remove_registration(user_id, program_id)
+        _clear_cached("registrations", user_id)
+        recommendation_store.invalidate(user_id)
         return {"success": True, "data": response.data}
     except Exception as e:
-        print(f"Error unregistering from program: {e}")
+        logger.error("Error unregistering from program: %s", e)
         return {"success": False, "message": str(e)}
 
+register_loader("profile", _fetch_user_profiles)
+register_loader("registrations", _fetch_user_registrations, default_factory=list)
+
 def get_all_registrations():
-    """Get all program registrations for collaborative filtering"""
-    try:
-        response = supabase_client.table("program_registrations").select("user_id, program_id, program_title").execute()
-        return response.data
-    except Exception as e:
-        print(f"Error fetching all registrations: {e}")
-        return []
+    """Get all program registrations for collaborative filtering; errors propagate so a failed read isn't cached as empty"""
+    response = supabase_client.table("program_registrations").select("user_id, program_id, program_title").execute()
+    return response.data
+
+# Loaded lazily from get_all_registrations on first use
+collaborative_engine = CollaborativeEngine(get_all_registrations)
+
+def get_all_profiles():
+    """Get the profile fields used for similar-user scoring, for every user; errors propagate so a failed read isn't cached as empty"""
+    response = supabase_client.table("user_profiles").select(", ".join(PROFILE_FIELDS)).execute()
+    return response.data
+
+# Loaded lazily from get_all_profiles on first use
+profile_index = ProfileIndex(get_all_profiles)
 
+@timed("similar_profiles")
 def get_users_with_similar_profiles(current_user_id: str, limit: int = 10):
     """Get users with similar profiles (role, skill_level, interests)"""
     try:
-        print(f"\n=== FINDING SIMILAR USERS FOR: {current_user_id} ===")
-        
-        # Get current user's profile
-        current_profile = get_user_profile(current_user_id)
-        if not current_profile:
-            print("❌ Current user profile not found!")
-            return []
-        
-        print(f"📋 Current user profile:")
-        print(f"   Role: {current_profile.get('role', 'N/A')}")
-        print(f"   Skill Level: {current_profile.get('skill_level', 'N/A')}")
-        print(f"   Interests: {current_profile.get('interests', 'N/A')}")
-        
-        # Get all user profiles
-        all_profiles = supabase_client.table("user_profiles").select("*").execute()
-        print(f"📊 Total profiles found: {len(all_profiles.data)}")
-        
-        similar_users = []
-        current_role = current_profile.get('role', '').lower()
-        current_skill = current_profile.get('skill_level', '').lower()
-        current_interests = current_profile.get('interests', '').lower()
+        if profile_index.get_profile(current_user_id) is None:
+            # Not indexed yet (e.g. written by another process) - read it once and add it
+            current_profile = get_user_profile(current_user_id)
+            if not current_profile:
+                logger.warning("⚠️ Current user profile not found!")
+                return []
+            profile_index.upsert(current_user_id, current_profile)
         
-        for profile in all_profiles.data:
-            if profile['id'] == current_user_id:
-                continue
-                
-            # Calculate similarity score
-            similarity_score = 0
-            
-            # Role similarity
-            if profile.get('role', '').lower() == current_role:
-                similarity_score += 3
-                print(f"   👥 Role match with {profile.get('full_name', 'Unknown')}: +3")
-            
-            # Skill level similarity
-            if profile.get('skill_level', '').lower() == current_skill:
-                similarity_score += 2
-                print(f"   📈 Skill level match with {profile.get('full_name', 'Unknown')}: +2")
-            
-            # Interest similarity (check if any words match)
-            profile_interests = profile.get('interests', '').lower()
-            if profile_interests and current_interests:
-                current_words = set(current_interests.split())
-                profile_words = set(profile_interests.split())
-                common_words = current_words.intersection(profile_words)
-                if common_words:
-                    similarity_score += len(common_words)
-                    print(f"   🎯 Interest match with {profile.get('full_name', 'Unknown')}: +{len(common_words)} (words: {common_words})")
-            
-            if similarity_score > 0:
-                similar_users.append({
-                    'user_id': profile['id'],
-                    'similarity_score': similarity_score,
-                    'profile': profile
-                })
-                print(f"   ✅ Added similar user: {profile.get('full_name', 'Unknown')} (score: {similarity_score})")
-        
-        # Sort by similarity score
-        similar_users.sort(key=lambda x: x['similarity_score'], reverse=True)
-        
-        print(f"\n🔍 Found {len(similar_users)} similar users")
-        for i, user in enumerate(similar_users[:limit]):
-            print(f"   {i+1}. {user['profile'].get('full_name', 'Unknown')} (score: {user['similarity_score']})")
-        
-        return similar_users[:limit]
+        similar_users = profile_index.find_similar(current_user_id, limit=limit)
+        logger.debug("🔍 Found %s similar users for %s", len(similar_users), current_user_id)
+        return similar_users
         
     except Exception as e:
-        print(f"❌ Error finding similar users: {e}")
+        logger.error("❌ Error finding similar users: %s", e)
         return []
 
+@timed("collaborative_filtering")
 def get_collaborative_recommendations(user_id: str, limit: int = 3):  # Changed from 5 to 3
-    """Get program recommendations based on collaborative filtering"""
+    """
+    Get program recommendations based on collaborative filtering
+    Scores come from the in-memory user x program matrix, so no per-user registration reads.
+    COLLABORATIVE_MODE "user" weights programs by similar users' profile scores (score >= 5);
+    "item" uses item-item cosine similarity over co-registrations
+    """
     try:
-        print(f"\n=== COLLABORATIVE RECOMMENDATIONS FOR: {user_id} ===")
-        
-        # Get current user's registrations first
-        current_registrations = get_user_registrations(user_id)
-        current_program_ids = {reg['program_id'] for reg in current_registrations}
-        
-        print(f"📚 Current user is registered for {len(current_program_ids)} programs:")
-        for reg in current_registrations:
-            print(f"   - {reg['program_title']} (ID: {reg['program_id']})")
-        
-        # Get similar users - reduce to top 10
-        similar_users = get_users_with_similar_profiles(user_id, limit=10)
-        if not similar_users:
-            print("❌ No similar users found!")
-            return []
-        
-        print(f"✅ Found {len(similar_users)} similar users")
-        
-        # Get programs registered by similar users
-        program_scores = defaultdict(int)
-        program_titles = {}
+        logger.info("=== COLLABORATIVE RECOMMENDATIONS FOR: %s ===", user_id)
         
-        for similar_user in similar_users:
-            user_registrations = get_user_registrations(similar_user['user_id'])
-            similarity_weight = similar_user['similarity_score']
+        if COLLABORATIVE_MODE == "item":
+            scored = collaborative_engine.recommend_item_based(
+                user_id, limit=limit, min_score=COLLABORATIVE_ITEM_MIN_SIMILARITY
+            )
+            # Scale to the 0-10 range the user-based scores use; callers divide by 10
+            scored = [(program_id, round(score * 10, 2)) for program_id, score in scored]
+        else:
+            # Get similar users - reduce to top 10
+            similar_users = get_users_with_similar_profiles(user_id, limit=10)
+            if not similar_users:
+                logger.info("📭 No similar users found")
+                return []
             
-            print(f"\n👤 Analyzing {similar_user['profile'].get('full_name', 'Unknown')} (weight: {similarity_weight})")
-            print(f"   Registered for {len(user_registrations)} programs:")
+            logger.info("✅ Found %s similar users", len(similar_users))
             
-            for reg in user_registrations:
-                program_id = reg['program_id']
-                program_title = reg['program_title']
-                
-                print(f"   - {program_title} (ID: {program_id})")
-                
-                # Don't recommend programs user has already registered for
-                if program_id not in current_program_ids:
-                    program_scores[program_id] += similarity_weight
-                    program_titles[program_id] = program_title
-                    print(f"     ✅ Added to recommendations (current score: {program_scores[program_id]})")
-                else:
-                    print(f"     ⚠️  Already registered - skipping")
-        
-        # Only include programs with high collaborative scores (score >= 5)
-        filtered_programs = {pid: score for pid, score in program_scores.items() if score >= 5}
-        
-        print(f"\n📊 HIGH-QUALITY COLLABORATIVE PROGRAM SCORES:")
-        for program_id, score in sorted(filtered_programs.items(), key=lambda x: x[1], reverse=True):
-            print(f"   {program_titles[program_id]} (ID: {program_id}): {score}")
+            # Only include programs with high collaborative scores (score >= 5)
+            scored = collaborative_engine.recommend_from_user_weights(
+                user_id,
+                {similar_user['user_id']: similar_user['similarity_score'] for similar_user in similar_users},
+                limit=limit,
+                min_score=5
+            )
         
-        # Sort by score and return top recommendations
-        sorted_programs = sorted(filtered_programs.items(), key=lambda x: x[1], reverse=True)
+        registration_counts = get_program_registration_counts([program_id for program_id, _ in scored])
         
         recommendations = []
-        for program_id, score in sorted_programs[:limit]:
+        for program_id, score in scored:
             recommendations.append({
                 'program_id': program_id,
-                'program_title': program_titles[program_id],
+                'program_title': collaborative_engine.get_program_title(program_id),
                 'collaborative_score': score,
-                'recommendation_type': 'collaborative'
+                'recommendation_type': 'collaborative',
+                'users_registered': registration_counts.get(program_id, 0)
             })
         
-        print(f"\n🎯 TOP {len(recommendations)} COLLABORATIVE RECOMMENDATIONS:")
+        logger.info("🎯 TOP %s COLLABORATIVE RECOMMENDATIONS:", len(recommendations))
         for i, rec in enumerate(recommendations):
-            print(f"   {i+1}. {rec['program_title']} (score: {rec['collaborative_score']})")
+            logger.debug("   %s. %s (score: %s)", i+1, rec['program_title'], rec['collaborative_score'])
         
         return recommendations
         
     except Exception as e:
-        print(f"❌ Error getting collaborative recommendations: {e}")
+        logger.error("❌ Error getting collaborative recommendations: %s", e)
         return []
 
-def get_program_registration_count(program_id: str):
-    """Get count of users registered for a specific program"""
+def get_program_registration_counts(program_ids: list):
+    """Get registered-user counts for several programs at once, from the in-memory registration matrix"""
     try:
-        response = supabase_client.table("program_registrations").select("user_id").eq("program_id", program_id).execute()
-        count = len(response.data)
-        print(f"📊 Program {program_id} has {count} registrations")
-        return count
+        counts = collaborative_engine.get_registration_counts(list(program_ids))
+        logger.debug("📊 Registration counts for %s programs", len(counts))
+        return counts
     except Exception as e:
-        print(f"Error getting registration count: {e}")
-        return 0
\ No newline at end of file
+        logger.error("Error getting registration counts: %s", e)
+        return {program_id: 0 for program_id in program_ids}
+
+def get_program_registration_count(program_id: str):
+    """Get count of users registered for a specific program"""
+    return get_program_registration_counts([program_id]).get(program_id, 0)